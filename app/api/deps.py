@@ -1,7 +1,14 @@
+from __future__ import annotations
 from functools import lru_cache
+from typing import TYPE_CHECKING
 from app.services import ai_service, audio_service
 from app.core.config import settings
 from fastapi import Request
+from starlette.requests import HTTPConnection
+import httpx
+
+if TYPE_CHECKING:
+    from google.cloud import speech, storage, texttospeech
 
 @lru_cache()
 def get_settings():
@@ -17,4 +24,25 @@ def get_emotion_detector(request: Request):
 
 @lru_cache()
 def get_whisper_model(request: Request):
-    return request.app.state.whisper_model
\ No newline at end of file
+    return request.app.state.whisper_model
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http_client
+
+# The SDK clients are created on first use (or by the startup warm-up), see app/core/clients.py
+async def get_storage_client(request: Request) -> storage.Client:
+    return await request.app.state.storage_client.get()
+
+async def get_speech_client(request: HTTPConnection) -> speech.SpeechAsyncClient:
+    return await request.app.state.speech_client.get()
+
+async def get_tts_client(request: Request) -> texttospeech.TextToSpeechAsyncClient:
+    return await request.app.state.tts_client.get()
+
+
+def cache_bypass(request: Request) -> bool:
+    """True when the client asked to skip the response cache."""
+    cache_control = request.headers.get("cache-control", "").lower()
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        return True
+    return request.headers.get("x-cache-bypass", "").lower() in ("1", "true", "yes")
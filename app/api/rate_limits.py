@@ -0,0 +1,45 @@
+# app/api/rate_limits.py
+
+from app.core.config import settings
+from app.core.rate_limit import RouteRule
+
+# --- Request costs, roughly in Gemini calls (or Serper searches, or audio minutes) ---
+
+# Higher levels ask for longer, more detailed answers
+RESEARCH_LEVEL_COSTS = {1: 2.0, 2: 3.0, 3: 5.0}
+RESEARCH_MAX_COST = max(RESEARCH_LEVEL_COSTS.values())
+
+def research_cost(body: dict) -> float:
+    return RESEARCH_LEVEL_COSTS.get(int(body.get("level", 3)), RESEARCH_LEVEL_COSTS[3])
+
+def research_bundle_cost(body: dict) -> float:
+    # The answer, plus keywords and an image search, plus narration of the opening
+    return research_cost(body) + 2.0 + (1.0 if body.get("include_audio") else 0.0)
+
+RESEARCH_BUNDLE_MAX_COST = RESEARCH_MAX_COST + 3.0
+
+def summarize_batch_cost(body: dict) -> float:
+    return max(1.0, float(len(body.get("contents", []))))
+
+def tts_cost(body: dict) -> float:
+    # One unit per ~1000 characters synthesized
+    return 1.0 + len(body.get("text", "")) // 1000
+
+# Rules by request path; routes not listed here are not limited. Bodies too long
+# to read ahead are charged max_cost (by default the whole bucket).
+RATE_LIMIT_RULES = {
+    "/api/research": RouteRule("ai", body_cost=research_cost, max_cost=RESEARCH_MAX_COST),
+    "/api/research-bundle": RouteRule("ai", body_cost=research_bundle_cost, max_cost=RESEARCH_BUNDLE_MAX_COST),
+    "/api/summarize": RouteRule("ai", cost=1.0),
+    "/api/summarize/batch": RouteRule("ai", body_cost=summarize_batch_cost, max_cost=settings.SUMMARY_BATCH_MAX_ITEMS),
+    "/api/analyze-image": RouteRule("ai", cost=3.0),
+    "/api/gen_keywords": RouteRule("ai", cost=2.0),
+    "/api/jobs/research": RouteRule("ai", body_cost=research_cost, max_cost=RESEARCH_MAX_COST),
+    "/api/search-scholar": RouteRule("search", cost=1.0),
+    "/api/search-lens": RouteRule("search", cost=1.0),
+    "/api/transcribe": RouteRule("audio", cost=2.0),
+    "/api/transcribe/stream": RouteRule("audio", cost=3.0),
+    "/api/jobs/transcribe": RouteRule("audio", cost=2.0),
+    "/api/text-to-speech": RouteRule("audio", body_cost=tts_cost),
+    "/api/jobs/tts": RouteRule("audio", body_cost=tts_cost),
+}
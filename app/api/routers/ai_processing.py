@@ -1,68 +1,296 @@
 # app/api/routers/ai_processing.py
 
-from fastapi import APIRouter, HTTPException
-# Note: We no longer need UploadFile or File from fastapi here
-from app.models.schemas import ResearchKeyword, ResearchQuery, SummarizeRequest, ImagePayload # <-- Import ImagePayload
-from app.services import ai_service
+from typing import AsyncIterator
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from app.models.schemas import ResearchKeyword, ResearchQuery, ResearchBundleRequest, SummarizeRequest, SummarizeBatchRequest, ImagePayload # <-- Import ImagePayload
+from app.api.deps import cache_bypass, get_http_client
+from app.core.config import settings
+from app.core import metrics
+from app.core.cache import MISSING
+from app.core.lazy import ensure_loaded
+from app.core.limiter import UpstreamOverloaded
+from app.services import ai_service, bundle_service, image_service
 import base64
+import hashlib
+import httpx
+import json
 import re
 
 router = APIRouter()
 
 # --- research_endpoint and summarize_endpoint remain the same ---
 
+def _sse_event(data: dict, event: str | None = None) -> str:
+    """Formats a single Server-Sent Event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def _research_event_stream(request: Request, first: str | None, chunks: AsyncIterator[str]):
+    """
+    Forwards Gemini chunks to the client as SSE 'data' events, followed by a
+    'done' event. Upstream generation is cancelled if the client goes away.
+    """
+    try:
+        if first is not None:
+            yield _sse_event({"text": first})
+        async for text in chunks:
+            if await request.is_disconnected():
+                break
+            yield _sse_event({"text": text})
+        else:
+            yield _sse_event({}, event="done")
+    except Exception as e:
+        # Headers are already sent, so errors are reported in-band.
+        yield _sse_event({"detail": str(e)}, event="error")
+    finally:
+        await chunks.aclose()
+
 @router.post("/research")
-async def research_endpoint(query: ResearchQuery):
+async def research_endpoint(query: ResearchQuery, request: Request, bypass_cache: bool = Depends(cache_bypass)):
+    if query.stream:
+        chunks = ai_service.stream_research_response_with_gemini(
+            question=query.question,
+            emotion=query.emotion,
+            level=query.level,
+            use_cache=not bypass_cache
+        )
+        # Wait for the first chunk so an overload (503) or early failure still gets a proper status
+        try:
+            first = await anext(chunks, None)
+        except UpstreamOverloaded:
+            await chunks.aclose()
+            raise
+        except Exception as e:
+            await chunks.aclose()
+            raise HTTPException(status_code=500, detail=str(e))
+        return StreamingResponse(
+            _research_event_stream(request, first, chunks),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
     try:
         answer = await ai_service.generate_research_response_with_gemini(
             question=query.question,
             emotion=query.emotion,
-            level=query.level
+            level=query.level,
+            use_cache=not bypass_cache
         )
         return {"answer": answer}
+    except UpstreamOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/research-bundle")
+async def research_bundle_endpoint(
+    query: ResearchBundleRequest,
+    request: Request,
+    client: httpx.AsyncClient = Depends(get_http_client),
+    bypass_cache: bool = Depends(cache_bypass)
+):
+    """
+    Returns the research answer, related image URLs and (optionally) narration
+    of the answer's opening in one round-trip. The parts run concurrently; any
+    part that fails is listed in "errors" while the others are still returned.
+    """
+    bundle = await bundle_service.build_research_bundle(
+        question=query.question,
+        emotion=query.emotion,
+        level=query.level,
+        http_client=client,
+        tts_client=request.app.state.tts_client,
+        include_audio=query.include_audio,
+        use_cache=not bypass_cache
+    )
+    if bundle["answer"] is None and not bundle["image_urls"]:
+        raise HTTPException(status_code=502, detail=bundle["errors"])
+    return bundle
+
 @router.post("/summarize")
-async def summarize_endpoint(request: SummarizeRequest):
+async def summarize_endpoint(request: SummarizeRequest, bypass_cache: bool = Depends(cache_bypass)):
     try:
-        summary = await ai_service.generate_summary_with_gemini(request.content)
+        summary = await ai_service.generate_summary_with_gemini(request.content, use_cache=not bypass_cache)
         return {"answer": summary}
+    except UpstreamOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/summarize/batch")
+async def summarize_batch_endpoint(request: SummarizeBatchRequest, bypass_cache: bool = Depends(cache_bypass)):
+    """
+    Summarizes a list of contents in one request. Results come back in input
+    order, each as {"answer": ...} or, if that item failed, {"error": ...}.
+    """
+    if len(request.contents) > settings.SUMMARY_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.SUMMARY_BATCH_MAX_ITEMS} contents per batch")
+    results = await ai_service.generate_summaries_with_gemini(
+        request.contents,
+        pack=request.pack,
+        use_cache=not bypass_cache
+    )
+    return {"results": results}
+
+
+def _limit_request_body(request: Request, max_bytes: int) -> Request:
+    """
+    Returns a view of the request whose body stream fails with 413 as soon as
+    more than max_bytes have been received, so oversized uploads are rejected
+    before they are fully buffered.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes")
+
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes")
+        return message
+
+    return Request(request.scope, receive)
+
+async def _read_data_url_image(request: Request) -> tuple[bytes, str]:
+    """Reads the legacy JSON body carrying a base64 data URL."""
+    try:
+        payload = ImagePayload.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+    # A data URL looks like "data:image/png;base64,iVBORw0KGgo..."
+    # We need to extract the mime type and the actual base64 data
+    header, encoded_data = payload.image_data.split(',', 1)
+    
+    # Extract mime type (e.g., 'image/png')
+    match = re.search(r'data:(?P<mime_type>[\w/]+);base64', header)
+    if not match:
+        raise HTTPException(status_code=400, detail="Invalid Base64 data URL format")
+
+    # Decode the Base64 string into bytes
+    return base64.b64decode(encoded_data), match.group('mime_type')
+
+async def _read_multipart_image(request: Request) -> tuple[bytes, str, str]:
+    """Reads an image sent as the 'file' field of a multipart/form-data body."""
+    # Starlette spools file parts to disk past 1 MB instead of holding them in memory
+    async with request.form(max_files=1) as form:
+        upload = form.get("file")
+        if not isinstance(upload, StarletteUploadFile):
+            raise HTTPException(status_code=400, detail="Multipart body must contain a 'file' field")
+        return await upload.read(), upload.content_type or "application/octet-stream", upload.filename or "image.png"
+
+async def _read_binary_image(request: Request) -> tuple[bytes, str]:
+    """Reads a raw image body (application/octet-stream or image/*)."""
+    chunks = [chunk async for chunk in request.stream()]
+    image_bytes = b"".join(chunks)
+    if not image_bytes:
+        raise HTTPException(status_code=400, detail="Empty image body")
+    mime_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if not mime_type.startswith("image/"):
+        await ensure_loaded(image_service.Image)
+        mime_type = image_service.sniff_mime_type(image_bytes)
+    return image_bytes, mime_type
+
+_ANALYZE_IMAGE_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": ImagePayload.model_json_schema()},
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            },
+            "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+        },
+    }
+}
+
 # --- THIS IS THE CORRECTED ENDPOINT ---
-@router.post("/analyze-image")
-async def analyze_image_endpoint(payload: ImagePayload):
+@router.post("/analyze-image", openapi_extra=_ANALYZE_IMAGE_OPENAPI)
+async def analyze_image_endpoint(request: Request, response: Response, bypass_cache: bool = Depends(cache_bypass)):
+    """
+    Accepts the image as a JSON base64 data URL (legacy), a multipart/form-data
+    'file' field, or a raw application/octet-stream / image/* body. Repeated
+    and near-identical photos are answered from the image answer cache; the
+    X-Cache header says which tier answered (exact, perceptual or miss).
+    """
+    content_type = request.headers.get("content-type", "")
+    # Base64 inflates the payload by a third, so JSON bodies get a matching allowance
+    max_bytes = settings.MAX_IMAGE_UPLOAD_BYTES
+    if content_type.startswith("application/json"):
+        max_bytes = max_bytes * 4 // 3 + 1024
+    request = _limit_request_body(request, max_bytes)
+
     try:
-        # A data URL looks like "data:image/png;base64,iVBORw0KGgo..."
-        # We need to extract the mime type and the actual base64 data
-        header, encoded_data = payload.image_data.split(',', 1)
-        
-        # Extract mime type (e.g., 'image/png')
-        match = re.search(r'data:(?P<mime_type>[\w/]+);base64', header)
-        if not match:
-            raise HTTPException(status_code=400, detail="Invalid Base64 data URL format")
-        mime_type = match.group('mime_type')
-
-        # Decode the Base64 string into bytes
-        image_bytes = base64.b64decode(encoded_data)
-        
-        # Call the service function with the decoded bytes and mime type
-        model_output = await ai_service.analyze_image_with_gemini(
-            image_bytes=image_bytes, 
-            mime_type=mime_type
-        )
+        filename = "image.png" # Filename is generic unless the upload names one
+        if content_type.startswith("application/json"):
+            image_bytes, mime_type = await _read_data_url_image(request)
+        elif content_type.startswith("multipart/form-data"):
+            image_bytes, mime_type, filename = await _read_multipart_image(request)
+        else:
+            image_bytes, mime_type = await _read_binary_image(request)
+
+        # The same upload again is answered before the image is even decoded
+        use_cache = settings.IMAGE_CACHE_ENABLED and not bypass_cache
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        if use_cache:
+            cached = ai_service.image_answer_cache.get_exact(digest)
+            if cached is not MISSING:
+                response.headers["X-Cache"] = "exact"
+                return {"filename": filename, "response": cached, "preprocessing": None}
+
+        # Downscale, orient and re-encode before the image goes to Gemini
+        with metrics.stage("analyze_image.preprocess"):
+            prepared = await image_service.preprocess_image(
+                image_bytes, mime_type, settings.IMAGE_CACHE_HASH_SIZE if use_cache else 0
+            )
+        del image_bytes
+        if prepared.timings:
+            response.headers["Server-Timing"] = prepared.server_timing()
+
+        if use_cache:
+            # Another photo of the same page differs in bytes but not in its perceptual hash
+            await ensure_loaded(ai_service.np)
+            cached = ai_service.image_answer_cache.get_similar(prepared.dhash, prepared.thumbnail)
+            response.headers["X-Cache"] = "miss" if cached is MISSING else "perceptual"
+            if cached is not MISSING:
+                return {"filename": filename, "response": cached, "preprocessing": prepared.report()}
+
+        # Call the service function with the prepared bytes and mime type
+        with metrics.stage("analyze_image.gemini"):
+            model_output = await ai_service.analyze_image_with_gemini(
+                image_bytes=prepared.data,
+                mime_type=prepared.mime_type
+            )
+        if use_cache:
+            ai_service.image_answer_cache.add(digest, prepared.dhash, prepared.thumbnail, model_output)
         
-        return {"filename": "image.png", "response": model_output} # Filename is now generic
+        return {"filename": filename, "response": model_output, "preprocessing": prepared.report()}
+    except (HTTPException, RequestValidationError, UpstreamOverloaded):
+        raise
     except (base64.binascii.Error, ValueError) as e:
-        raise HTTPException(status_code=400, detail=f"Invalid Base64 data: {e}")
+        raise HTTPException(status_code=400, detail=f"Invalid image data: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/gen_keywords")
-async def generate_images_endpoint(query: ResearchKeyword):
+async def generate_images_endpoint(
+    query: ResearchKeyword,
+    client: httpx.AsyncClient = Depends(get_http_client),
+    bypass_cache: bool = Depends(cache_bypass)
+):
     """
     This endpoint takes a question and an emotion, generates relevant keywords,
     and returns a list of image URLs from the Serper API.
@@ -70,7 +298,9 @@ async def generate_images_endpoint(query: ResearchKeyword):
     try:
         image_urls = await ai_service.generate_image_urls(
             question=query.question,
-            emotion=query.emotion
+            emotion=query.emotion,
+            client=client,
+            use_cache=not bypass_cache
         )
         if not image_urls:
             # This could happen if the API returns no results or an error occurred
@@ -79,6 +309,8 @@ async def generate_images_endpoint(query: ResearchKeyword):
             
         print(image_urls)
         return image_urls
+    except UpstreamOverloaded:
+        raise
     except Exception as e:
         # This catches unexpected errors during the process.
         print(e)
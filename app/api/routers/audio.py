@@ -1,30 +1,115 @@
 # app/api/routers/audio.py
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, Response
-from fastapi.responses import JSONResponse
+from __future__ import annotations
+import asyncio
+from typing import TYPE_CHECKING, AsyncIterator
+from fastapi import APIRouter, File, UploadFile, HTTPException, Response, WebSocket, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.websockets import WebSocketState
+from app.api.deps import get_speech_client, get_tts_client
+from app.core.limiter import UpstreamOverloaded
 from app.models.schemas import TTSRequest
 from app.services import audio_service
 
+if TYPE_CHECKING:
+    from google.cloud import speech, texttospeech
+
 router = APIRouter()
 
 @router.post("/transcribe")
-async def transcribe_audio_endpoint(file: UploadFile = File(...)):
+async def transcribe_audio_endpoint(
+    file: UploadFile = File(...),
+    client: speech.SpeechAsyncClient = Depends(get_speech_client)
+):
     # GCP Speech-to-Text supports webm directly
     if not file.content_type.startswith("audio/"):
          raise HTTPException(status_code=400, detail="Invalid file type, must be audio.")
     try:
         audio_content = await file.read()
-        transcription = await audio_service.transcribe_audio_gcp(audio_content)
+        transcription = await audio_service.transcribe_audio_gcp(client, audio_content)
         return JSONResponse(content={"prompt": "Say something about your favorite technology.", "transcription": transcription})
+    except UpstreamOverloaded:
+        raise
     except Exception as e:
         print(e);
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.websocket("/transcribe/stream")
+async def transcribe_stream_endpoint(
+    websocket: WebSocket,
+    client: speech.SpeechAsyncClient = Depends(get_speech_client)
+):
+    """
+    Live transcription. The client sends audio chunks as binary frames while
+    recording and a text frame "end" when done. The server sends JSON frames
+    {"transcript", "is_final", "stability"} as results arrive, then {"event": "done"}.
+    """
+    await websocket.accept()
+    audio_queue: asyncio.Queue[bytes | None] = asyncio.Queue()
+
+    async def audio_chunks():
+        while (chunk := await audio_queue.get()) is not None:
+            yield chunk
+
+    async def receive_audio() -> bool:
+        """Feeds audio frames to the recognizer. Returns False if the client disconnected."""
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return False
+            if message.get("bytes"):
+                audio_queue.put_nowait(message["bytes"])
+            elif message.get("text") == "end":
+                audio_queue.put_nowait(None)
+                return True
+
+    async def send_results():
+        async for result in audio_service.stream_transcribe_gcp(client, audio_chunks()):
+            await websocket.send_json(result)
+
+    receiver = asyncio.create_task(receive_audio())
+    recognizer = asyncio.create_task(send_results())
+    try:
+        done, _ = await asyncio.wait({receiver, recognizer}, return_when=asyncio.FIRST_COMPLETED)
+        if receiver in done and not receiver.result():
+            return  # Client is gone; the finally block cancels recognition
+        # Audio has ended (or recognition finished early); flush the final results
+        await recognizer
+        await websocket.send_json({"event": "done"})
+        await websocket.close()
+    except Exception as e:
+        print(f"ERROR in /transcribe/stream: {e}")
+        if websocket.application_state == WebSocketState.CONNECTED:
+            await websocket.send_json({"event": "error", "detail": str(e)})
+            await websocket.close(code=1011)
+    finally:
+        receiver.cancel()
+        recognizer.cancel()
+
+async def _prepend(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield first
+    async for chunk in rest:
+        yield chunk
+
 @router.post("/text-to-speech")
-async def text_to_speech_endpoint(request: TTSRequest):
+async def text_to_speech_endpoint(
+    request: TTSRequest,
+    client: texttospeech.TextToSpeechAsyncClient = Depends(get_tts_client)
+):
     try:
-        audio_data = await audio_service.generate_tts_audio_gcp(request.text)
+        if request.stream:
+            segments = audio_service.stream_tts_audio_gcp(client, request.text)
+            # Wait for the first segment so early failures still return a proper error status
+            try:
+                first = await anext(segments, b"")
+            except Exception:
+                await segments.aclose()
+                raise
+            return StreamingResponse(_prepend(first, segments), media_type="audio/mpeg")
+        audio_data = await audio_service.generate_tts_audio_gcp(client, request.text)
         return Response(content=audio_data, media_type="audio/mpeg")
+    except UpstreamOverloaded:
+        raise
     except Exception as e:
         print(f"ERROR in /text-to-speech: {e}") # Also print to server logs
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,20 +1,42 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Response
+import httpx
+from app.api.deps import cache_bypass, get_http_client
+from app.core.config import settings
 from app.models.schemas import SerperQuery, SerperLensQuery
 from app.services import external_api_service
-import requests
 
 router = APIRouter()
 
+def _json_result(result: bytes | dict):
+    # Serper's own bytes go out as-is, skipping a parse and re-serialization
+    if isinstance(result, bytes):
+        return Response(content=result, media_type="application/json")
+    return result
+
 @router.post("/search-scholar")
-def search_scholar_endpoint(data: SerperQuery):
+async def search_scholar_endpoint(
+    data: SerperQuery,
+    client: httpx.AsyncClient = Depends(get_http_client),
+    bypass_cache: bool = Depends(cache_bypass)
+):
     try:
-        return external_api_service.search_serper_scholar(data.q)
-    except requests.RequestException as e:
+        result = await external_api_service.search_serper_scholar(
+            client, data.q, use_cache=not bypass_cache, raw=settings.SERPER_PASSTHROUGH
+        )
+        return _json_result(result)
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Serper API failed: {e}")
 
 @router.post("/search-lens")
-def search_lens_endpoint(data: SerperLensQuery):
+async def search_lens_endpoint(
+    data: SerperLensQuery,
+    client: httpx.AsyncClient = Depends(get_http_client),
+    bypass_cache: bool = Depends(cache_bypass)
+):
     try:
-        return external_api_service.search_serper_lens(data.url)
-    except requests.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"Serper API failed: {e}")
\ No newline at end of file
+        result = await external_api_service.search_serper_lens(
+            client, data.url, use_cache=not bypass_cache, raw=settings.SERPER_PASSTHROUGH
+        )
+        return _json_result(result)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Serper API failed: {e}")
@@ -0,0 +1,105 @@
+# app/api/routers/jobs.py
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from app.api.deps import cache_bypass
+from app.core.config import settings
+from app.core.jobs import BinaryResult, Job, JobQueue, SUCCEEDED
+from app.models.schemas import ResearchJobRequest, TTSJobRequest
+import json
+
+router = APIRouter()
+
+def get_job_queue(request: Request) -> JobQueue:
+    queue = getattr(request.app.state, "job_queue", None)
+    if queue is None:
+        raise HTTPException(status_code=503, detail="Background jobs are disabled")
+    return queue
+
+async def _get_job(queue: JobQueue, job_id: str, with_result: bool = False) -> Job:
+    job = await queue.get(job_id, with_result)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (it may have expired)")
+    return job
+
+def _accepted(job: Job, response: Response) -> dict:
+    response.status_code = 202
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return job.public()
+
+# --- Submission ---
+
+@router.post("/jobs/research", status_code=202)
+async def submit_research_job(
+    query: ResearchJobRequest,
+    response: Response,
+    queue: JobQueue = Depends(get_job_queue),
+    bypass_cache: bool = Depends(cache_bypass)
+):
+    """Queues a /research generation; poll /jobs/{id} or subscribe to /jobs/{id}/events."""
+    payload = {"question": query.question, "emotion": query.emotion, "level": query.level, "use_cache": not bypass_cache}
+    return _accepted(await queue.submit("research", payload, query.priority), response)
+
+@router.post("/jobs/tts", status_code=202)
+async def submit_tts_job(request: TTSJobRequest, response: Response, queue: JobQueue = Depends(get_job_queue)):
+    """Queues a text-to-speech synthesis; the MP3 is served by /jobs/{id}/result."""
+    return _accepted(await queue.submit("tts", {"text": request.text}, request.priority), response)
+
+@router.post("/jobs/transcribe", status_code=202)
+async def submit_transcribe_job(
+    response: Response,
+    file: UploadFile = File(...),
+    priority: int = Form(0, ge=-10, le=10),
+    queue: JobQueue = Depends(get_job_queue)
+):
+    if not (file.content_type or "").startswith("audio/"):
+        raise HTTPException(status_code=400, detail="Invalid file type, must be audio.")
+    audio_content = await file.read(settings.JOBS_MAX_AUDIO_BYTES + 1)
+    if len(audio_content) > settings.JOBS_MAX_AUDIO_BYTES:
+        raise HTTPException(status_code=413, detail=f"Audio exceeds {settings.JOBS_MAX_AUDIO_BYTES} bytes")
+    job = await queue.submit("transcribe", {"filename": file.filename}, priority, input=audio_content)
+    return _accepted(job, response)
+
+# --- Status and results ---
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, queue: JobQueue = Depends(get_job_queue)):
+    return (await _get_job(queue, job_id, with_result=True)).public()
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, queue: JobQueue = Depends(get_job_queue)):
+    """The job's result as-is (JSON, or audio/mpeg for TTS); 409 until the job has succeeded."""
+    job = await _get_job(queue, job_id)
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    result = await queue.result(job_id)
+    if isinstance(result, BinaryResult):
+        return Response(content=result.content, media_type=result.media_type)
+    return result
+
+async def _job_event_stream(request: Request, queue: JobQueue, job_id: str):
+    """Sends a 'status' event on every status change, and the final job as a 'done' event."""
+    async for job in queue.watch(job_id):
+        if await request.is_disconnected():
+            break
+        event = "done" if job.finished else "status"
+        yield f"event: {event}\ndata: {json.dumps(job.public())}\n\n"
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, queue: JobQueue = Depends(get_job_queue)):
+    await _get_job(queue, job_id)
+    return StreamingResponse(
+        _job_event_stream(request, queue, job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, queue: JobQueue = Depends(get_job_queue)):
+    """Cancels a queued job, or a running one if it runs on the worker that serves this request."""
+    job = await _get_job(queue, job_id)
+    if job.finished:
+        raise HTTPException(status_code=409, detail=f"Job is already {job.status}")
+    if not await queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is running on another worker")
+    return {"id": job_id, "status": "cancelling" if job.status == "running" else "cancelled"}
@@ -1,8 +1,14 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
 from fastapi import APIRouter, Request, File, UploadFile, Depends
 from fastapi.responses import JSONResponse
 from app.core.config import Settings
-from app.api.deps import get_settings
-from app.services import file_service
+from app.api.deps import get_settings, get_storage_client
+from app.core.limiter import limiters
+from app.services import ai_service, external_api_service, file_service
+
+if TYPE_CHECKING:
+    from google.cloud import storage
 
 router = APIRouter()
 
@@ -11,10 +17,35 @@ async def health_check():
     return {"status": "ok"}
 
 @router.post("/upload-image")
-async def upload_image_endpoint(request: Request, file: UploadFile = File(...)):
-    url = await file_service.save_upload_file(request, file)
+async def upload_image_endpoint(file: UploadFile = File(...), client: storage.Client = Depends(get_storage_client)):
+    url = await file_service.upload_file_to_gcs(client, file)
     return JSONResponse({"url": url})
 
+@router.get("/cache/stats")
+async def cache_stats_endpoint():
+    return {
+        "gemini": ai_service.gemini_cache.stats(),
+        "serper": external_api_service.serper_cache.stats(),
+        "research_semantic": ai_service.research_semantic_cache.stats(),
+        "analyze_image": ai_service.image_answer_cache.stats(),
+    }
+
+@router.get("/singleflight/stats")
+async def singleflight_stats_endpoint():
+    return {
+        "gemini": ai_service.gemini_flight.stats(),
+        "serper": external_api_service.serper_flight.stats(),
+    }
+
+@router.get("/upstream/stats")
+async def upstream_stats_endpoint():
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+
+@router.get("/rate-limit/stats")
+async def rate_limit_stats_endpoint(request: Request):
+    limiter = request.app.state.rate_limiter
+    return limiter.stats() if limiter is not None else {"enabled": False}
+
 @router.get("/config")
 async def get_config_endpoint(settings: Settings = Depends(get_settings)):
     return {
@@ -0,0 +1,233 @@
+# app/core/cache.py
+
+import asyncio
+import hashlib
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, TypeVar
+from app.core import metrics
+
+T = TypeVar("T")
+
+MISSING = object()
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace and case so trivially different prompts share a key."""
+    return " ".join(text.split()).casefold()
+
+def make_cache_key(*parts: Any) -> str:
+    """Builds a stable cache key by hashing the JSON encoding of the given parts."""
+    encoded = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """In-process LRU cache with a per-entry TTL and a bounded number of entries."""
+
+    def __init__(self, max_entries: int, default_ttl: float):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    Cache backend stored in a local SQLite file. All gunicorn workers on the
+    same host can open the same file, so one worker's result is a hit for the rest.
+    Calls are blocking; ResponseCache runs them in a worker thread.
+    """
+
+    _PURGE_EVERY = 256  # writes between sweeps of expired rows
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return MISSING
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, data, time.time() + ttl),
+            )
+            self._writes += 1
+            if self._writes % self._PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    Two-tier cache: an in-process LRU in front of an optional shared backend.
+    Keeps hit/miss counters for the stats endpoint.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl: float, shared: SQLiteCache | None = None):
+        self.name = name
+        self.ttl = ttl
+        self.local = LRUCache(max_entries, ttl)
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        metrics.registry.register_stats("cache", name, self.stats)
+
+    async def get(self, key: str) -> Any:
+        value = self.local.get(key)
+        if value is not MISSING:
+            self.hits += 1
+            return value
+        if self.shared is not None:
+            value = await asyncio.to_thread(self.shared.get, key)
+            if value is not MISSING:
+                self.hits += 1
+                self.shared_hits += 1
+                self.local.set(key, value)
+                return value
+        self.misses += 1
+        return MISSING
+
+    async def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(key, value, ttl)
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.set, key, value, ttl)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self.local),
+            "max_entries": self.local.max_entries,
+        }
+
+
+class RevalidatingCache:
+    """
+    Stale-while-revalidate on top of a ResponseCache. An entry is fresh for its
+    TTL and then servable for `stale_ttl` more seconds: a stale hit returns the
+    old value immediately and refreshes it in the background, once per key.
+    Results that `is_empty` flags are kept only for `negative_ttl`, with no
+    stale window, so a query that found nothing is retried soon.
+    """
+
+    def __init__(
+        self,
+        cache: ResponseCache,
+        stale_ttl: float,
+        negative_ttl: float,
+        is_empty: Callable[[Any], bool] = lambda value: not value,
+    ):
+        self.cache = cache
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.is_empty = is_empty
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.negative_stores = 0
+        metrics.registry.register_stats("cache", cache.name, self._revalidation_stats)
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[T]], ttl: float) -> T:
+        entry = await self.cache.get(key)
+        if entry is not MISSING:
+            value, fresh_until, stale_until = entry
+            now = time.time()
+            if now < fresh_until:
+                return value
+            if now < stale_until:
+                self.stale_hits += 1
+                self._refresh(key, fetch, ttl)
+                return value
+        return await self.fetch_and_store(key, fetch, ttl)
+
+    async def fetch_and_store(self, key: str, fetch: Callable[[], Awaitable[T]], ttl: float) -> T:
+        value = await fetch()
+        if self.is_empty(value):
+            self.negative_stores += 1
+            ttl, stale_ttl = self.negative_ttl, 0.0
+        else:
+            stale_ttl = self.stale_ttl
+        now = time.time()
+        # Wall-clock deadlines, since the shared tier is read by other processes
+        await self.cache.set(key, (value, now + ttl, now + ttl + stale_ttl), ttl + stale_ttl)
+        return value
+
+    def _refresh(self, key: str, fetch: Callable[[], Awaitable[T]], ttl: float) -> None:
+        if key in self._refreshing:
+            return
+        self.refreshes += 1
+
+        async def refresh() -> None:
+            try:
+                await self.fetch_and_store(key, fetch, ttl)
+            except Exception as e:
+                # Keep serving the stale value; the next stale hit tries again
+                self.refresh_errors += 1
+                print(f"Background refresh of {self.cache.name} cache entry failed: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    def _revalidation_stats(self) -> dict:
+        return {
+            "stale_hits": self.stale_hits,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "refreshing": len(self._refreshing),
+            "negative_stores": self.negative_stores,
+        }
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), **self._revalidation_stats()}
@@ -0,0 +1,33 @@
+# app/core/clients.py
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from app.core.config import settings
+from app.core.grpc_client import create_grpc_client
+from app.core.lazy import LazyClient, lazy_import
+
+if TYPE_CHECKING:
+    from google.cloud import speech as speech_types, storage as storage_types, texttospeech as tts_types
+
+storage = lazy_import("google.cloud.storage")
+speech = lazy_import("google.cloud.speech")
+texttospeech = lazy_import("google.cloud.texttospeech")
+
+def storage_client() -> LazyClient[storage_types.Client]:
+    # storage.Client() resolves credentials synchronously, so build it off the event loop
+    return LazyClient("Google Cloud Storage", lambda: storage.Client(), preload=(storage,), threaded=True)
+
+def speech_client() -> LazyClient[speech_types.SpeechAsyncClient]:
+    # gRPC aio channels bind to the running loop, so these are built on it after the import
+    return LazyClient(
+        "Speech-to-Text",
+        lambda: create_grpc_client(speech.SpeechAsyncClient, settings.SPEECH_API_ENDPOINT),
+        preload=(speech,),
+    )
+
+def tts_client() -> LazyClient[tts_types.TextToSpeechAsyncClient]:
+    return LazyClient(
+        "Text-to-Speech",
+        lambda: create_grpc_client(texttospeech.TextToSpeechAsyncClient, settings.TTS_API_ENDPOINT),
+        preload=(texttospeech,),
+    )
@@ -11,10 +11,149 @@ class Settings(BaseSettings):
     GCP_PROJECT_ID: str
     GCP_REGION: str = "us-central1"
     GCS_BUCKET_NAME: str
+    GCS_UPLOAD_WORKERS: int = 8  # threads for blocking GCS calls per worker
+    GCS_UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024  # resumable upload chunk; must be a multiple of 256 KB
+    GCS_SIGNED_URLS: bool = False  # return signed URLs instead of making objects public
+    GCS_SIGNED_URL_TTL: int = 3600  # seconds
 
     # New Google AI Gemini API Key
     GEMINI_API_KEY: str
 
+    # Plaintext gRPC endpoints for local stubs (see benchmarks/); unset means the real APIs.
+    # Cloud Storage honours the standard STORAGE_EMULATOR_HOST variable instead.
+    GEMINI_API_ENDPOINT: str | None = None  # host:port
+    SPEECH_API_ENDPOINT: str | None = None
+    TTS_API_ENDPOINT: str | None = None
+
+    # Outbound HTTP client shared by all Serper calls
+    SERPER_BASE_URL: str = "https://google.serper.dev"
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0  # seconds an idle connection is kept open
+    HTTP_TIMEOUT: float = 15.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_HTTP2: bool = True
+    SERPER_MAX_CONCURRENCY: int = 100  # max in-flight Serper requests per worker
+
+    # Adaptive per-upstream concurrency limits (per worker), load shedding and retries
+    GEMINI_MAX_CONCURRENCY: int = 32
+    SPEECH_MAX_CONCURRENCY: int = 16
+    TTS_MAX_CONCURRENCY: int = 16
+    UPSTREAM_MIN_CONCURRENCY: int = 1
+    UPSTREAM_BACKOFF_RATIO: float = 0.7  # limit multiplier applied on 429/503/timeouts
+    UPSTREAM_MAX_QUEUE: int = 100  # callers allowed to wait for a slot before shedding
+    UPSTREAM_QUEUE_TIMEOUT: float = 5.0  # seconds a caller may wait for a slot
+    UPSTREAM_MAX_RETRIES: int = 2
+    UPSTREAM_RETRY_BASE_DELAY: float = 0.25  # seconds; doubled per attempt, with full jitter
+    UPSTREAM_RETRY_MAX_DELAY: float = 4.0
+
+    # Serper search cache (scholar, lens, images), with stale-while-revalidate
+    SERPER_CACHE_ENABLED: bool = True
+    SERPER_CACHE_MAX_ENTRIES: int = 4096
+    SERPER_CACHE_TTL_SCHOLAR: float = 24 * 3600.0  # seconds an entry is fresh, per endpoint
+    SERPER_CACHE_TTL_LENS: float = 6 * 3600.0
+    SERPER_CACHE_TTL_IMAGES: float = 6 * 3600.0
+    SERPER_CACHE_STALE_TTL: float = 24 * 3600.0  # seconds a stale entry is still served while it refreshes
+    SERPER_CACHE_NEGATIVE_TTL: float = 300.0  # seconds an empty result is cached
+    SERPER_CACHE_SHARED_PATH: str | None = None  # SQLite file shared by all workers on a host
+
+    # Gemini response cache
+    GEMINI_CACHE_ENABLED: bool = True
+    GEMINI_CACHE_MAX_ENTRIES: int = 1024
+    GEMINI_CACHE_TTL: float = 3600.0  # seconds
+    GEMINI_CACHE_SHARED_PATH: str | None = None  # SQLite file shared by all workers on a host
+
+    # Semantic cache for /api/research: serves a stored answer to a rephrased
+    # question at the same level/emotion bucket (opt-in, needs numpy)
+    SEMANTIC_CACHE_ENABLED: bool = False
+    # "gemini", or "hashing": a local deterministic embedding for tests and benchmarks only. It
+    # compares spelling, not meaning, so near-misses score high ("world war 1" vs "world war 2"
+    # 0.875, "what is photosynthesis" vs "... the opposite of photosynthesis" 0.79): never run it
+    # below the default threshold
+    SEMANTIC_CACHE_EMBEDDER: str = "gemini"
+    SEMANTIC_CACHE_EMBEDDING_MODEL: str = "models/text-embedding-004"
+    SEMANTIC_CACHE_HASHING_DIM: int = 512
+    SEMANTIC_CACHE_THRESHOLD: float = 0.9  # minimum cosine similarity for a hit
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 2048  # per bucket
+    SEMANTIC_CACHE_TTL: float = 24 * 3600.0  # seconds
+    SEMANTIC_CACHE_PATH: str | None = None  # .npz file loaded at startup and saved at shutdown
+
+    # /api/summarize/batch
+    SUMMARY_BATCH_MAX_ITEMS: int = 50
+    SUMMARY_BATCH_CONCURRENCY: int = 5  # Gemini calls in flight per batch
+    SUMMARY_PACK_SIZE: int = 5  # short texts per packed prompt
+    SUMMARY_PACK_MAX_CHARS: int = 2000  # only texts up to this length are packed
+
+    # Speech-to-Text
+    STT_LANGUAGE_CODE: str = "en-US"
+    STT_SAMPLE_RATE_HERTZ: int = 48000  # browser MediaRecorder webm/opus
+    STT_STREAMING_ENCODING: str = "WEBM_OPUS"  # RecognitionConfig.AudioEncoding name for streamed audio
+
+    # Text-to-Speech
+    TTS_LANGUAGE_CODE: str = "en-US"
+    TTS_SEGMENT_TARGET_CHARS: int = 300  # short sentences are merged up to this size
+    TTS_SEGMENT_MAX_CHARS: int = 1500  # longer sentences are split, as are any over the 5000-byte API limit
+    TTS_MAX_PARALLEL: int = 4  # segments synthesized concurrently per request
+    TTS_CACHE_MAX_ENTRIES: int = 2048
+    TTS_CACHE_TTL: float = 24 * 3600.0  # seconds
+    TTS_CACHE_SHARED_PATH: str | None = None  # SQLite file shared by all workers on a host
+
+    # /api/research-bundle per-part timeouts (seconds)
+    BUNDLE_RESEARCH_TIMEOUT: float = 60.0
+    BUNDLE_IMAGES_TIMEOUT: float = 15.0
+    BUNDLE_AUDIO_TIMEOUT: float = 30.0  # counted from when the answer is complete
+    BUNDLE_AUDIO_PARAGRAPHS: int = 1  # opening paragraphs narrated in audio_intro
+
+    # Background jobs (/api/jobs)
+    JOBS_ENABLED: bool = True
+    JOBS_DB_PATH: str = "/tmp/jobs.sqlite3"  # SQLite file shared by all workers on a host
+    JOBS_CONCURRENCY: int = 4  # jobs run at once per worker
+    JOBS_MAX_QUEUED: int = 1000  # submissions are refused with 503 beyond this
+    JOBS_MAX_ATTEMPTS: int = 3  # runs of a job that was shed by an upstream or interrupted by a restart
+    JOBS_RETENTION: float = 3600.0  # seconds finished jobs and their results are kept
+    JOBS_POLL_INTERVAL: float = 1.0  # seconds between checks for jobs and status changes from other workers
+    JOBS_MAX_AUDIO_BYTES: int = 10 * 1024 * 1024  # transcription uploads; the sync Speech API limit
+
+    # Response compression (brotli when the client and server support it, else gzip)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # bytes; smaller responses are sent as-is
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4  # 0-11; 4 beats gzip -6 on size at similar CPU
+    SERPER_PASSTHROUGH: bool = True  # /search-scholar and /search-lens return Serper's bytes unparsed
+
+    # Per-client rate limits: a token bucket per client and route class (see app/core/rate_limit.py)
+    RATE_LIMIT_ENABLED: bool = False  # off by default; enable per deployment
+    RATE_LIMIT_BUCKETS: dict[str, tuple[float, float]] = {  # class -> (burst, tokens per minute), per client IP
+        "ai": (300.0, 150.0),
+        "search": (300.0, 300.0),
+        "audio": (150.0, 75.0),
+    }
+    RATE_LIMIT_MAX_CLIENTS: int = 10000  # buckets kept in memory per worker; the least recently seen are dropped
+    RATE_LIMIT_TRUSTED_PROXIES: int = 0  # X-Forwarded-For entries added by our own proxies; 1 on Cloud Run
+    RATE_LIMIT_SHARED_PATH: str | None = None  # SQLite file so limits hold across all workers on a host
+
+    # Startup
+    STARTUP_WARMUP: bool = True  # import the SDKs and create their clients in the background once serving
+
+    # Observability
+    METRICS_ENABLED: bool = True  # request metrics middleware and the /metrics endpoint
+    OTEL_ENABLED: bool = False  # emit OpenTelemetry spans per stage; needs opentelemetry-api
+
+    # Image uploads and preprocessing for /api/analyze-image
+    MAX_IMAGE_UPLOAD_BYTES: int = 20 * 1024 * 1024  # decoded image size; JSON data URLs get a base64 allowance
+    IMAGE_PREPROCESSING_ENABLED: bool = True
+    IMAGE_MAX_DIMENSION: int = 1536  # longest side in pixels after downscaling
+    IMAGE_OUTPUT_FORMAT: str = "JPEG"  # JPEG, WEBP or PNG
+    IMAGE_OUTPUT_QUALITY: int = 85
+
+    # /api/analyze-image answer cache: exact upload bytes first, then near-identical photos
+    IMAGE_CACHE_ENABLED: bool = True
+    IMAGE_CACHE_MAX_ENTRIES: int = 2048
+    IMAGE_CACHE_TTL: float = 6 * 3600.0  # seconds
+    IMAGE_CACHE_HASH_SIZE: int = 16  # dHash grid side, so the hash has HASH_SIZE**2 bits
+    IMAGE_CACHE_MAX_DISTANCE: int = 12  # differing hash bits still counted as the same photo; 0 disables that tier
+    IMAGE_CACHE_MAX_PIXEL_DIFF: int = 32  # largest per-pixel difference (0-255) between the 32x32 thumbnails of a match
+
     class Config:
         env_file = ".env"
 
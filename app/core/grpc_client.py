@@ -0,0 +1,22 @@
+# app/core/grpc_client.py
+
+from typing import TypeVar
+
+C = TypeVar("C")
+
+def plaintext_transport(client_cls: type, endpoint: str):
+    """
+    Returns a transport factory for client_cls that speaks plaintext gRPC to
+    `endpoint`, for local stubs and emulators. No credentials are sent.
+    """
+    import grpc
+
+    transport_cls = client_cls.get_transport_class("grpc_asyncio")
+    # The channel is created when the client is, so it binds to the running loop
+    return lambda **_: transport_cls(channel=grpc.aio.insecure_channel(endpoint))
+
+def create_grpc_client(client_cls: type[C], endpoint: str | None = None) -> C:
+    """Creates a Google Cloud async client, pointed at `endpoint` when one is set."""
+    if not endpoint:
+        return client_cls()
+    return client_cls(transport=plaintext_transport(client_cls, endpoint))
@@ -0,0 +1,17 @@
+# app/core/http_client.py
+
+import httpx
+from app.core.config import Settings
+
+def create_http_client(settings: Settings) -> httpx.AsyncClient:
+    """
+    Creates the connection-pooled HTTP client shared by all outbound Serper calls.
+    Reusing one client keeps TCP/TLS connections alive between requests.
+    """
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=settings.HTTP_HTTP2)
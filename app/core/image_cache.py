@@ -0,0 +1,120 @@
+# app/core/image_cache.py
+
+import time
+from typing import Any
+from app.core import metrics
+from app.core.cache import MISSING, LRUCache
+from app.core.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+_POPCOUNT = None
+
+def _popcount_table():
+    global _POPCOUNT
+    if _POPCOUNT is None:
+        _POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+    return _POPCOUNT
+
+
+class PerceptualCache:
+    """
+    Two-tier cache for results computed from images. The exact tier is keyed
+    by a digest of the uploaded bytes and is checked before the image is even
+    decoded. The perceptual tier keeps each image's perceptual hash as a row
+    of a uint8 matrix, so finding the nearest of all entries is one XOR and a
+    popcount table lookup. Every entry within `max_distance` differing bits
+    is then checked against its small grayscale thumbnail, and only one whose
+    pixels all lie within `max_pixel_diff` of the query's is a hit: a hash
+    alone cannot tell two worksheets with the same layout apart. Both tiers hold at most `max_entries` with a TTL; the perceptual tier
+    reuses an expired row first, else the least recently used one.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl: float, max_distance: int, max_pixel_diff: int):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.max_pixel_diff = max_pixel_diff
+        self.exact = LRUCache(max_entries, ttl)
+        self._hashes = None  # (rows, hash bytes) uint8 matrix, allocated on the first add
+        self._thumbnails = None  # (rows, thumbnail bytes) uint8 matrix
+        self._expires_at = None
+        self._last_used = None
+        self._values: list[Any] = []
+        self.exact_hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        metrics.registry.register_stats("image_cache", name, self.stats)
+
+    def get_exact(self, digest: str) -> Any:
+        value = self.exact.get(digest)
+        if value is not MISSING:
+            self.exact_hits += 1
+        return value
+
+    def _matches(self, image_hash: bytes | None, thumbnail: bytes | None) -> bool:
+        return (
+            image_hash is not None and thumbnail is not None and self._hashes is not None
+            and len(image_hash) == self._hashes.shape[1] and len(thumbnail) == self._thumbnails.shape[1]
+        )
+
+    def get_similar(self, image_hash: bytes | None, thumbnail: bytes | None) -> Any:
+        """Returns the value of the closest matching live image, or MISSING. Counts the miss for both tiers."""
+        n = len(self._values)
+        if n and self.max_distance > 0 and self._matches(image_hash, thumbnail):
+            now = time.time()
+            query = np.frombuffer(image_hash, dtype=np.uint8)
+            distances = _popcount_table()[self._hashes[:n] ^ query].sum(axis=1, dtype=np.int32)
+            distances[self._expires_at[:n] <= now] = np.iinfo(np.int32).max
+            candidates = np.flatnonzero(distances <= self.max_distance)
+            if candidates.size:
+                pixels = np.frombuffer(thumbnail, dtype=np.uint8).astype(np.int16)
+                pixel_diffs = np.abs(self._thumbnails[candidates].astype(np.int16) - pixels).max(axis=1)
+                candidates = candidates[pixel_diffs <= self.max_pixel_diff]
+            if candidates.size:
+                best = int(candidates[np.argmin(distances[candidates])])
+                self.perceptual_hits += 1
+                self._last_used[best] = now
+                return self._values[best]
+        self.misses += 1
+        return MISSING
+
+    def add(self, digest: str, image_hash: bytes | None, thumbnail: bytes | None, value: Any) -> None:
+        self.exact.set(digest, value)
+        if image_hash is None or thumbnail is None:
+            return
+        now = time.time()
+        if not self._matches(image_hash, thumbnail):
+            self._hashes = np.zeros((self.max_entries, len(image_hash)), dtype=np.uint8)
+            self._thumbnails = np.zeros((self.max_entries, len(thumbnail)), dtype=np.uint8)
+            self._expires_at = np.zeros(self.max_entries)
+            self._last_used = np.zeros(self.max_entries)
+            self._values = []
+        n = len(self._values)
+        if n < self.max_entries:
+            row = n
+            self._values.append(value)
+        else:
+            expired = np.flatnonzero(self._expires_at <= now)
+            row = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+            self._values[row] = value
+            self.evictions += 1
+        self._hashes[row] = np.frombuffer(image_hash, dtype=np.uint8)
+        self._thumbnails[row] = np.frombuffer(thumbnail, dtype=np.uint8)
+        self._expires_at[row] = now + self.ttl
+        self._last_used[row] = now
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.perceptual_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "perceptual_hits": self.perceptual_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.exact_hits + self.perceptual_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "exact_entries": len(self.exact),
+            "perceptual_entries": len(self._values),
+            "max_entries": self.max_entries,
+        }
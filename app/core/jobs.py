@@ -0,0 +1,428 @@
+# app/core/jobs.py
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable
+from app.core import metrics
+from app.core.limiter import UpstreamOverloaded
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+@dataclass
+class BinaryResult:
+    """A job result that is served as-is rather than as JSON (e.g. synthesized audio)."""
+    content: bytes
+    media_type: str
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str
+    priority: int
+    payload: dict
+    created_at: float
+    started_at: float | None
+    finished_at: float | None
+    attempts: int
+    error: str | None
+    result_media_type: str | None = None  # set for binary results
+    result: Any = None  # JSON result, only loaded on request
+    input: bytes | None = None  # only loaded for the worker that runs the job
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def public(self) -> dict:
+        """The job as returned by the API; binary results are fetched separately."""
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "attempts": self.attempts,
+            "error": self.error,
+        }
+        if self.result_media_type is not None:
+            data["result_media_type"] = self.result_media_type
+        else:
+            data["result"] = self.result
+        return data
+
+
+_COLUMNS = "id, kind, status, priority, payload, created_at, started_at, finished_at, attempts, error, result_media_type"
+
+
+class JobStore:
+    """
+    Job state in a local SQLite file. Every gunicorn worker on the host opens
+    the same file, so a job can be polled through any worker and is run by
+    whichever worker claims it first. Status reads select only the small
+    columns; a result (which may be a whole MP3) is read by itself, once the
+    caller actually needs it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, priority INTEGER NOT NULL, "
+            "payload TEXT NOT NULL, input BLOB, created_at REAL NOT NULL, run_after REAL NOT NULL, "
+            "started_at REAL, finished_at REAL, attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, "
+            "error TEXT, result TEXT, result_blob BLOB, result_media_type TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created_at)"
+        )
+
+    def _job(self, row: tuple, input: bytes | None = None) -> Job:
+        return Job(*row[:4], json.loads(row[4]), *row[5:], input=input)
+
+    def create(self, kind: str, payload: dict, priority: int, input: bytes | None = None) -> Job:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, priority, payload, input, created_at, run_after) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, priority, json.dumps(payload), input, now, now),
+            )
+        return Job(job_id, kind, QUEUED, priority, payload, now, None, None, 0, None)
+
+    def get(self, job_id: str, with_result: bool = False) -> Job | None:
+        """The job's status; `with_result` also loads a JSON result (binary ones are left to result())."""
+        columns = f"{_COLUMNS}, result" if with_result else _COLUMNS
+        with self._lock:
+            row = self._conn.execute(f"SELECT {columns} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        if not with_result:
+            return self._job(row)
+        job = self._job(row[:-1])
+        job.result = json.loads(row[-1]) if row[-1] is not None else None
+        return job
+
+    def result(self, job_id: str) -> Any:
+        """The job's result: decoded JSON, a BinaryResult, or None if it has none (yet)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, result_blob, result_media_type FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        result, blob, media_type = row
+        if blob is not None:
+            return BinaryResult(blob, media_type)
+        return json.loads(result) if result is not None else None
+
+    def count_queued(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def claim(self, worker: str) -> Job | None:
+        """Atomically marks the highest-priority runnable job as running for `worker` and returns it."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT {_COLUMNS}, input FROM jobs WHERE status = ? AND run_after <= ? "
+                    "ORDER BY priority DESC, created_at LIMIT 1",
+                    (QUEUED, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                        (RUNNING, worker, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = self._job(row[:-1], input=row[-1])
+        job.status, job.started_at, job.attempts = RUNNING, now, job.attempts + 1
+        return job
+
+    def finish(self, job_id: str, status: str, result: Any = None, error: str | None = None) -> None:
+        blob = media_type = encoded = None
+        if isinstance(result, BinaryResult):
+            blob, media_type = result.content, result.media_type
+        elif result is not None:
+            encoded = json.dumps(result)
+        with self._lock:
+            # The input is not needed any more once a job has finished
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?, result = ?, result_blob = ?, "
+                "result_media_type = ?, input = NULL, worker = NULL WHERE id = ?",
+                (status, time.time(), error, encoded, blob, media_type, job_id),
+            )
+
+    def requeue(self, job_id: str, delay: float = 0.0) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, started_at = NULL, run_after = ? WHERE id = ?",
+                (QUEUED, time.time() + delay, job_id),
+            )
+
+    def cancel_queued(self, job_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, input = NULL WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED),
+            )
+        return cursor.rowcount > 0
+
+    def recover(self, max_attempts: int) -> int:
+        """
+        Requeues jobs left running by worker processes that no longer exist on
+        this host (or fails them once they have used up their attempts).
+        Returns how many jobs were recovered.
+        """
+        with self._lock:
+            workers = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT worker FROM jobs WHERE status = ?", (RUNNING,)
+            )]
+        recovered = 0
+        for worker in workers:
+            if _process_alive(worker):
+                continue
+            with self._lock:
+                recovered += self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker = NULL, started_at = NULL WHERE worker = ? AND status = ? "
+                    "AND attempts < ?", (QUEUED, worker, RUNNING, max_attempts)
+                ).rowcount
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, error = ?, input = NULL, worker = NULL "
+                    "WHERE worker = ? AND status = ?",
+                    (FAILED, time.time(), "Interrupted by a worker restart", worker, RUNNING),
+                )
+        return recovered
+
+    def purge(self, retention: float) -> int:
+        """Deletes jobs that finished more than `retention` seconds ago."""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at <= ?", (time.time() - retention,)
+            ).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _process_alive(worker: str | None) -> bool:
+    try:
+        os.kill(int(worker), 0)
+    except (TypeError, ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+JobHandler = Callable[[Job], Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    Runs queued jobs on this worker's event loop. One dispatcher claims the
+    next job from the store whenever one of `concurrency` slots is free, so
+    higher priorities run first across all workers sharing the store. A job
+    that hits UpstreamOverloaded is queued again after the upstream's
+    Retry-After, up to `max_attempts` runs; jobs interrupted by shutdown are
+    queued again for the next worker.
+    """
+
+    _PURGE_EVERY = 60.0  # seconds between sweeps of expired jobs
+
+    def __init__(
+        self,
+        store: JobStore,
+        handlers: dict[str, JobHandler],
+        concurrency: int,
+        max_queued: int,
+        retention: float,
+        poll_interval: float,
+        max_attempts: int,
+    ):
+        self.store = store
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.worker = str(os.getpid())
+        self._slots = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Event()
+        self._running: dict[str, asyncio.Task] = {}
+        self._cancel_requested: set[str] = set()
+        self._dispatcher: asyncio.Task | None = None
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        metrics.registry.register_stats("jobs", "local", self.stats)
+
+    # --- Lifecycle ---
+
+    async def start(self) -> None:
+        recovered = await asyncio.to_thread(self.store.recover, self.max_attempts)
+        if recovered:
+            print(f"Requeued {recovered} interrupted job(s).")
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.to_thread(self.store.close)
+
+    # --- Client side ---
+
+    async def submit(self, kind: str, payload: dict, priority: int = 0, input: bytes | None = None) -> Job:
+        if await asyncio.to_thread(self.store.count_queued) >= self.max_queued:
+            raise UpstreamOverloaded("jobs", retry_after=max(1, int(self.poll_interval * 10)), reason="full")
+        job = await asyncio.to_thread(self.store.create, kind, payload, priority, input)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str, with_result: bool = False) -> Job | None:
+        return await asyncio.to_thread(self.store.get, job_id, with_result)
+
+    async def result(self, job_id: str) -> Any:
+        return await asyncio.to_thread(self.store.result, job_id)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancels a queued job, or one running on this worker. Returns False if neither applies."""
+        if await asyncio.to_thread(self.store.cancel_queued, job_id):
+            self._notify()
+            return True
+        task = self._running.get(job_id)
+        if task is None:
+            return False
+        self._cancel_requested.add(job_id)
+        task.cancel()
+        return True
+
+    async def watch(self, job_id: str) -> AsyncIterator[Job]:
+        """
+        Yields the job whenever its status changes, until it has finished.
+        Changes made on this worker are seen immediately, others within a
+        poll interval. Each tick reads the status only; a JSON result is
+        loaded once, for the final job.
+        """
+        last_status = None
+        while True:
+            changed = self._changed
+            job = await self.get(job_id)
+            if job is not None and job.status == SUCCEEDED:
+                job = await self.get(job_id, with_result=True)
+            if job is None:
+                return
+            if job.status != last_status:
+                last_status = job.status
+                yield job
+            if job.finished:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- Worker side ---
+
+    def _notify(self) -> None:
+        # Wakes every watcher once; later waiters get a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _dispatch(self) -> None:
+        last_purge = 0.0
+        while True:
+            if time.monotonic() - last_purge > self._PURGE_EVERY:
+                last_purge = time.monotonic()
+                try:
+                    await asyncio.to_thread(self.store.purge, self.retention)
+                except sqlite3.Error as e:
+                    print(f"Purging finished jobs failed: {e}")
+
+            await self._slots.acquire()
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self.store.claim, self.worker)
+            except sqlite3.Error as e:
+                print(f"Claiming a job failed: {e}")
+                job = None
+            if job is None:
+                self._slots.release()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._running[job.id] = asyncio.create_task(self._run(job))
+            self._notify()
+
+    async def _run(self, job: Job) -> None:
+        try:
+            handler = self.handlers.get(job.kind)
+            if handler is None:
+                raise ValueError(f"Unknown job kind '{job.kind}'")
+            result = await handler(job)
+            await asyncio.to_thread(self.store.finish, job.id, SUCCEEDED, result)
+            self.completed += 1
+        except asyncio.CancelledError:
+            if job.id in self._cancel_requested:
+                await asyncio.to_thread(self.store.finish, job.id, CANCELLED, None, "Cancelled")
+            else:
+                # Shutting down: leave the job for another worker or the next start
+                await asyncio.to_thread(self.store.requeue, job.id)
+        except UpstreamOverloaded as e:
+            if job.attempts < self.max_attempts:
+                self.retried += 1
+                await asyncio.to_thread(self.store.requeue, job.id, e.retry_after)
+            else:
+                self.failed += 1
+                await asyncio.to_thread(self.store.finish, job.id, FAILED, None, str(e))
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            self.failed += 1
+            await asyncio.to_thread(self.store.finish, job.id, FAILED, None, str(e))
+        finally:
+            self._running.pop(job.id, None)
+            self._cancel_requested.discard(job.id)
+            self._slots.release()
+            self._notify()
+            self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "concurrency": self.concurrency,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
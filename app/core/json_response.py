@@ -0,0 +1,22 @@
+# app/core/json_response.py
+
+from typing import Any
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    The app's default response class: JSON rendered by orjson when it is
+    installed, which is several times faster than the json module on large
+    answers, else exactly what JSONResponse renders.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
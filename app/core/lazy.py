@@ -0,0 +1,118 @@
+# app/core/lazy.py
+
+import asyncio
+import importlib
+import threading
+import time
+from types import ModuleType
+from typing import Any, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class LazyModule:
+    """
+    Stands in for a module until one of its attributes is first used, so heavy
+    SDKs are not imported while the worker starts. `on_load` runs once, right
+    after the import (e.g. to configure the SDK). The proxy's own members are
+    underscored so they cannot shadow the module's (numpy.load, for one).
+    Async code should `await ensure_loaded(...)` before first use: touching
+    an attribute imports on the calling thread, and on the event loop that
+    (or waiting for the warm-up thread's import) would stall every request.
+    """
+
+    def __init__(self, name: str, on_load: Callable[[ModuleType], None] | None = None):
+        self._name = name
+        self._on_load = on_load
+        self._module: ModuleType | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def _loaded(self) -> bool:
+        return self._module is not None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    if self._on_load is not None:
+                        self._on_load(module)
+                    self._module = module
+                    print(f"Imported {self._name} in {(time.perf_counter() - started) * 1000:.0f} ms.")
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._module or self._load(), attr)
+
+    def __repr__(self) -> str:
+        return f"<LazyModule {self._name} ({'loaded' if self._loaded else 'not loaded'})>"
+
+
+async def ensure_loaded(*modules: LazyModule) -> None:
+    """Imports any of `modules` not loaded yet in a worker thread; a no-op once they are."""
+    for module in modules:
+        if not module._loaded:
+            await asyncio.to_thread(module._load)
+
+
+_lazy_modules: dict[str, LazyModule] = {}
+
+def lazy_import(name: str, on_load: Callable[[ModuleType], None] | None = None) -> LazyModule:
+    """Returns the shared lazy proxy for module `name`."""
+    module = _lazy_modules.get(name)
+    if module is None:
+        module = _lazy_modules[name] = LazyModule(name, on_load)
+    return module
+
+
+class LazyClient(Generic[T]):
+    """
+    Creates an SDK client on first use rather than at startup. The SDK modules
+    in `preload` are imported in a worker thread first, so a cold first request
+    does not stall the event loop for everyone else; `factory` then runs in a
+    thread too when `threaded`, or on the event loop for clients (like gRPC
+    aio ones) that must be created there. Concurrent first users share one
+    creation, and a failed creation is retried by the next caller.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[], T],
+        preload: tuple[LazyModule, ...] = (),
+        threaded: bool = False,
+    ):
+        self.name = name
+        self._factory = factory
+        self._preload = preload
+        self._threaded = threaded
+        self._client: T | None = None
+        self._task: asyncio.Future | None = None
+
+    @property
+    def client(self) -> T | None:
+        """The client if it has been created, else None."""
+        return self._client
+
+    async def get(self) -> T:
+        if self._client is not None:
+            return self._client
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._create())
+        task = self._task
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            if self._task is task:
+                self._task = None
+            raise
+
+    async def _create(self) -> T:
+        started = time.perf_counter()
+        await ensure_loaded(*self._preload)
+        client = await asyncio.to_thread(self._factory) if self._threaded else self._factory()
+        self._client = client
+        print(f"{self.name} client initialized in {(time.perf_counter() - started) * 1000:.0f} ms.")
+        return client
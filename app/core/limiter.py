@@ -0,0 +1,210 @@
+# app/core/limiter.py
+
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, TypeVar
+import httpx
+from app.core.config import settings
+from app.core import metrics
+
+T = TypeVar("T")
+
+
+class UpstreamOverloaded(Exception):
+    """
+    Raised when a call to an upstream is shed, either because its queue is
+    full or the queue-time budget ran out, or because it kept answering 429.
+    main.py turns this into a 503 with a Retry-After header.
+    """
+
+    def __init__(self, upstream: str, retry_after: int, reason: str = "overloaded"):
+        super().__init__(f"Upstream '{upstream}' is {reason}, retry in {retry_after}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+def _status_code(error: BaseException) -> int | None:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    # google.api_core exceptions carry the HTTP status as an int `code`
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+def is_overload_error(error: BaseException) -> bool:
+    """True for signals that the upstream itself is saturated (429, 503, timeouts)."""
+    status = _status_code(error)
+    if status is not None:
+        return status in (429, 503)
+    return isinstance(error, (httpx.TimeoutException, asyncio.TimeoutError))
+
+def is_retryable(error: BaseException) -> bool:
+    """True for 429, 5xx and transport-level failures."""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one upstream. The limit grows by roughly one
+    per window of successful calls while it is being used, and is cut by
+    `backoff_ratio` whenever the upstream signals overload. Callers beyond the
+    limit queue for at most `queue_timeout` seconds, and at most `max_queue`
+    of them wait at once; everyone else is shed with UpstreamOverloaded.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_limit: int,
+        min_limit: int = 1,
+        max_queue: int = 100,
+        queue_timeout: float = 5.0,
+        backoff_ratio: float = 0.7,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self.completed = 0
+        self.overloads = 0
+        self.shed = 0
+        metrics.registry.register_stats("upstream_limiter", name, self.stats)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_timeout))
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < max(self.min_limit, int(self.limit))
+
+    async def acquire(self) -> None:
+        if self._has_capacity() and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            raise UpstreamOverloaded(self.name, self.retry_after, "overloaded (queue full)")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.in_flight -= 1
+                self._wake_waiters()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed += 1
+                raise UpstreamOverloaded(self.name, self.retry_after, "overloaded (queue timeout)")
+            raise
+
+    def release(self, overloaded: bool = False) -> None:
+        saturated = self.in_flight >= int(self.limit)
+        self.in_flight -= 1
+        if overloaded:
+            self.overloads += 1
+            self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+        else:
+            self.completed += 1
+            # Only grow while the limit is actually the bottleneck
+            if saturated:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self):
+        queued_at = time.perf_counter()
+        await self.acquire()
+        started = time.perf_counter()
+        metrics.upstream_queue_wait.observe(started - queued_at, upstream=self.name)
+        outcome = "ok"
+        try:
+            yield
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            outcome = "overloaded" if is_overload_error(e) else "error"
+            raise
+        finally:
+            metrics.upstream_duration.observe(time.perf_counter() - started, upstream=self.name, outcome=outcome)
+            self.release(outcome == "overloaded")
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "overloads": self.overloads,
+            "shed": self.shed,
+        }
+
+
+def _build_limiter(name: str, max_limit: int) -> AdaptiveLimiter:
+    return AdaptiveLimiter(
+        name,
+        max_limit=max_limit,
+        min_limit=settings.UPSTREAM_MIN_CONCURRENCY,
+        max_queue=settings.UPSTREAM_MAX_QUEUE,
+        queue_timeout=settings.UPSTREAM_QUEUE_TIMEOUT,
+        backoff_ratio=settings.UPSTREAM_BACKOFF_RATIO,
+    )
+
+# One limiter per upstream, shared by everything in this worker
+limiters = {
+    "gemini": _build_limiter("gemini", settings.GEMINI_MAX_CONCURRENCY),
+    "serper": _build_limiter("serper", settings.SERPER_MAX_CONCURRENCY),
+    "speech": _build_limiter("speech", settings.SPEECH_MAX_CONCURRENCY),
+    "tts": _build_limiter("tts", settings.TTS_MAX_CONCURRENCY),
+}
+
+async def call_upstream(upstream: str, fn: Callable[[], Awaitable[T]]) -> T:
+    """
+    Runs fn under the upstream's adaptive limit, retrying 429/5xx/transport
+    failures with full-jitter exponential backoff. If the upstream is still
+    rate limiting after the last retry, raises UpstreamOverloaded so clients
+    get a 503 with Retry-After instead of an opaque 500.
+    """
+    limiter = limiters[upstream]
+    retries = settings.UPSTREAM_MAX_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            async with limiter.slot():
+                return await fn()
+        except UpstreamOverloaded:
+            raise
+        except Exception as e:
+            if attempt < retries and is_retryable(e):
+                delay = min(settings.UPSTREAM_RETRY_MAX_DELAY, settings.UPSTREAM_RETRY_BASE_DELAY * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, delay))
+                continue
+            if _status_code(e) == 429:
+                raise UpstreamOverloaded(upstream, limiter.retry_after, "rate limiting us") from e
+            raise
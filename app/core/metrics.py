@@ -0,0 +1,289 @@
+# app/core/metrics.py
+
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Callable
+from app.core.config import settings
+
+try:
+    from fastapi.routing import iter_route_contexts
+except ImportError:  # Older FastAPI copies included routes, so their own path already has the prefix
+    iter_route_contexts = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram. Each label set keeps one count per bucket plus a sum
+    and total, so observe() is a bisect and three additions.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            # [per-bucket counts..., +Inf count], sum
+            series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Holds this worker's metrics and renders them in the Prometheus text format.
+    Components that already keep their own counters (caches, single-flight
+    groups, limiters) register a stats() callable instead of duplicating them;
+    every numeric field is exported as a gauge named `<kind>_<field>`.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._stats_sources: list[tuple[str, str, Callable[[], dict]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def register_stats(self, kind: str, name: str, stats: Callable[[], dict]) -> None:
+        self._stats_sources.append((kind, name, stats))
+
+    def _render_stats(self) -> list[str]:
+        families: dict[str, list[str]] = {}
+        for kind, name, stats in self._stats_sources:
+            for field, value in stats().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                families.setdefault(f"{kind}_{field}", []).append(f'{{name="{_escape(name)}"}} {value}')
+        lines = []
+        for family, samples in families.items():
+            lines.append(f"# TYPE {family} gauge")
+            lines.extend(family + sample for sample in samples)
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        lines.extend(self._render_stats())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte.",
+    ("method", "route", "status")
+)
+http_first_byte = registry.histogram(
+    "http_response_first_byte_seconds", "Time from request start to the response headers.",
+    ("method", "route")
+)
+http_request_size = registry.histogram(
+    "http_request_size_bytes", "Request body size.", ("method", "route"), SIZE_BUCKETS
+)
+http_response_size = registry.histogram(
+    "http_response_size_bytes", "Response body size.", ("method", "route"), SIZE_BUCKETS
+)
+http_in_flight = registry.gauge("http_requests_in_flight", "Requests currently being served.", ("method",))
+upstream_duration = registry.histogram(
+    "upstream_request_duration_seconds", "Time spent in one upstream call attempt.", ("upstream", "outcome")
+)
+upstream_queue_wait = registry.histogram(
+    "upstream_queue_wait_seconds", "Time spent waiting for an upstream concurrency slot.", ("upstream",)
+)
+stage_duration = registry.histogram(
+    "stage_duration_seconds", "Time spent in one named stage of a request.", ("stage", "outcome")
+)
+
+
+_tracer = None
+
+def _get_tracer():
+    """Returns an OpenTelemetry tracer when OTEL_ENABLED and the API is installed, else None."""
+    global _tracer
+    if _tracer is None:
+        _tracer = False
+        if settings.OTEL_ENABLED:
+            try:
+                from opentelemetry import trace
+                _tracer = trace.get_tracer("app")
+            except ImportError:
+                print("OTEL_ENABLED is set but opentelemetry-api is not installed; spans are disabled.")
+    return _tracer or None
+
+@contextmanager
+def stage(name: str, **attributes):
+    """
+    Times one stage of a request into stage_duration_seconds and, with
+    OTEL_ENABLED, wraps it in a span. Exporting spans is left to whatever
+    OpenTelemetry SDK the process is launched with.
+    """
+    tracer = _get_tracer()
+    span = tracer.start_as_current_span(name, attributes=attributes or None) if tracer else nullcontext()
+    started = time.perf_counter()
+    outcome = "ok"
+    with span:
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            stage_duration.observe(time.perf_counter() - started, stage=name, outcome=outcome)
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, time to first byte, body sizes and
+    in-flight requests for every HTTP request. Requests are labelled with the
+    matched route template rather than the raw path, so path parameters and
+    unknown URLs cannot blow up the number of series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: dict[int, str] | None = None
+
+    def _route_label(self, scope) -> str:
+        """The matched route's full template, e.g. /api/jobs/{job_id}, behind any mount prefix."""
+        route = scope.get("route")
+        if route is None:
+            return "<unmatched>"
+        if self._route_paths is None and iter_route_contexts is not None:
+            # The router puts the route as declared in scope, without its include_router
+            # prefix; the app's route contexts map each one to the path it is served at
+            self._route_paths = {
+                id(context.original_route): context.path_format
+                for context in iter_route_contexts(scope["app"].routes)
+                if context.path_format
+            }
+        path = (self._route_paths or {}).get(id(route)) or getattr(route, "path_format", None) or route.path
+        return scope.get("root_path", "").rstrip("/") + path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        state = {"status": 500, "request_bytes": 0, "response_bytes": 0, "first_byte": None}
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["request_bytes"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["first_byte"] = time.perf_counter() - started
+            elif message["type"] == "http.response.body":
+                state["response_bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc(method=method)
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            http_in_flight.dec(method=method)
+            # The router stores the matched route in the shared scope dict
+            route = self._route_label(scope)
+            http_request_duration.observe(
+                time.perf_counter() - started, method=method, route=route, status=state["status"]
+            )
+            if state["first_byte"] is not None:
+                http_first_byte.observe(state["first_byte"], method=method, route=route)
+            http_request_size.observe(state["request_bytes"], method=method, route=route)
+            http_response_size.observe(state["response_bytes"], method=method, route=route)
@@ -0,0 +1,290 @@
+# app/core/rate_limit.py
+"""
+Per-client token buckets for the expensive routes.
+
+A client is an IP address: the peer address, or with trusted_proxies = n the
+n-th X-Forwarded-For entry from the right. Only count proxies you run: with
+none in front, a client can write its own X-Forwarded-For and get a fresh
+bucket per request. Behind Cloud Run the peer is Google's front end, which
+appends the real client address, so use 1 there (with 0 every user shares
+the front end's bucket). Everyone behind one NAT, such as a school's, is one
+client, so budgets should allow for a classroom sharing an address.
+
+Buckets live in each worker's memory unless a shared SQLite path is given,
+so without one a client gets up to (gunicorn workers) x the configured limit
+per instance; separate instances never share buckets.
+"""
+
+import asyncio
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+from app.core import metrics
+
+
+def _refill(tokens: float, updated_at: float, now: float, capacity: float, rate: float) -> float:
+    return min(capacity, tokens + (now - updated_at) * rate)
+
+def _take(tokens: float, cost: float, rate: float) -> tuple[bool, float, float]:
+    """Returns (allowed, tokens left, seconds until `cost` tokens are available)."""
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+
+class MemoryBuckets:
+    """
+    Token buckets for this worker, one per key, in an LRU-ordered dict: a
+    take is a dict lookup, a move_to_end and some arithmetic. Once more than
+    `max_keys` keys are tracked the least recently seen is dropped, which
+    only forgets a client that has been idle the longest (its bucket has
+    most likely refilled anyway).
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self.evictions = 0
+
+    def take(self, key: str, cost: float, capacity: float, rate: float) -> tuple[bool, float, float]:
+        now = time.monotonic()
+        state = self._buckets.get(key)
+        tokens = capacity if state is None else _refill(*state, now, capacity, rate)
+        allowed, tokens, retry_after = _take(tokens, cost, rate)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+        return allowed, tokens, retry_after
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteBuckets:
+    """
+    Token buckets in a SQLite file shared by every worker on the host, so a
+    client's limit holds across gunicorn workers. Calls are blocking;
+    RateLimiter runs them in a worker thread.
+    """
+
+    _PURGE_EVERY = 1024  # takes between sweeps of idle buckets
+
+    def __init__(self, path: str, idle_ttl: float):
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._takes = 0
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def take(self, key: str, cost: float, capacity: float, rate: float) -> tuple[bool, float, float]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tokens, updated_at FROM rate_limit WHERE key = ?", (key,)).fetchone()
+                tokens = capacity if row is None else _refill(*row, now, capacity, rate)
+                allowed, tokens, retry_after = _take(tokens, cost, rate)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_limit (key, tokens, updated_at) VALUES (?, ?, ?)", (key, tokens, now)
+                )
+                self._takes += 1
+                if self._takes % self._PURGE_EVERY == 0:
+                    # A bucket idle this long is full again, so forgetting it changes nothing
+                    self._conn.execute("DELETE FROM rate_limit WHERE updated_at < ?", (now - self.idle_ttl,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return allowed, tokens, retry_after
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rate_limit").fetchone()[0]
+
+
+@dataclass
+class RouteRule:
+    """How much a request to one route draws from its client's bucket for `route_class`."""
+    route_class: str
+    cost: float = 1.0  # also charged when the body is not a valid request
+    body_cost: Callable[[dict], float] | None = None  # cost from the JSON body, when it can be read
+    max_cost: float = math.inf  # charged when the body is too long to read ahead (capped at the capacity)
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: float
+    remaining: float
+    reset: float  # seconds until the bucket is full again
+    retry_after: float
+
+    def headers(self) -> list[tuple[bytes, bytes]]:
+        headers = [
+            (b"ratelimit-limit", str(int(self.limit)).encode()),
+            (b"ratelimit-remaining", str(int(self.remaining)).encode()),
+            (b"ratelimit-reset", str(math.ceil(self.reset)).encode()),
+        ]
+        if not self.allowed:
+            headers.append((b"retry-after", str(max(1, math.ceil(self.retry_after))).encode()))
+        return headers
+
+
+class RateLimiter:
+    """
+    Per-client token buckets, one per route class. `buckets` maps each class
+    to (capacity, tokens refilled per minute); a request costing more than a
+    bucket's capacity is charged the full capacity, so it still runs once
+    the bucket is full.
+    """
+
+    def __init__(self, buckets: dict[str, tuple[float, float]], max_clients: int, shared_path: str | None = None):
+        self.buckets = {name: (capacity, per_minute / 60.0) for name, (capacity, per_minute) in buckets.items()}
+        self.memory = MemoryBuckets(max_clients)
+        idle_ttl = max((capacity / rate for capacity, rate in self.buckets.values()), default=0.0)
+        self.shared = SQLiteBuckets(shared_path, idle_ttl) if shared_path else None
+        self._stats = {name: {"allowed": 0, "limited": 0, "tokens_spent": 0.0} for name in self.buckets}
+        for name in self.buckets:
+            metrics.registry.register_stats("rate_limit", name, lambda name=name: self._stats[name])
+
+    async def check(self, client: str, route_class: str, cost: float) -> Decision | None:
+        """Charges `cost` to the client's bucket; None if the class has no limit."""
+        if route_class not in self.buckets:
+            return None
+        capacity, rate = self.buckets[route_class]
+        cost = min(cost, capacity)
+        key = f"{route_class}:{client}"
+        if self.shared is not None:
+            allowed, tokens, retry_after = await asyncio.to_thread(self.shared.take, key, cost, capacity, rate)
+        else:
+            allowed, tokens, retry_after = self.memory.take(key, cost, capacity, rate)
+        stats = self._stats[route_class]
+        if allowed:
+            stats["allowed"] += 1
+            stats["tokens_spent"] += cost
+        else:
+            stats["limited"] += 1
+        return Decision(allowed, capacity, tokens, (capacity - tokens) / rate, retry_after)
+
+    def stats(self) -> dict:
+        return {
+            "classes": self._stats,
+            "clients_tracked": len(self.memory),
+            "evictions": self.memory.evictions,
+            "shared": self.shared is not None,
+        }
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware applying RateLimiter to the routes in `rules`, keyed
+    by path. For rules with a body_cost, bodies of up to `peek_bytes` (sized
+    or chunked) are read ahead and replayed to the app unchanged; a longer
+    one is charged the rule's max_cost. Allowed responses carry RateLimit-Limit/-Remaining/-Reset;
+    refused ones are a 429 with Retry-After (websockets are closed with 1008).
+    """
+
+    def __init__(
+        self,
+        app,
+        limiter: RateLimiter,
+        rules: dict[str, RouteRule],
+        trusted_proxies: int = 0,
+        peek_bytes: int = 64 * 1024,
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.rules = rules
+        self.trusted_proxies = trusted_proxies
+        self.peek_bytes = peek_bytes
+
+    def _client(self, scope) -> str:
+        if self.trusted_proxies:
+            # Each trusted proxy appends the address it received the request from
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    hops = [hop.strip() for hop in value.decode("latin-1").split(",")]
+                    if len(hops) >= self.trusted_proxies:
+                        return hops[-self.trusted_proxies]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def _peek(self, scope, receive):
+        """Reads the request body ahead; returns (body, or None if longer than peek_bytes, receive that replays it)."""
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.peek_bytes:
+                return None, receive
+
+        messages, body, complete = [], b"", False
+        while len(body) <= self.peek_bytes:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                complete = True
+                break
+
+        async def replay():
+            return messages.pop(0) if messages else await receive()
+
+        return (body if complete and len(body) <= self.peek_bytes else None), replay
+
+    async def __call__(self, scope, receive, send):
+        rule = self.rules.get(scope["path"].rstrip("/")) if scope["type"] in ("http", "websocket") else None
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        cost = rule.cost
+        if rule.body_cost is not None and scope["type"] == "http":
+            body, receive = await self._peek(scope, receive)
+            if body is None:
+                cost = rule.max_cost
+            else:
+                try:
+                    data = json.loads(body)
+                    if isinstance(data, dict):
+                        cost = rule.body_cost(data)
+                except (ArithmeticError, KeyError, TypeError, ValueError):
+                    pass  # Malformed bodies are rejected by validation; charge the default cost
+
+        decision = await self.limiter.check(self._client(scope), rule.route_class, cost)
+        if decision is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not decision.allowed:
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close", "code": 1008, "reason": "Rate limit exceeded"})
+                return
+            body = json.dumps({"detail": f"Rate limit exceeded for {rule.route_class} requests"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    *decision.headers(),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), *decision.headers()]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
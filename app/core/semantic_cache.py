@@ -0,0 +1,194 @@
+# app/core/semantic_cache.py
+
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Sequence
+from app.core import metrics
+from app.core.lazy import lazy_import
+
+# Only imported once the (opt-in) semantic cache is actually used
+np = lazy_import("numpy")
+
+# Words that say how a question is asked rather than what it is about
+_FILLER_WORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "were", "of", "to", "me", "us", "i", "you", "can", "could",
+    "please", "what", "explain", "describe", "tell", "about", "give", "in", "simple", "terms",
+})
+_WORD = re.compile(r"\w+")
+
+def hashing_embedding(text: str, dim: int) -> "np.ndarray":
+    """
+    Deterministic local embedding: words and their character trigrams hashed
+    into `dim` signed buckets. Needs no network, so tests and benchmarks can
+    run the semantic cache without an embedding model. It only catches
+    rephrasings that share most of their content words, and questions that
+    differ in one short word ("world war 1" / "world war 2") still score
+    high, so it is not meant for production.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in _WORD.findall(text.lower()):
+        if word in _FILLER_WORDS:
+            continue
+        padded = f" {word} "
+        for feature in [word] + [padded[i:i + 3] for i in range(len(padded) - 2)]:
+            h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            vector[h % dim] += 1.0 if h >> 63 else -1.0
+    return vector
+
+
+class _Bucket:
+    """One level/emotion partition: a row per entry, grown by doubling up to the cap."""
+
+    def __init__(self, dim: int, capacity: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires_at = np.zeros(capacity)
+        self.last_used = np.zeros(capacity)
+        self.questions: list[str] = []
+        self.answers: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def grow(self, capacity: int) -> None:
+        n = len(self)
+        vectors = np.zeros((capacity, self.vectors.shape[1]), dtype=np.float32)
+        vectors[:n] = self.vectors[:n]
+        self.vectors = vectors
+        self.expires_at = np.resize(self.expires_at, capacity)
+        self.last_used = np.resize(self.last_used, capacity)
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour answer cache. Entries are unit vectors in one matrix per
+    bucket, so a lookup is a single matrix-vector product; the best match is a
+    hit if its cosine similarity reaches `threshold`. Each bucket holds at most
+    `max_entries`; a full bucket reuses an expired row first, else the least
+    recently used one. Everything runs on the event loop: a lookup over a
+    full bucket of 768-dim vectors takes well under a millisecond.
+    """
+
+    def __init__(self, name: str, threshold: float, max_entries: int, ttl: float):
+        self.name = name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._buckets: dict[str, _Bucket] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        metrics.registry.register_stats("semantic_cache", name, self.stats)
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> "np.ndarray | None":
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def get(self, bucket_name: str, vector: Sequence[float]) -> str | None:
+        """Returns the answer of the closest live entry in the bucket, if it is close enough."""
+        bucket = self._buckets.get(bucket_name)
+        query = self._unit(vector)
+        if not bucket or query is None or query.shape[0] != bucket.vectors.shape[1]:
+            self.misses += 1
+            return None
+        n = len(bucket)
+        now = time.time()
+        scores = bucket.vectors[:n] @ query
+        scores[bucket.expires_at[:n] <= now] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        bucket.last_used[best] = now
+        return bucket.answers[best]
+
+    def add(self, bucket_name: str, question: str, vector: Sequence[float], answer: str) -> None:
+        unit = self._unit(vector)
+        if unit is None:
+            return
+        bucket = self._buckets.get(bucket_name)
+        if bucket is None or bucket.vectors.shape[1] != unit.shape[0]:
+            # A new bucket, or an embedding model with a different size replaced the old one
+            bucket = self._buckets[bucket_name] = _Bucket(unit.shape[0], min(64, self.max_entries))
+        now = time.time()
+        n = len(bucket)
+        if n < self.max_entries:
+            if n == bucket.vectors.shape[0]:
+                bucket.grow(min(2 * n, self.max_entries))
+            row = n
+            bucket.questions.append(question)
+            bucket.answers.append(answer)
+        else:
+            expired = np.flatnonzero(bucket.expires_at[:n] <= now)
+            row = int(expired[0]) if expired.size else int(np.argmin(bucket.last_used[:n]))
+            bucket.questions[row] = question
+            bucket.answers[row] = answer
+            self.evictions += 1
+        bucket.vectors[row] = unit
+        bucket.expires_at[row] = now + self.ttl
+        bucket.last_used[row] = now
+
+    def save(self, path: str) -> int:
+        """
+        Writes every live entry to a .npz file and returns how many were saved.
+        The file is replaced atomically, so workers saving at shutdown cannot
+        leave a torn file behind (the last one to finish wins).
+        """
+        now = time.time()
+        arrays, meta, saved = {}, [], 0
+        for index, (name, bucket) in enumerate(self._buckets.items()):
+            n = len(bucket)
+            live = np.flatnonzero(bucket.expires_at[:n] > now)
+            arrays[f"vectors_{index}"] = bucket.vectors[live]
+            arrays[f"expires_at_{index}"] = bucket.expires_at[live]
+            meta.append({
+                "bucket": name,
+                "questions": [bucket.questions[i] for i in live],
+                "answers": [bucket.answers[i] for i in live],
+            })
+            saved += live.size
+        arrays["meta"] = np.array(json.dumps(meta))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+        return saved
+
+    def load(self, path: str) -> int:
+        """Replaces the index with the live entries saved at `path`; returns how many were loaded."""
+        if not os.path.exists(path):
+            return 0
+        now = time.time()
+        buckets: dict[str, _Bucket] = {}
+        with np.load(path, allow_pickle=False) as data:
+            for index, entry in enumerate(json.loads(str(data["meta"]))):
+                vectors = data[f"vectors_{index}"]
+                expires_at = data[f"expires_at_{index}"]
+                # Keep the entries expiring last if the cap was lowered since the save
+                rows = [i for i in np.argsort(-expires_at)[:self.max_entries] if expires_at[i] > now]
+                if not rows:
+                    continue
+                bucket = buckets[entry["bucket"]] = _Bucket(vectors.shape[1], max(len(rows), min(64, self.max_entries)))
+                bucket.vectors[:len(rows)] = vectors[rows]
+                bucket.expires_at[:len(rows)] = expires_at[rows]
+                bucket.questions = [entry["questions"][i] for i in rows]
+                bucket.answers = [entry["answers"][i] for i in rows]
+        self._buckets = buckets
+        return sum(len(bucket) for bucket in buckets.values())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "buckets": len(self._buckets),
+            "entries": sum(len(bucket) for bucket in self._buckets.values()),
+            "max_entries_per_bucket": self.max_entries,
+        }
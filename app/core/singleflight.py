@@ -0,0 +1,47 @@
+# app/core/singleflight.py
+
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+from app.core import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one upstream call.
+    Every caller awaiting the key receives the same result or exception.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.calls = 0  # upstream calls actually made
+        self.collapsed = 0  # callers served by another caller's upstream call
+        metrics.registry.register_stats("singleflight", name, self.stats)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.collapsed += 1
+        # Shield the shared task so one caller going away does not cancel it for the rest.
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every waiter was cancelled.
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._inflight),
+        }
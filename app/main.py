@@ -1,32 +1,123 @@
 # app/main.py
 
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from google.cloud import storage
 
 from app.core.config import settings
-from app.api.routers import ai_processing, audio, external_search, utility
+from app.core import clients, metrics
+from app.core.compression import CompressionMiddleware
+from app.core.http_client import create_http_client
+from app.core.jobs import JobQueue, JobStore
+from app.core.json_response import FastJSONResponse
+from app.core.rate_limit import RateLimiter, RateLimitMiddleware
+from app.core.limiter import UpstreamOverloaded
+from app.api.rate_limits import RATE_LIMIT_RULES
+from app.api.routers import ai_processing, audio, external_search, jobs, utility
+from app.services import ai_service, job_service
+
+_import_ms = (time.perf_counter() - _import_started) * 1000
+
+async def _warm_up(app: FastAPI):
+    """
+    Imports the Google SDKs, creates their clients and builds the Gemini
+    model registry in the background, so the worker can report healthy and
+    serve cheap routes while this runs. Anything that fails here is simply
+    retried on first use.
+    """
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        app.state.storage_client.get(),
+        app.state.speech_client.get(),
+        app.state.tts_client.get(),
+        # Builds the Gemini models for all fixed system prompts once per worker
+        asyncio.to_thread(ai_service.warm_model_registry),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Warm-up step failed, it will be retried on first use: {result!r}")
+    if isinstance(results[-1], int):
+        print(f"Gemini model registry warmed ({results[-1]} models).")
+    print(f"--- Background warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms ---")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- Startup ---
+    started = time.perf_counter()
     print("--- Server Starting Up ---")
-   
 
-    # Initialize Cloud Storage client
-    # No need to add to app.state if only used in file_service
-    # But it's good practice to initialize clients at startup.
-    app.state.storage_client = storage.Client()
-    print("Google Cloud Storage client initialized.")
+    # One pooled HTTP client for all Serper calls, so connections are reused
+    app.state.http_client = create_http_client(settings)
+    print("Shared HTTP client initialized.")
+
+    # Cloud Storage, Speech-to-Text and Text-to-Speech clients are created on
+    # first use, and the SDKs behind them are imported then, not at startup
+    app.state.storage_client = clients.storage_client()
+    app.state.speech_client = clients.speech_client()
+    app.state.tts_client = clients.tts_client()
+
+    if settings.SEMANTIC_CACHE_ENABLED and settings.SEMANTIC_CACHE_PATH:
+        loaded = await asyncio.to_thread(ai_service.research_semantic_cache.load, settings.SEMANTIC_CACHE_PATH)
+        print(f"Semantic cache loaded ({loaded} entries).")
+
+    # Research, TTS and transcription jobs submitted to /api/jobs run on this worker's loop
+    if settings.JOBS_ENABLED:
+        app.state.job_queue = JobQueue(
+            JobStore(settings.JOBS_DB_PATH),
+            job_service.job_handlers(app.state),
+            concurrency=settings.JOBS_CONCURRENCY,
+            max_queued=settings.JOBS_MAX_QUEUED,
+            retention=settings.JOBS_RETENTION,
+            poll_interval=settings.JOBS_POLL_INTERVAL,
+            max_attempts=settings.JOBS_MAX_ATTEMPTS,
+        )
+        await app.state.job_queue.start()
+
+    warm_up = asyncio.create_task(_warm_up(app)) if settings.STARTUP_WARMUP else None
 
-    print("--- Startup Complete ---")
+    print(f"--- Startup Complete (imports {_import_ms:.0f} ms, startup {(time.perf_counter() - started) * 1000:.0f} ms) ---")
     yield
     # --- Shutdown ---
     print("--- Server Shutting Down ---")
+    if warm_up is not None:
+        warm_up.cancel()
+    if settings.JOBS_ENABLED:
+        # Jobs still running are queued again for another worker or the next start
+        await app.state.job_queue.stop()
+    if settings.SEMANTIC_CACHE_ENABLED and settings.SEMANTIC_CACHE_PATH:
+        try:
+            saved = await asyncio.to_thread(ai_service.research_semantic_cache.save, settings.SEMANTIC_CACHE_PATH)
+            print(f"Semantic cache saved ({saved} entries).")
+        except Exception as e:
+            print(f"Could not save the semantic cache: {e}")
+    await app.state.http_client.aclose()
 
 
-app = FastAPI(title="AI Learning Assistant API on GCP", lifespan=lifespan)
+app = FastAPI(title="AI Learning Assistant API on GCP", lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Per-client limits on the AI, search and audio routes. Added before CORS so
+# that 429 responses still carry CORS headers and browsers can read them.
+rate_limiter = RateLimiter(
+    settings.RATE_LIMIT_BUCKETS,
+    max_clients=settings.RATE_LIMIT_MAX_CLIENTS,
+    shared_path=settings.RATE_LIMIT_SHARED_PATH,
+) if settings.RATE_LIMIT_ENABLED else None
+app.state.rate_limiter = rate_limiter
+if rate_limiter is not None:
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=rate_limiter,
+        rules=RATE_LIMIT_RULES,
+        trusted_proxies=settings.RATE_LIMIT_TRUSTED_PROXIES,
+    )
 
 # Setup CORS Middleware
 app.add_middleware(
@@ -37,6 +128,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Added before the metrics middleware, so response sizes are counted as sent
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+
+# Request latency, payload size and in-flight metrics for every route
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+@app.exception_handler(UpstreamOverloaded)
+async def upstream_overloaded_handler(request: Request, exc: UpstreamOverloaded):
+    # Shed load early with a retryable status instead of letting requests time out
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(RequestValidationError)
+async def validation_error_handler(request: Request, exc: RequestValidationError):
+    # The errors echo the input, which may hold numbers JSON has no literal for
+    # (a "level" of 1e999 parses as inf); orjson writes those as null
+    return FastJSONResponse(status_code=422, content={"detail": jsonable_encoder(exc.errors())})
+
 # NOTE: We no longer mount a static directory. 
 # File URLs will point directly to Google Cloud Storage.
 
@@ -46,9 +165,18 @@ app.include_router(ai_processing.router, prefix=api_prefix, tags=["AI Processing
 app.include_router(audio.router, prefix=api_prefix, tags=["Audio"])
 # app.include_router(emotion.router, prefix=api_prefix, tags=["Emotion"]) # Removed as emotion detection is now part of the prompt
 app.include_router(external_search.router, prefix=api_prefix, tags=["External Search"])
+app.include_router(jobs.router, prefix=api_prefix, tags=["Jobs"])
 app.include_router(utility.router, prefix=api_prefix, tags=["Utility"])
 
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to the AI Learning Assistant API on GCP"}
\ No newline at end of file
+    return {"message": "Welcome to the AI Learning Assistant API on GCP"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    # Prometheus scrape target; counters are per worker process
+    if not settings.METRICS_ENABLED:
+        return Response(status_code=404)
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
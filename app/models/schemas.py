@@ -1,10 +1,17 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 # AI Processing Schemas
 class ResearchQuery(BaseModel):
     question: str
     emotion: str
     level: int
+    stream: bool = False  # Stream the answer as Server-Sent Events
+
+class ResearchBundleRequest(BaseModel):
+    question: str
+    emotion: str
+    level: int
+    include_audio: bool = False  # Narrate the opening paragraphs while the rest is generated
 
 class ResearchKeyword(BaseModel):
     question: str
@@ -13,6 +20,10 @@ class ResearchKeyword(BaseModel):
 class SummarizeRequest(BaseModel):
     content: str
 
+class SummarizeBatchRequest(BaseModel):
+    contents: list[str]
+    pack: bool = False  # Summarize several short texts per Gemini call
+
 class ImagePayload(BaseModel):
     image_data: str  # Base64 data URL
 
@@ -25,4 +36,16 @@ class SerperLensQuery(BaseModel):
 
 # Audio Schemas
 class TTSRequest(BaseModel):
-    text: str
\ No newline at end of file
+    text: str
+    stream: bool = False  # Stream MP3 segments as they are synthesized
+
+# Background Job Schemas
+class ResearchJobRequest(BaseModel):
+    question: str
+    emotion: str
+    level: int
+    priority: int = Field(0, ge=-10, le=10)  # higher runs first
+
+class TTSJobRequest(BaseModel):
+    text: str
+    priority: int = Field(0, ge=-10, le=10)
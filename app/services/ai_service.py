@@ -1,22 +1,117 @@
 # app/services/ai_service.py
 
-import google.generativeai as genai
+from __future__ import annotations
+import asyncio
+import json
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable
+from types import ModuleType
 import httpx
 from app.core.config import settings
-import io
-from PIL import Image # For processing image data
-import json
+from app.core import metrics
+from app.core.cache import MISSING, ResponseCache, SQLiteCache, make_cache_key, normalize_text
+from app.core.grpc_client import plaintext_transport
+from app.core.lazy import ensure_loaded, lazy_import
+from app.core.image_cache import PerceptualCache
+from app.core.limiter import UpstreamOverloaded, call_upstream, limiters
+from app.core.semantic_cache import SemanticCache, hashing_embedding
+from app.core.singleflight import SingleFlight
+from app.services import external_api_service
 
-# Configure the client library with your API key
-try:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-except Exception as e:
-    print(f"Error configuring Gemini API: {e}")
-    # This will cause subsequent calls to fail, which is intended if the key is missing.
+def _configure_genai(genai: ModuleType) -> None:
+    # Configure the client library with your API key
+    try:
+        if settings.GEMINI_API_ENDPOINT:
+            from google.ai import generativelanguage as glm
+            # Only the async generative client is used, so a grpc_asyncio transport fits every call
+            genai.configure(
+                api_key=settings.GEMINI_API_KEY,
+                transport=plaintext_transport(glm.GenerativeServiceAsyncClient, settings.GEMINI_API_ENDPOINT)
+            )
+        else:
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+    except Exception as e:
+        print(f"Error configuring Gemini API: {e}")
+        # This will cause subsequent calls to fail, which is intended if the key is missing.
+
+# Imported and configured on first use, usually by the background warm-up in main.lifespan
+genai = lazy_import("google.generativeai", on_load=_configure_genai)
+# The semantic and image caches compute with NumPy on the event loop
+np = lazy_import("numpy")
 
 # Use a compatible model name for the Google AI API
 GEMINI_MODEL_ID = "gemini-flash-latest" # <-- Correct and complete identifier
 
+# --- Generation configs, kept as plain dicts so they can be part of cache keys ---
+RESEARCH_GENERATION_CONFIG = {"temperature": 0.7, "top_p": 0.9, "max_output_tokens": 4096}
+SUMMARY_GENERATION_CONFIG = {"temperature": 0.2, "max_output_tokens": 200}
+KEYWORDS_GENERATION_CONFIG: dict = {}  # Gemini defaults
+
+# Cache of text generations, keyed by model, system prompt, normalized prompt and config
+gemini_cache = ResponseCache(
+    "gemini",
+    max_entries=settings.GEMINI_CACHE_MAX_ENTRIES,
+    ttl=settings.GEMINI_CACHE_TTL,
+    shared=SQLiteCache(settings.GEMINI_CACHE_SHARED_PATH) if settings.GEMINI_CACHE_SHARED_PATH else None,
+)
+
+# Answers to photographed questions, by upload digest and perceptual hash
+image_answer_cache = PerceptualCache(
+    "analyze_image",
+    max_entries=settings.IMAGE_CACHE_MAX_ENTRIES,
+    ttl=settings.IMAGE_CACHE_TTL,
+    max_distance=settings.IMAGE_CACHE_MAX_DISTANCE,
+    max_pixel_diff=settings.IMAGE_CACHE_MAX_PIXEL_DIFF,
+)
+
+# Identical in-flight generations share a single Gemini call
+gemini_flight = SingleFlight("gemini")
+
+# Research answers by question meaning, for rephrasings the exact cache misses
+research_semantic_cache = SemanticCache(
+    "research",
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl=settings.SEMANTIC_CACHE_TTL,
+)
+
+def _generation_cache_key(system_prompt: str | None, prompt: str, generation_config: dict) -> str:
+    return make_cache_key(GEMINI_MODEL_ID, system_prompt, normalize_text(prompt), generation_config)
+
+async def _generate_text(
+    system_prompt: str | None,
+    prompt: str,
+    generation_config: dict,
+    use_cache: bool = True,
+    parse: Callable[[str], Any] | None = None,
+) -> Any:
+    """
+    Runs a single Gemini text generation, serving repeats from the response
+    cache and collapsing identical concurrent requests into one upstream call.
+    If parse is given, the reply is returned as parse(text) and only cached
+    once parse accepts it, so a malformed reply is never served again.
+    """
+    use_cache = use_cache and settings.GEMINI_CACHE_ENABLED
+    key = _generation_cache_key(system_prompt, prompt, generation_config)
+    if use_cache:
+        cached = await gemini_cache.get(key)
+        if cached is not MISSING:
+            return parse(cached) if parse else cached
+
+    async def call() -> Any:
+        await ensure_loaded(genai)
+        response = await call_upstream("gemini", lambda: get_model(system_prompt).generate_content_async(
+            prompt,
+            generation_config=genai.types.GenerationConfig(**generation_config)
+        ))
+        text = response.text
+        result = parse(text) if parse else text
+        if use_cache:
+            await gemini_cache.set(key, text)
+        return result
+
+    return await gemini_flight.do(key, call)
+
 # async def generate_research_response_with_gemini(question: str, emotion: str, level: int) -> str:
 #     """Generates a response using the Google AI Gemini API."""
     
@@ -54,19 +149,31 @@ GEMINI_MODEL_ID = "gemini-flash-latest" # <-- Correct and complete identifier
     
 #     return response.text
 
-import google.generativeai as genai
-
 # Assume genai is configured with your API key
 # genai.configure(api_key="YOUR_API_KEY")
 # GEMINI_MODEL_ID = "gemini-1.5-flash" # or your preferred model
 
-async def generate_research_response_with_gemini(question: str, emotion: str, level: int) -> str:
-    """Generates a response using the Google AI Gemini API."""
+_CALM_EMOTIONS = ["neutral", "sad"]
+_UPBEAT_EMOTIONS = ["happy", "excited", "joy"]
+
+def _research_prompt_key(emotion: str, level: int) -> tuple[str, int]:
+    """Maps a free-form emotion and level onto one of the 9 fixed research prompts."""
+    if emotion.lower() in _CALM_EMOTIONS:
+        emotion_bucket = "calm"
+    elif emotion.lower() in _UPBEAT_EMOTIONS:
+        emotion_bucket = "upbeat"
+    else:
+        emotion_bucket = "other"
+    return emotion_bucket, level if level in (1, 2) else 3
+
+@lru_cache(maxsize=None)
+def _research_system_prompt_for(emotion_bucket: str, level: int) -> str:
+    """Builds the research system prompt for an emotion bucket and level."""
 
     # --- Logic for handling the 'emotion' parameter ---
-    if emotion.lower() in ["neutral", "sad"]:
+    if emotion_bucket == "calm":
         emotion_instruction = "The user is in a calm or low mood, so explain the topic thoroughly but in a gentle and easy-to-follow manner."
-    elif emotion.lower() in ["happy", "excited", "joy"]:
+    elif emotion_bucket == "upbeat":
         emotion_instruction = "The user is in a good mood, so you can explain the topic with enthusiasm, depth, and engaging details."
     else:
         emotion_instruction = "Adjust your response tone to suit the user's emotion. Prioritize clarity and depth."
@@ -83,7 +190,7 @@ async def generate_research_response_with_gemini(question: str, emotion: str, le
         word_count_instruction = "Your explanation should be about 800-1000 words."
 
     # --- Dynamically build the system prompt ---
-    system_prompt = (
+    return (
         "You are a knowledgeable, friendly teacher who explains topics thoroughly.\n"
         f"{word_count_instruction}\n"
         f"{level_instruction}\n"
@@ -92,114 +199,332 @@ async def generate_research_response_with_gemini(question: str, emotion: str, le
         f"{emotion_instruction}\n"
         "Your tone should remain helpful, supportive, engaging, and educational."
     )
-    
-    prompt = f"Query: {question}\nEmotion: {emotion}\nLevel: {level}"
-            
-    model = genai.GenerativeModel(
-        GEMINI_MODEL_ID,
-        system_instruction=system_prompt
-    )
-    
-    response = await model.generate_content_async(
-        prompt,
-        generation_config=genai.types.GenerationConfig(
-            temperature=0.7,
-            top_p=0.9,
-            max_output_tokens=4096,
+
+def _build_research_system_prompt(emotion: str, level: int) -> str:
+    """Returns the research system prompt for the given emotion and level."""
+    return _research_system_prompt_for(*_research_prompt_key(emotion, level))
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You are an expert academic assistant.\nSummarize the given content in about 50 words.\n"
+    "The summary must start with: 'This article states that'.\n"
+    "Write clearly and professionally. Do not add notes, opinions, or extra commentary, and do not use markdown formatting like bold text."
+)
+
+# --- Model registry: one GenerativeModel per system prompt, reused across requests ---
+_models: dict[str | None, genai.GenerativeModel] = {}
+
+def get_model(system_prompt: str | None = None) -> genai.GenerativeModel:
+    """Returns the shared GenerativeModel for a system prompt, creating it on first use."""
+    model = _models.get(system_prompt)
+    if model is None:
+        model = _models[system_prompt] = genai.GenerativeModel(
+            GEMINI_MODEL_ID,
+            system_instruction=system_prompt
         )
-    )
-    
-    return response.text
+    return model
 
-async def generate_summary_with_gemini(content: str) -> str:
-    """Generates a summary using the Google AI Gemini API."""
+def warm_model_registry() -> int:
+    """
+    Builds the models for every fixed system prompt (9 research prompts, the
+    summary prompt and the prompt-less vision/keyword model) so that requests
+    never construct one. Returns the number of registered models.
+    """
+    for emotion_bucket in ("calm", "upbeat", "other"):
+        for level in (1, 2, 3):
+            get_model(_research_system_prompt_for(emotion_bucket, level))
+    get_model(SUMMARY_SYSTEM_PROMPT)
+    get_model(None)
+    return len(_models)
 
-    system_prompt = (
-        "You are an expert academic assistant.\nSummarize the given content in about 50 words.\n"
-        "The summary must start with: 'This article states that'.\n"
-        "Write clearly and professionally. Do not add notes, opinions, or extra commentary, and do not use markdown formatting like bold text."
-    )
+async def _embed_question(question: str) -> list[float] | None:
+    """Embeds a question for the semantic cache; None if embedding fails."""
+    if settings.SEMANTIC_CACHE_EMBEDDER == "hashing":
+        return hashing_embedding(normalize_text(question), settings.SEMANTIC_CACHE_HASHING_DIM)
+    try:
+        await ensure_loaded(genai)
+        result = await call_upstream("gemini", lambda: genai.embed_content_async(
+            model=settings.SEMANTIC_CACHE_EMBEDDING_MODEL,
+            content=normalize_text(question),
+            task_type="semantic_similarity"
+        ))
+        return result["embedding"]
+    except UpstreamOverloaded:
+        raise
+    except Exception as e:
+        # The semantic cache is only an optimization; answer without it
+        print(f"Embedding for the semantic cache failed: {e}")
+        return None
+
+def _research_bucket(emotion: str, level: int) -> str:
+    # Questions only match within the same research prompt
+    emotion_bucket, level = _research_prompt_key(emotion, level)
+    return f"{emotion_bucket}:{level}"
+
+async def _research_semantic_lookup(question: str, emotion: str, level: int, use_cache: bool) -> tuple[list[float] | None, str | None]:
+    """
+    Returns (embedding, cached answer) for a research question. The embedding
+    is None when the semantic cache is off or bypassed; pass it to
+    _research_semantic_store once the answer has been generated.
+    """
+    if not (use_cache and settings.SEMANTIC_CACHE_ENABLED):
+        return None, None
+    with metrics.stage("research.semantic_cache"):
+        await ensure_loaded(np)
+        vector = await _embed_question(question)
+        if vector is None:
+            return None, None
+        return vector, research_semantic_cache.get(_research_bucket(emotion, level), vector)
+
+async def _research_exact_lookup(system_prompt: str, prompt: str, use_cache: bool) -> str | None:
+    """Returns the cached answer to this exact research prompt, if any."""
+    if not (use_cache and settings.GEMINI_CACHE_ENABLED):
+        return None
+    cached = await gemini_cache.get(_generation_cache_key(system_prompt, prompt, RESEARCH_GENERATION_CONFIG))
+    return None if cached is MISSING else cached
+
+def _research_semantic_store(question: str, emotion: str, level: int, vector: list[float] | None, answer: str) -> None:
+    if vector is not None and answer:
+        research_semantic_cache.add(_research_bucket(emotion, level), question, vector, answer)
+
+async def generate_research_response_with_gemini(question: str, emotion: str, level: int, use_cache: bool = True) -> str:
+    """Generates a response using the Google AI Gemini API."""
+
+    system_prompt = _build_research_system_prompt(emotion, level)
     
-    model = genai.GenerativeModel(
-        GEMINI_MODEL_ID,
-        system_instruction=system_prompt
-    )
+    prompt = f"Query: {question}\nEmotion: {emotion}\nLevel: {level}"
 
-    response = await model.generate_content_async(
-        f"Content to summarize: {content.strip()}",
-        generation_config=genai.types.GenerationConfig(
-            temperature=0.2,
-            max_output_tokens=200,
-        )
-    )
+    # An exact repeat needs no embedding, so the semantic cache is only asked on a miss
+    cached = await _research_exact_lookup(system_prompt, prompt, use_cache)
+    if cached is None:
+        vector, cached = await _research_semantic_lookup(question, emotion, level, use_cache)
+    if cached is not None:
+        return cached
+
+    text = await _generate_text(system_prompt, prompt, RESEARCH_GENERATION_CONFIG, use_cache)
+    _research_semantic_store(question, emotion, level, vector, text)
+    return text
+
+_STREAM_END = object()
+
+async def stream_research_response_with_gemini(question: str, emotion: str, level: int, use_cache: bool = True) -> AsyncIterator[str]:
+    """
+    Streams a research response from the Google AI Gemini API, yielding text
+    chunks as soon as Gemini produces them.
+
+    The upstream stream is consumed by a separate task so that closing this
+    generator (e.g. when the client disconnects) cancels the Gemini call
+    instead of leaving it running in the background. Cached answers are
+    yielded as a single chunk; completed streams are added to the cache.
+    """
+    system_prompt = _build_research_system_prompt(emotion, level)
+    prompt = f"Query: {question}\nEmotion: {emotion}\nLevel: {level}"
+
+    # An exact repeat needs no embedding, so the semantic cache is only asked on a miss
+    cached = await _research_exact_lookup(system_prompt, prompt, use_cache)
+    if cached is None:
+        vector, cached = await _research_semantic_lookup(question, emotion, level, use_cache)
+    if cached is not None:
+        yield cached
+        return
+
+    await ensure_loaded(genai)
+    model = get_model(system_prompt)
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            # Streams are not retried, but still count against the Gemini limit
+            async with limiters["gemini"].slot():
+                response = await model.generate_content_async(
+                    prompt,
+                    generation_config=genai.types.GenerationConfig(**RESEARCH_GENERATION_CONFIG),
+                    stream=True
+                )
+                async for chunk in response:
+                    if chunk.parts:
+                        await queue.put(chunk.text)
+            await queue.put(_STREAM_END)
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    parts = []
+    try:
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            parts.append(item)
+            yield item
+    finally:
+        # Cancelling the producer cancels the underlying gRPC stream.
+        producer.cancel()
 
-    summary = response.text.strip()
+    if use_cache and settings.GEMINI_CACHE_ENABLED and parts:
+        await gemini_cache.set(_generation_cache_key(system_prompt, prompt, RESEARCH_GENERATION_CONFIG), "".join(parts))
+    _research_semantic_store(question, emotion, level, vector, "".join(parts))
+
+def _ensure_summary_prefix(text: str) -> str:
+    summary = text.strip()
     if not summary.lower().startswith("this article states that"):
         summary = f"This article states that {summary}"
-        
     return summary
 
+async def generate_summary_with_gemini(content: str, use_cache: bool = True) -> str:
+    """Generates a summary using the Google AI Gemini API."""
+
+    text = await _generate_text(
+        SUMMARY_SYSTEM_PROMPT,
+        f"Content to summarize: {content.strip()}",
+        SUMMARY_GENERATION_CONFIG,
+        use_cache
+    )
+        
+    return _ensure_summary_prefix(text)
+
+async def _generate_packed_summaries(contents: list[str], use_cache: bool = True) -> list[str]:
+    """
+    Summarizes several short texts with a single Gemini call that returns a
+    JSON array. Raises ValueError if the reply does not line up with the inputs.
+    """
+    articles = "\n\n".join(f"Article {i}:\n{content.strip()}" for i, content in enumerate(contents, 1))
+    prompt = (
+        f"Summarize each of the following {len(contents)} articles separately.\n"
+        f"Return only a JSON array of exactly {len(contents)} strings, one summary per article, in order.\n\n"
+        f"{articles}"
+    )
+    generation_config = {
+        **SUMMARY_GENERATION_CONFIG,
+        "max_output_tokens": SUMMARY_GENERATION_CONFIG["max_output_tokens"] * len(contents),
+        "response_mime_type": "application/json",
+    }
+
+    def parse(text: str) -> list[str]:
+        summaries = json.loads(text)
+        if not isinstance(summaries, list) or len(summaries) != len(contents) or not all(isinstance(s, str) for s in summaries):
+            raise ValueError("Packed summary reply did not match the number of articles")
+        return summaries
+
+    summaries = await _generate_text(SUMMARY_SYSTEM_PROMPT, prompt, generation_config, use_cache, parse)
+    return [_ensure_summary_prefix(summary) for summary in summaries]
+
+async def generate_summaries_with_gemini(contents: list[str], pack: bool = False, use_cache: bool = True) -> list[dict]:
+    """
+    Summarizes many contents in one call. Duplicate contents are summarized
+    once and at most SUMMARY_BATCH_CONCURRENCY Gemini calls run at a time.
+    With pack=True, short contents are grouped several to a prompt, falling
+    back to one call per item if a packed reply cannot be parsed (but not
+    when Gemini is overloaded). Returns one {"answer": ...} or {"error": ...}
+    per input, in input order.
+    """
+    unique: dict[str, str] = {}
+    for content in contents:
+        unique.setdefault(normalize_text(content), content)
+
+    results: dict[str, dict] = {}
+    semaphore = asyncio.Semaphore(settings.SUMMARY_BATCH_CONCURRENCY)
+
+    async def summarize_one(key: str, content: str):
+        if not key:
+            results[key] = {"error": "Content is empty"}
+            return
+        async with semaphore:
+            try:
+                results[key] = {"answer": await generate_summary_with_gemini(content, use_cache)}
+            except Exception as e:
+                results[key] = {"error": str(e)}
+
+    async def summarize_pack(group: list[tuple[str, str]]):
+        try:
+            async with semaphore:
+                summaries = await _generate_packed_summaries([content for _, content in group], use_cache)
+        except UpstreamOverloaded as e:
+            # Splitting the group would only send more calls to a saturated upstream
+            for key, _ in group:
+                results[key] = {"error": str(e)}
+            return
+        except Exception as e:
+            print(f"Packed summary failed, summarizing individually: {e}")
+            await asyncio.gather(*(summarize_one(key, content) for key, content in group))
+            return
+        for (key, _), summary in zip(group, summaries):
+            results[key] = {"answer": summary}
+
+    jobs = []
+    items = list(unique.items())
+    if pack:
+        short = [(k, c) for k, c in items if k and len(c) <= settings.SUMMARY_PACK_MAX_CHARS]
+        items = [(k, c) for k, c in items if not (k and len(c) <= settings.SUMMARY_PACK_MAX_CHARS)]
+        size = settings.SUMMARY_PACK_SIZE
+        groups = [short[i:i + size] for i in range(0, len(short), size)]
+        for group in groups:
+            # A group of one gains nothing from packing
+            if len(group) == 1:
+                items.extend(group)
+            else:
+                jobs.append(summarize_pack(group))
+    jobs.extend(summarize_one(key, content) for key, content in items)
+    await asyncio.gather(*jobs)
+
+    return [results[normalize_text(content)] for content in contents]
+
 async def analyze_image_with_gemini(image_bytes: bytes, mime_type: str) -> str:
-    """Analyzes an image using the Google AI Gemini API."""
+    """
+    Analyzes an image using the Google AI Gemini API. Expects already encoded
+    image bytes (see image_service.preprocess_image), sent to Gemini as-is.
+    """
     
+    await ensure_loaded(genai)
     instruction = "Answer the question shown in the image."
-    
-    # The Google AI SDK works well with PIL images
-    try:
-        image = Image.open(io.BytesIO(image_bytes))
-    except Exception as e:
-        raise ValueError(f"Could not process image bytes: {e}")
+    image = {"mime_type": mime_type, "data": image_bytes}
 
-    model = genai.GenerativeModel(GEMINI_MODEL_ID)
-    
-    response = await model.generate_content_async(
+    response = await call_upstream("gemini", lambda: get_model().generate_content_async(
         [instruction, image],
         generation_config=genai.types.GenerationConfig(
             temperature=0.4,
             top_p=1.0,
             max_output_tokens=2048,
         )
-    )
+    ))
     
     return response.text
 
-async def generate_image_urls(question: str, emotion: str) -> list[str]:
+async def search_image_urls(question: str, emotion: str, client: httpx.AsyncClient, use_cache: bool = True) -> list[str]:
     """
-    Generates image URLs by getting search keywords from Gemini and then fetching
-    images using the Serper API.
+    Gets search keywords from Gemini and then fetches images using the Serper
+    API over the shared HTTP client. Raises if either step fails.
     """
-    try:
-        # 1. Generate Keywords with Gemini
-        model = genai.GenerativeModel(GEMINI_MODEL_ID)
-        
-        prompt = (
-            "You are an assistant that only outputs 3 to 5 short, comma-separated keywords for an image search. "
-            "Do not use numbered lists, explanations, or any other text. Just return the keywords.\n"
-            f"Query: {question}\n"
-            f"Emotion: {emotion}"
-        )
-        
-        response = await model.generate_content_async(prompt)
-        keywords = response.text.strip()
-        print(f"✨ Generated Keywords: {keywords}")
-
-        # 2. Fetch Image URLs with Serper API using httpx
-        url = "https://google.serper.dev/images"
-        payload = json.dumps({"q": keywords})
-        headers = {
-            'X-API-KEY': settings.SERPER_API_KEY,
-            'Content-Type': 'application/json'
-        }
-
-        async with httpx.AsyncClient() as client:
-            api_response = await client.post(url, headers=headers, content=payload)
-            api_response.raise_for_status()
-            data = api_response.json()
-
-        # 3. Extract top 10 image URLs
-        image_urls = [item["imageUrl"] for item in data.get("images", [])[:10]]
-        return image_urls
+    # 1. Generate Keywords with Gemini
+    prompt = (
+        "You are an assistant that only outputs 3 to 5 short, comma-separated keywords for an image search. "
+        "Do not use numbered lists, explanations, or any other text. Just return the keywords.\n"
+        f"Query: {question}\n"
+        f"Emotion: {emotion}"
+    )
 
+    with metrics.stage("image_urls.keywords"):
+        keywords = (await _generate_text(None, prompt, KEYWORDS_GENERATION_CONFIG, use_cache)).strip()
+    print(f"✨ Generated Keywords: {keywords}")
+
+    # 2. Fetch Image URLs with Serper API
+    with metrics.stage("image_urls.serper"):
+        data = await external_api_service.search_serper_images(client, keywords, use_cache=use_cache)
+
+    # 3. Extract top 10 image URLs
+    return [item["imageUrl"] for item in data.get("images", [])[:10]]
+
+async def generate_image_urls(question: str, emotion: str, client: httpx.AsyncClient, use_cache: bool = True) -> list[str]:
+    """
+    Like search_image_urls, but returns no images instead of failing unless
+    the upstreams are overloaded.
+    """
+    try:
+        return await search_image_urls(question, emotion, client, use_cache)
+    except UpstreamOverloaded:
+        raise
     except httpx.HTTPStatusError as http_err:
         print(f"HTTP error occurred while calling Serper API: {http_err}")
         return []
@@ -1,45 +1,165 @@
 # app/services/audio_service.py
 
-from google.cloud import speech
-from google.cloud import texttospeech
+from __future__ import annotations
+from typing import AsyncIterator
+from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.core.cache import MISSING, ResponseCache, SQLiteCache, make_cache_key
+from app.core.limiter import call_upstream, limiters
 import asyncio
+import re
 
-async def transcribe_audio_gcp(audio_content: bytes) -> str:
-    """Transcribes audio using Google Cloud Speech-to-Text."""
-    client = speech.SpeechAsyncClient()
+# Imported on first use; see app/core/lazy.py
+speech = lazy_import("google.cloud.speech")
+texttospeech = lazy_import("google.cloud.texttospeech")
 
-    audio = speech.RecognitionAudio(content=audio_content)
+def _recognition_config(streaming: bool = False) -> speech.RecognitionConfig:
     config = speech.RecognitionConfig(
         # encoding=speech.RecognitionConfig.AudioEncoding.WEBM_OPUS, # Or let it auto-detect
-        sample_rate_hertz=48000, # Common for webm
-        language_code="en-US",
+        sample_rate_hertz=settings.STT_SAMPLE_RATE_HERTZ, # Common for webm
+        language_code=settings.STT_LANGUAGE_CODE,
         enable_automatic_punctuation=True,
     )
+    if streaming:
+        # Streaming recognition needs the encoding spelled out
+        config.encoding = speech.RecognitionConfig.AudioEncoding[settings.STT_STREAMING_ENCODING]
+    return config
 
-    response = await client.recognize(config=config, audio=audio)
+async def transcribe_audio_gcp(client: speech.SpeechAsyncClient, audio_content: bytes) -> str:
+    """Transcribes audio using Google Cloud Speech-to-Text."""
+    audio = speech.RecognitionAudio(content=audio_content)
 
-    if response.results:
-        return response.results[0].alternatives[0].transcript
-    return ""
+    response = await call_upstream("speech", lambda: client.recognize(config=_recognition_config(), audio=audio))
 
+    # Longer speech comes back as several consecutive results; keep all of them
+    return " ".join(
+        result.alternatives[0].transcript.strip()
+        for result in response.results
+        if result.alternatives
+    )
 
-async def generate_tts_audio_gcp(text: str) -> bytes:
-    """Generates speech from text using Google Cloud Text-to-Speech."""
-    client = texttospeech.TextToSpeechAsyncClient()
-    
-    synthesis_input = texttospeech.SynthesisInput(text=text)
-    
-    voice = texttospeech.VoiceSelectionParams(
-        language_code="en-US", 
+async def stream_transcribe_gcp(
+    client: speech.SpeechAsyncClient,
+    audio_chunks: AsyncIterator[bytes]
+) -> AsyncIterator[dict]:
+    """
+    Transcribes audio as it arrives using Speech-to-Text streaming recognition.
+    Yields interim and final transcripts as {"transcript", "is_final", "stability"}
+    dicts. A single stream is limited by the API to about 5 minutes of audio.
+    """
+    async def requests():
+        yield speech.StreamingRecognizeRequest(
+            streaming_config=speech.StreamingRecognitionConfig(
+                config=_recognition_config(streaming=True),
+                interim_results=True,
+            )
+        )
+        async for chunk in audio_chunks:
+            yield speech.StreamingRecognizeRequest(audio_content=chunk)
+
+    # Streams are not retried, but still count against the speech limit
+    async with limiters["speech"].slot():
+        responses = await client.streaming_recognize(requests=requests())
+        async for response in responses:
+            for result in response.results:
+                if result.alternatives:
+                    yield {
+                        "transcript": result.alternatives[0].transcript,
+                        "is_final": result.is_final,
+                        "stability": round(result.stability, 3),
+                    }
+
+
+# --- Text-to-Speech ---
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# synthesize_speech rejects input over 5000 bytes of UTF-8
+_TTS_MAX_INPUT_BYTES = 5000
+
+# Synthesized segments, keyed by voice settings and segment text
+tts_cache = ResponseCache(
+    "tts",
+    max_entries=settings.TTS_CACHE_MAX_ENTRIES,
+    ttl=settings.TTS_CACHE_TTL,
+    shared=SQLiteCache(settings.TTS_CACHE_SHARED_PATH) if settings.TTS_CACHE_SHARED_PATH else None,
+)
+
+def split_into_segments(text: str) -> list[str]:
+    """
+    Splits text into sentence-aligned segments for synthesis. Short sentences
+    are merged up to TTS_SEGMENT_TARGET_CHARS; sentences longer than
+    TTS_SEGMENT_MAX_CHARS, or than the API's 5000-byte input limit once
+    encoded, are split on word boundaries.
+    """
+    target, limit = settings.TTS_SEGMENT_TARGET_CHARS, settings.TTS_SEGMENT_MAX_CHARS
+    segments: list[str] = []
+    current = ""
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        pieces = []
+        while len(sentence) > limit or len(sentence.encode("utf-8")) > _TTS_MAX_INPUT_BYTES:
+            # The longest prefix within both limits; non-ASCII text takes 2-4 bytes a character
+            fits = len(sentence[:limit].encode("utf-8")[:_TTS_MAX_INPUT_BYTES].decode("utf-8", "ignore"))
+            cut = sentence.rfind(" ", 0, fits)
+            cut = cut if cut > 0 else fits
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            pieces.append(sentence)
+        for piece in pieces:
+            if current and len(current) + 1 + len(piece) > target:
+                segments.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        segments.append(current)
+    return segments
+
+def _voice_params() -> texttospeech.VoiceSelectionParams:
+    return texttospeech.VoiceSelectionParams(
+        language_code=settings.TTS_LANGUAGE_CODE, 
         ssml_gender=texttospeech.SsmlVoiceGender.NEUTRAL
     )
-    
-    audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.MP3
-    )
-    
-    response = await client.synthesize_speech(
-        input=synthesis_input, voice=voice, audio_config=audio_config
-    )
-    
-    return response.audio_content
\ No newline at end of file
+
+async def _synthesize_segment(client: texttospeech.TextToSpeechAsyncClient, text: str) -> bytes:
+    """Synthesizes one segment to MP3, serving repeats from the audio cache."""
+    key = make_cache_key("mp3", settings.TTS_LANGUAGE_CODE, "NEUTRAL", text)
+    cached = await tts_cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    response = await call_upstream("tts", lambda: client.synthesize_speech(
+        input=texttospeech.SynthesisInput(text=text),
+        voice=_voice_params(),
+        audio_config=texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding.MP3
+        )
+    ))
+    await tts_cache.set(key, response.audio_content)
+    return response.audio_content
+
+async def stream_tts_audio_gcp(client: texttospeech.TextToSpeechAsyncClient, text: str) -> AsyncIterator[bytes]:
+    """
+    Synthesizes text segment by segment, with at most TTS_MAX_PARALLEL segments
+    in flight, and yields the MP3 segments in order as soon as each is ready.
+    MP3 frames concatenate cleanly, so the output plays as a single stream.
+    """
+    semaphore = asyncio.Semaphore(settings.TTS_MAX_PARALLEL)
+
+    async def synthesize(segment: str) -> bytes:
+        async with semaphore:
+            return await _synthesize_segment(client, segment)
+
+    tasks = [asyncio.create_task(synthesize(segment)) for segment in split_into_segments(text)]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def generate_tts_audio_gcp(client: texttospeech.TextToSpeechAsyncClient, text: str) -> bytes:
+    """Generates speech from text using Google Cloud Text-to-Speech."""
+    return b"".join([segment async for segment in stream_tts_audio_gcp(client, text)])
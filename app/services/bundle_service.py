@@ -0,0 +1,127 @@
+# app/services/bundle_service.py
+
+from __future__ import annotations
+import asyncio
+import base64
+import re
+from contextlib import aclosing
+from typing import TYPE_CHECKING
+import httpx
+from app.core.config import settings
+from app.core import metrics
+from app.services import ai_service, audio_service
+
+if TYPE_CHECKING:
+    from google.cloud import texttospeech
+    from app.core.lazy import LazyClient
+
+_MARKDOWN_SYMBOLS = re.compile(r"[*#_`>]+")
+
+def _intro_paragraphs(text: str, count: int) -> str | None:
+    """Returns the first `count` paragraphs once they are complete, else None."""
+    paragraphs = [p for p in text.split("\n\n") if p.strip()]
+    # The last paragraph may still be streaming unless the text ends on a break
+    complete = paragraphs if text.endswith("\n\n") else paragraphs[:-1]
+    if len(complete) < count:
+        return None
+    return "\n\n".join(complete[:count])
+
+def _speakable(text: str) -> str:
+    """Strips markdown markers so TTS does not read them out."""
+    return _MARKDOWN_SYMBOLS.sub("", text).strip()
+
+def _describe_error(part: str, error: BaseException) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return f"{part} timed out"
+    return str(error) or error.__class__.__name__
+
+async def _synthesize_intro(tts_client: LazyClient[texttospeech.TextToSpeechAsyncClient], intro: str) -> bytes:
+    # The client is only created here, so a bundle without audio never needs TTS credentials
+    client = await tts_client.get()
+    return await audio_service.generate_tts_audio_gcp(client, _speakable(intro))
+
+async def _answer_with_intro_audio(
+    question: str,
+    emotion: str,
+    level: int,
+    tts_client: LazyClient[texttospeech.TextToSpeechAsyncClient],
+    use_cache: bool
+) -> tuple[str, asyncio.Task | None]:
+    """
+    Streams the research answer and starts synthesizing its opening paragraphs
+    as soon as they are complete, while the rest is still being generated.
+    Returns the full answer and the (possibly still running) TTS task.
+    """
+    text = ""
+    audio_task = None
+    try:
+        chunks = ai_service.stream_research_response_with_gemini(question, emotion, level, use_cache=use_cache)
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                text += chunk
+                if audio_task is None:
+                    intro = _intro_paragraphs(text, settings.BUNDLE_AUDIO_PARAGRAPHS)
+                    if intro:
+                        audio_task = asyncio.create_task(_synthesize_intro(tts_client, intro))
+        if audio_task is None and text.strip():
+            # The answer had fewer paragraphs than requested; speak all of it
+            intro = "\n\n".join(text.split("\n\n")[:settings.BUNDLE_AUDIO_PARAGRAPHS])
+            audio_task = asyncio.create_task(_synthesize_intro(tts_client, intro))
+        return text, audio_task
+    except BaseException:
+        if audio_task is not None:
+            audio_task.cancel()
+        raise
+
+async def build_research_bundle(
+    question: str,
+    emotion: str,
+    level: int,
+    http_client: httpx.AsyncClient,
+    tts_client: LazyClient[texttospeech.TextToSpeechAsyncClient],
+    include_audio: bool = False,
+    use_cache: bool = True
+) -> dict:
+    """
+    Runs the research answer and the image search concurrently, each under its
+    own timeout, and optionally narrates the opening of the answer. A part that
+    fails or times out is reported in "errors" without failing the others;
+    the TTS client is only created (and can only fail) when audio is asked for.
+    """
+    async def answer_part() -> tuple[str, asyncio.Task | None]:
+        with metrics.stage("bundle.answer"):
+            if include_audio:
+                return await _answer_with_intro_audio(question, emotion, level, tts_client, use_cache)
+            answer = await ai_service.generate_research_response_with_gemini(question, emotion, level, use_cache=use_cache)
+            return answer, None
+
+    async def images_part() -> list[str]:
+        with metrics.stage("bundle.images"):
+            return await ai_service.search_image_urls(question, emotion, http_client, use_cache=use_cache)
+
+    answer_result, images_result = await asyncio.gather(
+        asyncio.wait_for(answer_part(), settings.BUNDLE_RESEARCH_TIMEOUT),
+        asyncio.wait_for(images_part(), settings.BUNDLE_IMAGES_TIMEOUT),
+        return_exceptions=True
+    )
+
+    bundle = {"answer": None, "image_urls": [], "audio_intro": None, "errors": {}}
+
+    if isinstance(answer_result, BaseException):
+        bundle["errors"]["answer"] = _describe_error("answer", answer_result)
+    else:
+        bundle["answer"], audio_task = answer_result
+        if audio_task is not None:
+            try:
+                with metrics.stage("bundle.audio_intro"):
+                    audio = await asyncio.wait_for(audio_task, settings.BUNDLE_AUDIO_TIMEOUT)
+                bundle["audio_intro"] = {"mime_type": "audio/mpeg", "data": base64.b64encode(audio).decode("ascii")}
+            except Exception as e:
+                bundle["errors"]["audio_intro"] = _describe_error("audio_intro", e)
+
+    if isinstance(images_result, BaseException):
+        bundle["errors"]["image_urls"] = _describe_error("image_urls", images_result)
+    else:
+        bundle["image_urls"] = images_result
+
+    return bundle
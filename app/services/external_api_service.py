@@ -1,24 +1,125 @@
-import requests
+import json
+import httpx
 from app.core.config import settings
+from app.core.cache import ResponseCache, RevalidatingCache, SQLiteCache, make_cache_key, normalize_text
+from app.core.limiter import call_upstream
+from app.core.singleflight import SingleFlight
 
-def search_serper_scholar(query: str):
-    """Performs a scholar search using the Serper.dev API."""
-    headers = {
-        'X-API-KEY': settings.SERPER_API_KEY,
-        'Content-Type': 'application/json'
-    }
-    payload = {"q": query}
-    response = requests.post("https://google.serper.dev/scholar", headers=headers, json=payload)
-    response.raise_for_status()
-    return response.json()
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson is optional; fall back to the standard library
+    _json_loads = json.loads
+
+# Identical in-flight searches share a single Serper request
+serper_flight = SingleFlight("serper")
+
+class SerperReply:
+    """
+    A Serper JSON body together with its parsed form. The body is parsed once,
+    when the reply arrives, and both are cached; only the bytes are pickled
+    into the shared tier, and a reply read back from there is parsed on first use.
+    """
+
+    __slots__ = ("body", "_data")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self._data = None
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            try:
+                data = _json_loads(self.body)
+            except ValueError as e:
+                raise httpx.DecodingError(f"Invalid JSON from Serper: {e}")
+            if not isinstance(data, dict):
+                raise httpx.DecodingError("Invalid JSON from Serper: expected an object")
+            self._data = data
+        return self._data
+
+    def __getstate__(self) -> bytes:
+        return self.body
+
+    def __setstate__(self, body: bytes) -> None:
+        self.body = body
+        self._data = None
 
-def search_serper_lens(image_url: str):
-    """Performs a reverse image search using the Serper.dev Lens API."""
+def _is_empty_result(reply: SerperReply) -> bool:
+    """True when a Serper reply carries no results (every result list is empty)."""
+    return not any(isinstance(value, list) and value for value in reply.data.values())
+
+# Search results change slowly and popular topics repeat, so replies are cached
+# per endpoint and normalized query, and refreshed in the background once stale
+serper_cache = RevalidatingCache(
+    ResponseCache(
+        "serper",
+        max_entries=settings.SERPER_CACHE_MAX_ENTRIES,
+        ttl=settings.SERPER_CACHE_TTL_SCHOLAR,
+        shared=SQLiteCache(settings.SERPER_CACHE_SHARED_PATH) if settings.SERPER_CACHE_SHARED_PATH else None,
+    ),
+    stale_ttl=settings.SERPER_CACHE_STALE_TTL,
+    negative_ttl=settings.SERPER_CACHE_NEGATIVE_TTL,
+    is_empty=_is_empty_result,
+)
+
+_SERPER_CACHE_TTLS = {
+    "scholar": settings.SERPER_CACHE_TTL_SCHOLAR,
+    "lens": settings.SERPER_CACHE_TTL_LENS,
+    "images": settings.SERPER_CACHE_TTL_IMAGES,
+}
+
+async def _post_serper(client: httpx.AsyncClient, endpoint: str, payload: dict, use_cache: bool = True) -> SerperReply:
+    """
+    Sends a request to a Serper.dev endpoint over the shared HTTP client and
+    returns the reply, whose raw JSON body routes can pass through unparsed.
+    Replies are served from serper_cache unless use_cache is False, and
+    concurrent identical requests are collapsed into one upstream call.
+    """
     headers = {
         'X-API-KEY': settings.SERPER_API_KEY,
         'Content-Type': 'application/json'
     }
-    payload = {"url": image_url}
-    response = requests.post("https://google.serper.dev/lens", headers=headers, json=payload)
-    response.raise_for_status()
-    return response.json()
\ No newline at end of file
+
+    async def post() -> httpx.Response:
+        response = await client.post(f"{settings.SERPER_BASE_URL}/{endpoint}", headers=headers, json=payload)
+        response.raise_for_status()
+        return response
+
+    async def call() -> SerperReply:
+        # Routes are async, so the Serper limiter (capped at SERPER_MAX_CONCURRENCY),
+        # not Starlette's threadpool, bounds concurrent searches
+        response = await call_upstream("serper", post)
+        reply = SerperReply(response.content)
+        # Parse here so a truncated or malformed body is never cached or passed
+        # through; as an HTTP error it is mapped to a 502 by the routes
+        reply.data
+        return reply
+
+    # "reply" keeps these entries apart from bytes or parsed ones a shared tier may still hold
+    key = make_cache_key(endpoint, payload, "reply")
+
+    async def fetch() -> SerperReply:
+        return await serper_flight.do(key, call)
+
+    if not (use_cache and settings.SERPER_CACHE_ENABLED):
+        return await fetch()
+    return await serper_cache.get_or_fetch(key, fetch, _SERPER_CACHE_TTLS[endpoint])
+
+async def search_serper_scholar(client: httpx.AsyncClient, query: str, use_cache: bool = True, raw: bool = False):
+    """Performs a scholar search using the Serper.dev API. With raw, returns the JSON bytes unparsed."""
+    # Searches are case-insensitive, so "Black  Holes" and "black holes" share one entry
+    reply = await _post_serper(client, "scholar", {"q": normalize_text(query)}, use_cache)
+    return reply.body if raw else reply.data
+
+async def search_serper_lens(client: httpx.AsyncClient, image_url: str, use_cache: bool = True, raw: bool = False):
+    """Performs a reverse image search using the Serper.dev Lens API. With raw, returns the JSON bytes unparsed."""
+    # URL paths are case-sensitive, so only surrounding whitespace is dropped
+    reply = await _post_serper(client, "lens", {"url": image_url.strip()}, use_cache)
+    return reply.body if raw else reply.data
+
+async def search_serper_images(client: httpx.AsyncClient, query: str, use_cache: bool = True):
+    """Performs an image search using the Serper.dev Images API."""
+    reply = await _post_serper(client, "images", {"q": normalize_text(query)}, use_cache)
+    return reply.data
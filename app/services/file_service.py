@@ -1,36 +1,90 @@
 # app/services/file_service.py
 
+from __future__ import annotations
+import asyncio
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from pathlib import Path
+from typing import TYPE_CHECKING
 from fastapi import UploadFile, HTTPException
-from google.cloud import storage
 from app.core.config import settings
 
-def upload_file_to_gcs(file: UploadFile, file_bytes: bytes) -> str:
-    """Uploads a file to GCS and returns its public URL."""
-    if not settings.GCS_BUCKET_NAME:
-        raise ValueError("GCS_BUCKET_NAME is not set in the configuration.")
+if TYPE_CHECKING:
+    from google.cloud import storage
 
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="Only image uploads are allowed")
+# Bounded pool for the blocking GCS calls, so uploads never stall the event loop
+_upload_executor = ThreadPoolExecutor(
+    max_workers=settings.GCS_UPLOAD_WORKERS,
+    thread_name_prefix="gcs-upload"
+)
 
-    client = storage.Client()
-    bucket = client.bucket(settings.GCS_BUCKET_NAME)
-    
-    suffix = Path(file.filename).suffix or ".jpg"
-    unique_name = f"{uuid.uuid4().hex}{suffix}"
-    
-    blob = bucket.blob(unique_name)
-    
-    # Upload the file bytes
-    blob.upload_from_string(
-        data=file_bytes,
-        content_type=file.content_type
+_signing_credentials = None
+
+def _signed_url(blob: storage.Blob) -> str:
+    """Returns a V4 signed GET URL for the blob."""
+    import google.auth
+    import google.auth.transport.requests
+    from google.auth.credentials import Signing
+
+    global _signing_credentials
+    if _signing_credentials is None:
+        _signing_credentials, _ = google.auth.default()
+
+    signing_kwargs = {}
+    if not isinstance(_signing_credentials, Signing):
+        # Cloud Run credentials hold no private key; sign through the IAM API instead
+        if not _signing_credentials.valid:
+            _signing_credentials.refresh(google.auth.transport.requests.Request())
+        signing_kwargs = {
+            "service_account_email": _signing_credentials.service_account_email,
+            "access_token": _signing_credentials.token,
+        }
+
+    return blob.generate_signed_url(
+        version="v4",
+        expiration=timedelta(seconds=settings.GCS_SIGNED_URL_TTL),
+        method="GET",
+        **signing_kwargs
     )
-    
+
+def _upload_blocking(client: storage.Client, file: UploadFile, object_name: str) -> str:
+    bucket = client.bucket(settings.GCS_BUCKET_NAME)
+
+    # With a chunk_size set, the client uses a resumable upload that streams the
+    # file in chunks. Small files go up in a single request instead.
+    chunk_size = settings.GCS_UPLOAD_CHUNK_SIZE
+    if file.size is not None and file.size <= chunk_size:
+        chunk_size = None
+    blob = bucket.blob(object_name, chunk_size=chunk_size)
+
+    file.file.seek(0)
+    # Without a size the client cannot choose a single-request upload
+    blob.upload_from_file(file.file, size=file.size, content_type=file.content_type)
+
+    if settings.GCS_SIGNED_URLS:
+        return _signed_url(blob)
+
     # Make the blob publicly viewable
     blob.make_public()
-    
     return blob.public_url
 
-# The save_temp_file function is no longer needed as we pass bytes in memory.
\ No newline at end of file
+async def upload_file_to_gcs(client: storage.Client, file: UploadFile) -> str:
+    """
+    Uploads a file to GCS using the shared storage client and returns its URL,
+    either public or signed depending on GCS_SIGNED_URLS.
+    """
+    if not settings.GCS_BUCKET_NAME:
+        raise ValueError("GCS_BUCKET_NAME is not set in the configuration.")
+
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Only image uploads are allowed")
+
+    if file.size is not None and file.size > settings.MAX_IMAGE_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds {settings.MAX_IMAGE_UPLOAD_BYTES} bytes")
+
+    suffix = Path(file.filename or "").suffix or ".jpg"
+    unique_name = f"{uuid.uuid4().hex}{suffix}"
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_upload_executor, _upload_blocking, client, file, unique_name)
@@ -0,0 +1,167 @@
+# app/services/image_service.py
+
+from __future__ import annotations
+import asyncio
+import io
+import time
+from dataclasses import dataclass, field
+from app.core.config import settings
+from app.core.lazy import lazy_import
+
+# Pillow is only needed once an image arrives; it loads in the worker thread that decodes it
+Image = lazy_import("PIL.Image")
+ImageOps = lazy_import("PIL.ImageOps")
+
+_OUTPUT_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+_EXIF_ORIENTATION = 0x0112
+
+@dataclass
+class PreprocessedImage:
+    """An image ready to send to Gemini, plus what preprocessing did to it."""
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_bytes: int
+    dhash: bytes | None = None  # perceptual hash of the oriented image, see _dhash
+    thumbnail: bytes | None = None  # see _thumbnail
+    timings: dict[str, float] = field(default_factory=dict)  # milliseconds per stage
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+    def report(self) -> dict:
+        return {
+            "width": self.width,
+            "height": self.height,
+            "original_bytes": self.original_bytes,
+            "output_bytes": len(self.data),
+            "bytes_saved": self.bytes_saved,
+            "timings_ms": self.timings,
+        }
+
+    def server_timing(self) -> str:
+        """Formats the stage timings as a Server-Timing header value."""
+        return ", ".join(f"img-{stage};dur={ms}" for stage, ms in self.timings.items())
+
+
+def sniff_mime_type(image_bytes: bytes) -> str:
+    """Detects an image's mime type from its header bytes, without decoding pixels."""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            return Image.MIME.get(image.format, "application/octet-stream")
+    except Exception as e:
+        raise ValueError(f"Could not process image bytes: {e}")
+
+def _flatten_alpha(image: Image.Image) -> Image.Image:
+    """Composites transparent images onto white so they can be stored as JPEG."""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+def _dhash(image: Image.Image, size: int) -> bytes:
+    """
+    Difference hash: the image shrunk to a (size + 1) x size grayscale grid,
+    one bit per horizontally adjacent pair that gets brighter. Re-encoding,
+    rescaling and small exposure changes flip few bits.
+    """
+    pixels = image.convert("L").resize((size + 1, size), Image.Resampling.BOX).tobytes()
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for column in range(size):
+            bits = (bits << 1) | (pixels[offset + column] < pixels[offset + column + 1])
+    return bits.to_bytes((size * size + 7) // 8, "big")
+
+THUMBNAIL_SIZE = 32
+
+def _thumbnail(image: Image.Image) -> bytes:
+    """A contrast-stretched 32x32 grayscale thumbnail, to confirm a perceptual hash match."""
+    small = image.convert("L").resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.BOX)
+    return ImageOps.autocontrast(small).tobytes()
+
+def _preprocess(image_bytes: bytes, max_dimension: int, output_format: str, quality: int, hash_size: int = 0) -> PreprocessedImage:
+    timings = {}
+
+    def mark(stage: str, started: float) -> float:
+        now = time.perf_counter()
+        timings[stage] = round((now - started) * 1000, 2)
+        return now
+
+    started = time.perf_counter()
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        original_format, original_size = image.format, image.size
+        upright = image.getexif().get(_EXIF_ORIENTATION, 1) == 1
+        if image.format == "JPEG":
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale so large photos never fully decode
+            image.draft("RGB", (max_dimension, max_dimension))
+        image.load()
+    except Exception as e:
+        raise ValueError(f"Could not process image bytes: {e}")
+    started = mark("decode", started)
+
+    # The bound is square, so resizing before the EXIF rotation is safe and cheaper
+    image.thumbnail((max_dimension, max_dimension))
+    started = mark("resize", started)
+
+    image = ImageOps.exif_transpose(image)
+    started = mark("orient", started)
+
+    dhash = thumbnail = None
+    if hash_size:
+        dhash = _dhash(image, hash_size)
+        thumbnail = _thumbnail(image)
+        started = mark("hash", started)
+
+    if output_format == "JPEG":
+        image = _flatten_alpha(image)
+    buffer = io.BytesIO()
+    # Saving without passing exif/icc info strips the original metadata
+    image.save(buffer, format=output_format, quality=quality)
+    data, mime_type = buffer.getvalue(), _OUTPUT_MIME_TYPES[output_format]
+    mark("encode", started)
+
+    # An upload that needed no resize or rotation is sent as it came, metadata
+    # included, unless re-encoding shrank it, provided Gemini accepts its format;
+    # otherwise (a GIF or BMP, say) the re-encoded output is used even if larger
+    unchanged = upright and image.size == original_size
+    if unchanged and original_format in _OUTPUT_MIME_TYPES and len(image_bytes) <= len(data):
+        data, mime_type = image_bytes, _OUTPUT_MIME_TYPES[original_format]
+
+    return PreprocessedImage(
+        data=data,
+        mime_type=mime_type,
+        width=image.width,
+        height=image.height,
+        original_bytes=len(image_bytes),
+        dhash=dhash,
+        thumbnail=thumbnail,
+        timings=timings,
+    )
+
+async def preprocess_image(image_bytes: bytes, mime_type: str, hash_size: int = 0) -> PreprocessedImage:
+    """
+    Downscales, orients and re-encodes an uploaded image before it is sent to
+    Gemini (keeping the upload when that would not make it smaller), and computes its perceptual hash and thumbnail when `hash_size` is set. Runs in
+    a worker thread since decoding and encoding are CPU-bound.
+    """
+    if not settings.IMAGE_PREPROCESSING_ENABLED:
+        return PreprocessedImage(
+            data=image_bytes, mime_type=mime_type, width=0, height=0, original_bytes=len(image_bytes)
+        )
+    output_format = settings.IMAGE_OUTPUT_FORMAT.upper()
+    if output_format not in _OUTPUT_MIME_TYPES:
+        raise ValueError(f"Unsupported IMAGE_OUTPUT_FORMAT: {settings.IMAGE_OUTPUT_FORMAT}")
+    return await asyncio.to_thread(
+        _preprocess,
+        image_bytes,
+        settings.IMAGE_MAX_DIMENSION,
+        output_format,
+        settings.IMAGE_OUTPUT_QUALITY,
+        hash_size,
+    )
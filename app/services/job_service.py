@@ -0,0 +1,35 @@
+# app/services/job_service.py
+
+from functools import partial
+from starlette.datastructures import State
+from app.core.jobs import BinaryResult, Job, JobHandler
+from app.services import ai_service, audio_service
+
+# --- Job handlers: each runs one kind of job with the existing service functions ---
+
+async def run_research(job: Job, state: State) -> dict:
+    answer = await ai_service.generate_research_response_with_gemini(
+        question=job.payload["question"],
+        emotion=job.payload["emotion"],
+        level=job.payload["level"],
+        use_cache=job.payload.get("use_cache", True)
+    )
+    return {"answer": answer}
+
+async def run_tts(job: Job, state: State) -> BinaryResult:
+    client = await state.tts_client.get()
+    audio_data = await audio_service.generate_tts_audio_gcp(client, job.payload["text"])
+    return BinaryResult(audio_data, "audio/mpeg")
+
+async def run_transcribe(job: Job, state: State) -> dict:
+    client = await state.speech_client.get()
+    transcription = await audio_service.transcribe_audio_gcp(client, job.input)
+    return {"transcription": transcription}
+
+def job_handlers(state: State) -> dict[str, JobHandler]:
+    """Maps each job kind to its handler, bound to the app's shared clients."""
+    return {
+        "research": partial(run_research, state=state),
+        "tts": partial(run_tts, state=state),
+        "transcribe": partial(run_transcribe, state=state),
+    }
@@ -0,0 +1,127 @@
+"""
+Measures cold start: per-module import time of app.main (from python -X
+importtime) and the time from spawning a uvicorn process to the first 200 from
+/api/health, which is what a request waits for after a Cloud Run scale-up.
+Exits non-zero if the median time to healthy misses --target-ms; the default
+target is what one uvicorn worker reaches once the Google SDKs, Pillow and the
+SDK clients are loaded lazily (about 1.35 s before, about 0.95 s after).
+
+Upstream endpoints point at an unused local port, so no credentials or
+network are needed; nothing is contacted during startup.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_cold_start --runs 5 --target-ms 1000
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+_ENV = {
+    "GCP_PROJECT_ID": "benchmark",
+    "GCS_BUCKET_NAME": "benchmark",
+    "GEMINI_API_KEY": "benchmark",
+    "GEMINI_API_ENDPOINT": "127.0.0.1:9",
+    "SPEECH_API_ENDPOINT": "127.0.0.1:9",
+    "TTS_API_ENDPOINT": "127.0.0.1:9",
+    "STORAGE_EMULATOR_HOST": "http://127.0.0.1:9",
+}
+
+
+def _env() -> dict:
+    return {**os.environ, **{name: os.environ.get(name, value) for name, value in _ENV.items()}}
+
+def import_report(top: int) -> None:
+    """Prints the slowest imports under app.main, by cumulative and by own time."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=_env(), capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(own), int(cumulative), depth))
+
+    total = next((cumulative for name, _, cumulative, _ in rows if name == "app.main"), 0)
+    print(f"import app.main: {total / 1000:.1f} ms\n")
+
+    # importtime lists children before their parent; a row's parent is the next row one level up
+    parents: dict[int, str] = {}
+    pending: list[int] = []
+    for index, (name, _, _, depth) in enumerate(rows):
+        while pending and rows[pending[-1]][3] > depth:
+            parents[pending.pop()] = name
+        pending.append(index)
+
+    print("Third-party imports triggered by app modules (cumulative):")
+    costs: dict[tuple[str, str], int] = {}
+    for index, (name, _, cumulative, _) in enumerate(rows):
+        parent = parents.get(index, "")
+        if parent.startswith("app") and not name.startswith("app"):
+            key = (name, parent)
+            costs[key] = costs.get(key, 0) + cumulative
+    for (name, parent), cumulative in sorted(costs.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name:<36} from {parent}")
+    print("\nSlowest modules (own time):")
+    for name, own, _, _ in sorted(rows, key=lambda row: -row[1])[:top]:
+        print(f"  {own / 1000:8.1f} ms  {name}")
+    print()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def time_to_healthy(timeout: float = 60.0) -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/api/health").status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+        raise TimeoutError(f"/api/health was not healthy within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def main(runs: int, target_ms: float, top: int) -> int:
+    import_report(top)
+    # One discarded run warms the OS page cache, like a reused Cloud Run image layer
+    time_to_healthy()
+    samples = [time_to_healthy() * 1000 for _ in range(runs)]
+    median = statistics.median(samples)
+    print(f"time to healthy /api/health: median={median:.0f} ms  min={min(samples):.0f} ms  max={max(samples):.0f} ms")
+    if median > target_ms:
+        print(f"MISSED target of {target_ms:.0f} ms")
+        return 1
+    print(f"within target of {target_ms:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=1000.0)
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+    sys.exit(main(args.runs, args.target_ms, args.top))
@@ -0,0 +1,112 @@
+"""
+Compares per-call latency of a fresh httpx.AsyncClient per request (the old
+behaviour) against the shared, pooled client created in main.lifespan, using
+a local Serper stub server.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_http_client --calls 500
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+# Settings() requires these; the benchmark never talks to GCP or Gemini.
+for _name in ("GCP_PROJECT_ID", "GCS_BUCKET_NAME", "GEMINI_API_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+
+from app.core.config import Settings
+from app.core.http_client import create_http_client
+from app.services import external_api_service
+
+
+class _SerperStubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a small Serper-like JSON body, keeping the connection alive."""
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; avoid Nagle/delayed-ACK stalls.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"organic": [{"title": "stub", "link": "http://example.com"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SerperStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def _time_calls(calls: int, make_call) -> list[float]:
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await make_call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _report(label: str, latencies: list[float]) -> float:
+    latencies = sorted(latencies)
+    mean = statistics.fmean(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<22} mean={mean * 1000:7.3f} ms  p50={p50 * 1000:7.3f} ms  p95={p95 * 1000:7.3f} ms")
+    return mean
+
+
+async def main(calls: int):
+    server = start_stub_server()
+    settings = Settings(SERPER_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}")
+    external_api_service.settings = settings
+
+    # Every call searches something new with the cache off, so each one reaches
+    # the stub server instead of being a cache hit or joining an in-flight search
+    queries = (f"benchmark {i}" for i in itertools.count())
+
+    async def fresh_client_call():
+        async with httpx.AsyncClient() as client:
+            await external_api_service.search_serper_scholar(client, next(queries), use_cache=False)
+
+    pooled = create_http_client(settings)
+
+    async def pooled_client_call():
+        await external_api_service.search_serper_scholar(pooled, next(queries), use_cache=False)
+
+    # Warm up both paths so one-off import/DNS costs are not counted.
+    await fresh_client_call()
+    await pooled_client_call()
+
+    fresh = _report("fresh client per call", await _time_calls(calls, fresh_client_call))
+    shared = _report("shared pooled client", await _time_calls(calls, pooled_client_call))
+    print(f"saved per call: {(fresh - shared) * 1000:.3f} ms "
+          "(plain HTTP to localhost; TLS to google.serper.dev saves considerably more)")
+
+    await pooled.aclose()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=300)
+    asyncio.run(main(parser.parse_args().calls))
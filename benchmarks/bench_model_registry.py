@@ -0,0 +1,43 @@
+"""
+Measures the per-request cost of building a genai.GenerativeModel (the old
+behaviour) against looking one up in ai_service's model registry.
+
+No network calls are made; only model construction is timed.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_model_registry --iterations 20000
+"""
+
+import argparse
+import os
+import timeit
+
+# Settings() requires these; the benchmark never talks to GCP or Gemini.
+for _name in ("GCP_PROJECT_ID", "GCS_BUCKET_NAME", "GEMINI_API_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+
+import google.generativeai as genai
+
+from app.services import ai_service
+
+
+def main(iterations: int):
+    ai_service.warm_model_registry()
+    emotion, level = "happy", 3
+
+    def construct_per_request():
+        system_prompt = ai_service._build_research_system_prompt(emotion, level)
+        genai.GenerativeModel(ai_service.GEMINI_MODEL_ID, system_instruction=system_prompt)
+
+    def registry_lookup():
+        ai_service.get_model(ai_service._build_research_system_prompt(emotion, level))
+
+    for label, fn in (("construct per request", construct_per_request), ("registry lookup", registry_lookup)):
+        seconds = min(timeit.repeat(fn, number=iterations, repeat=3))
+        print(f"{label:<22} {seconds / iterations * 1e6:9.2f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    main(parser.parse_args().iterations)
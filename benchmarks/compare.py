@@ -0,0 +1,81 @@
+"""
+Compares two benchmarks/loadtest.py result files and flags regressions:
+latency percentiles or peak RSS that grew, or throughput that dropped, by more
+than --threshold percent, and error rates that rose by more than
+--error-threshold points. Exits with status 1 if anything regressed, so it can
+gate CI.
+
+Usage (from the repo root):
+    python -m benchmarks.compare benchmarks/results/before.json benchmarks/results/after.json
+"""
+
+import argparse
+import json
+import sys
+
+# (label, path into a scenario result, True if higher is better)
+METRICS = [
+    ("throughput rps", ("throughput_rps",), True),
+    ("p50 ms", ("latency_ms", "p50"), False),
+    ("p95 ms", ("latency_ms", "p95"), False),
+    ("p99 ms", ("latency_ms", "p99"), False),
+    ("peak rss MB", ("peak_rss_mb_max",), False),
+]
+
+
+def _get(result: dict, path: tuple[str, ...]):
+    for key in path:
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+def compare(before: dict, after: dict, threshold: float, error_threshold: float) -> list[str]:
+    regressions = []
+    for meta_key in ("workers", "rps", "duration", "faults"):
+        if before["meta"].get(meta_key) != after["meta"].get(meta_key):
+            print(f"note: {meta_key} differs ({before['meta'].get(meta_key)} -> {after['meta'].get(meta_key)})")
+
+    print(f"{'scenario':<18} {'metric':<15} {'before':>10} {'after':>10} {'change':>9}")
+    for name, old in before["scenarios"].items():
+        new = after["scenarios"].get(name)
+        if new is None:
+            print(f"{name:<18} missing from {after['meta'].get('git_revision')}")
+            continue
+        for label, path, higher_is_better in METRICS:
+            old_value, new_value = _get(old, path), _get(new, path)
+            if old_value is None or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > threshold else ""
+            print(f"{name:<18} {label:<15} {old_value:>10.1f} {new_value:>10.1f} {change:>+8.1f}%{flag}")
+            if flag:
+                regressions.append(f"{name}: {label} {change:+.1f}%")
+
+        error_change = (new["error_rate"] - old["error_rate"]) * 100
+        flag = "  REGRESSION" if error_change > error_threshold else ""
+        print(f"{name:<18} {'errors %':<15} {old['error_rate'] * 100:>10.1f} {new['error_rate'] * 100:>10.1f} {error_change:>+7.1f}pt{flag}")
+        if flag:
+            regressions.append(f"{name}: error rate {error_change:+.1f} points")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed change in percent")
+    parser.add_argument("--error-threshold", type=float, default=1.0, help="allowed error rate increase in points")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    regressions = compare(before, after, args.threshold, args.error_threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions.")
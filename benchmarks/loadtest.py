@@ -0,0 +1,401 @@
+"""
+Load test for the whole API. Starts the upstream stubs (benchmarks/stubs.py)
+and app.main:app under gunicorn as in the Dockerfile, drives each route at a
+fixed request rate and reports throughput, p50/p95/p99 latency, errors and
+peak RSS per worker. Results are saved as JSON; compare two runs with
+benchmarks/compare.py.
+
+Requests are scheduled open-loop and latency is measured from each request's
+scheduled start, so a stalled server shows up as latency instead of quietly
+lowering the offered load.
+
+Usage (from the repo root):
+    python -m benchmarks.loadtest --workers 4 --rps 40 --duration 20
+    python -m benchmarks.loadtest --scenarios research,gen_keywords --set gemini.latency_ms=800
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import httpx
+
+from benchmarks.stubs import add_fault_arguments
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    # Builds the httpx request kwargs from a tag that is unique per request
+    build: Callable[[str], dict] = lambda tag: {}
+
+
+def _jpeg(tag: str = "", size: int = 1024) -> bytes:
+    """
+    A photo-sized JPEG of an 8x8 grid of gray levels seeded by `tag`. Grids
+    for different tags are far apart in perceptual hash and in pixels, so the
+    analyze-image cache only hits when the tag (the payload) repeats.
+    """
+    from PIL import Image
+    rng = random.Random(tag)
+    grid = Image.frombytes("L", (8, 8), bytes(rng.randrange(256) for _ in range(64)))
+    buffer = io.BytesIO()
+    grid.resize((size, size), Image.NEAREST).convert("RGB").save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+_IMAGE = _jpeg()
+_AUDIO = bytes(16 * 1024)  # the Speech stub ignores the content
+
+def _article(tag: str) -> str:
+    return " ".join(f"Photosynthesis fact {n} for {tag} is about turning light into sugar." for n in range(20))
+
+def _question(tag: str) -> dict:
+    return {"question": f"What is photosynthesis? ({tag})", "emotion": "curious", "level": 2}
+
+# Every payload carries a tag unique to the scenario and request, so the
+# response caches do not turn the run into a cache benchmark; pass
+# --repeat-payloads to send one payload per scenario and measure cache hits.
+SCENARIOS = [
+    Scenario("health", "GET", "/api/health"),
+    Scenario("research", "POST", "/api/research", lambda tag: {"json": _question(tag)}),
+    Scenario("research_stream", "POST", "/api/research", lambda tag: {"json": {**_question(tag), "stream": True}}),
+    Scenario("research_bundle", "POST", "/api/research-bundle",
+             lambda tag: {"json": {**_question(tag), "include_audio": True}}),
+    Scenario("summarize", "POST", "/api/summarize", lambda tag: {"json": {"content": _article(tag)}}),
+    Scenario("summarize_batch", "POST", "/api/summarize/batch",
+             lambda tag: {"json": {"contents": [_article(f"{tag}.{n}")[:400] for n in range(10)], "pack": True}}),
+    Scenario("analyze_image", "POST", "/api/analyze-image",
+             lambda tag: {"content": _jpeg(tag), "headers": {"content-type": "image/jpeg"}}),
+    Scenario("gen_keywords", "POST", "/api/gen_keywords",
+             lambda tag: {"json": {"question": f"How do leaves make food? ({tag})", "emotion": "curious"}}),
+    Scenario("search_scholar", "POST", "/api/search-scholar", lambda tag: {"json": {"q": f"photosynthesis {tag}"}}),
+    Scenario("search_lens", "POST", "/api/search-lens", lambda tag: {"json": {"url": f"https://img.example/{tag}.jpg"}}),
+    Scenario("transcribe", "POST", "/api/transcribe",
+             lambda tag: {"files": {"file": ("speech.webm", _AUDIO, "audio/webm")}}),
+    Scenario("transcribe_stream", "WS", "/api/transcribe/stream"),
+    Scenario("tts", "POST", "/api/text-to-speech", lambda tag: {"json": {"text": _article(tag)[:900]}}),
+    Scenario("tts_stream", "POST", "/api/text-to-speech",
+             lambda tag: {"json": {"text": _article(tag)[:900], "stream": True}}),
+    Scenario("upload_image", "POST", "/api/upload-image",
+             lambda tag: {"files": {"file": ("photo.jpg", _IMAGE, "image/jpeg")}}),
+]
+
+
+# --- Processes ---
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_for_port(port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"Nothing listening on port {port} after {timeout}s")
+
+def _child_pids(parent: int) -> list[int]:
+    """Finds the gunicorn workers by scanning /proc for the master's children."""
+    pids = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            # Field 4 of /proc/<pid>/stat is the parent pid; the name field may contain spaces
+            stat = (entry / "stat").read_text()
+            if int(stat.rsplit(")", 1)[1].split()[1]) == parent:
+                pids.append(int(entry.name))
+        except (OSError, ValueError, IndexError):
+            continue
+    return sorted(pids)
+
+def _rss_mb(pid: int) -> float | None:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def _stop(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+class RSSSampler:
+    """Polls the RSS of every worker and keeps the peak seen per worker."""
+
+    def __init__(self, master_pid: int, interval: float = 0.5):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peak: dict[int, float] = {}
+
+    def sample(self) -> None:
+        for pid in _child_pids(self.master_pid):
+            rss = _rss_mb(pid)
+            if rss is not None:
+                self.peak[pid] = max(rss, self.peak.get(pid, 0.0))
+
+    async def run(self) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+
+# --- Load generation ---
+
+@dataclass
+class Outcome:
+    latency: float
+    status: int | str  # HTTP status, or the exception name for transport failures
+    first_byte: float | None = None
+
+
+async def _http_request(client: httpx.AsyncClient, scenario: Scenario, tag: str, started: float) -> Outcome:
+    async with client.stream(scenario.method, scenario.path, **scenario.build(tag)) as response:
+        first_byte = None
+        async for _ in response.aiter_raw():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+    return Outcome(time.perf_counter() - started, response.status_code, first_byte)
+
+async def _websocket_request(base_url: str, scenario: Scenario, started: float) -> Outcome:
+    import websockets
+
+    url = base_url.replace("http://", "ws://") + scenario.path
+    first_byte = None
+    async with websockets.connect(url, max_size=None) as ws:
+        for _ in range(5):
+            await ws.send(_AUDIO[:4096])
+        await ws.send("end")
+        async for message in ws:
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            event = json.loads(message).get("event")
+            if event in ("done", "error"):
+                return Outcome(time.perf_counter() - started, 200 if event == "done" else "ws_error", first_byte)
+    return Outcome(time.perf_counter() - started, "ws_closed", first_byte)
+
+def _percentile(sorted_values: list[float], pct: float) -> float | None:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def _ms(value: float | None) -> float | None:
+    return None if value is None else round(value * 1000, 2)
+
+def summarize(outcomes: list[Outcome], elapsed: float, rps: float) -> dict:
+    ok = sorted(o.latency for o in outcomes if isinstance(o.status, int) and o.status < 400)
+    first_bytes = sorted(o.first_byte for o in outcomes if o.first_byte is not None)
+    statuses: dict[str, int] = {}
+    for outcome in outcomes:
+        statuses[str(outcome.status)] = statuses.get(str(outcome.status), 0) + 1
+    return {
+        "offered_rps": rps,
+        "requests": len(outcomes),
+        "ok": len(ok),
+        "error_rate": round(1 - len(ok) / len(outcomes), 4) if outcomes else 0.0,
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": _ms(_percentile(ok, 50)),
+            "p95": _ms(_percentile(ok, 95)),
+            "p99": _ms(_percentile(ok, 99)),
+            "max": _ms(ok[-1] if ok else None),
+        },
+        "first_byte_ms": {"p50": _ms(_percentile(first_bytes, 50)), "p95": _ms(_percentile(first_bytes, 95))},
+        "statuses": statuses,
+    }
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    base_url: str,
+    scenario: Scenario,
+    rps: float,
+    duration: float,
+    tag: str,
+    repeat_payloads: bool = False,
+) -> tuple[list[Outcome], float]:
+    async def one(i: int, scheduled: float) -> Outcome:
+        request_tag = tag if repeat_payloads else f"{tag}-{i}"
+        try:
+            if scenario.method == "WS":
+                return await _websocket_request(base_url, scenario, scheduled)
+            return await _http_request(client, scenario, request_tag, scheduled)
+        except Exception as e:
+            return Outcome(time.perf_counter() - scheduled, e.__class__.__name__)
+
+    total = max(1, int(rps * duration))
+    start = time.perf_counter()
+    tasks = []
+    for i in range(total):
+        scheduled = start + i / rps
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(i, scheduled)))
+    outcomes = await asyncio.gather(*tasks)
+    return outcomes, time.perf_counter() - start
+
+
+def _print_row(name: str, result: dict) -> None:
+    latency = result["latency_ms"]
+    fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+    print(
+        f"{name:<18} {result['throughput_rps']:8.1f} {fmt(latency['p50'])} {fmt(latency['p95'])} "
+        f"{fmt(latency['p99'])} {result['error_rate'] * 100:6.1f}%  {result['peak_rss_mb_max']:7.1f}"
+    )
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def drive(args: argparse.Namespace, base_url: str, master_pid: int) -> dict:
+    selected = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios]
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    results = {}
+    run_id = format(int(time.time()), "x")  # keeps payloads distinct from earlier runs' shared caches
+    print(f"{'scenario':<18} {'ok rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}  {'rss MB':>7}")
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        for scenario in selected:
+            # Warm up connections, model registries and lazy imports before measuring
+            await run_scenario(client, base_url, scenario, min(args.rps, 10), 1, f"{run_id}-warmup-{scenario.name}")
+
+            sampler = RSSSampler(master_pid)
+            sampling = asyncio.create_task(sampler.run())
+            try:
+                outcomes, elapsed = await run_scenario(
+                    client, base_url, scenario, args.rps, args.duration,
+                    f"{run_id}-{scenario.name}", args.repeat_payloads
+                )
+            finally:
+                sampling.cancel()
+            sampler.sample()
+
+            result = summarize(outcomes, elapsed, args.rps)
+            result["peak_rss_mb"] = {str(pid): round(mb, 1) for pid, mb in sampler.peak.items()}
+            result["peak_rss_mb_max"] = round(max(sampler.peak.values(), default=0.0), 1)
+            results[scenario.name] = result
+            _print_row(scenario.name, result)
+    return results
+
+
+def main(args: argparse.Namespace) -> int:
+    grpc_port, stub_http_port, app_port = _free_port(), _free_port(), args.port or _free_port()
+    fault_args = [f"--latency-ms={args.latency_ms}", f"--jitter-ms={args.jitter_ms}", f"--error-rate={args.error_rate}"]
+    fault_args += [f"--set={override}" for override in args.set or []]
+
+    stubs = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stubs", f"--grpc-port={grpc_port}", f"--http-port={stub_http_port}", *fault_args]
+    )
+    env = {
+        **os.environ,
+        "GCP_PROJECT_ID": os.environ.get("GCP_PROJECT_ID", "benchmark"),
+        "GCS_BUCKET_NAME": os.environ.get("GCS_BUCKET_NAME", "benchmark"),
+        "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "benchmark"),
+        "GEMINI_API_ENDPOINT": f"127.0.0.1:{grpc_port}",
+        "SPEECH_API_ENDPOINT": f"127.0.0.1:{grpc_port}",
+        "TTS_API_ENDPOINT": f"127.0.0.1:{grpc_port}",
+        "SERPER_BASE_URL": f"http://127.0.0.1:{stub_http_port}",
+        "STORAGE_EMULATOR_HOST": f"http://127.0.0.1:{stub_http_port}",
+        "GCS_SIGNED_URLS": "false",
+        # Every simulated user comes from 127.0.0.1, so per-client limits would cap the run
+        "RATE_LIMIT_ENABLED": os.environ.get("RATE_LIMIT_ENABLED", "false"),
+    }
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "-w", str(args.workers), "-k", "uvicorn.workers.UvicornWorker",
+            "-b", f"127.0.0.1:{app_port}", "--log-level", "warning", "app.main:app",
+        ],
+        env=env,
+        stdout=None if args.verbose else subprocess.DEVNULL,
+    )
+    try:
+        _wait_for_port(grpc_port, 15)
+        _wait_for_port(stub_http_port, 15)
+        _wait_for_port(app_port, 60)
+        base_url = f"http://127.0.0.1:{app_port}"
+        started = time.perf_counter()
+        while httpx.get(f"{base_url}/api/health").status_code != 200:
+            time.sleep(0.1)
+        # Give every worker time to finish its lifespan startup
+        while len(_child_pids(server.pid)) < args.workers and time.perf_counter() - started < 30:
+            time.sleep(0.1)
+
+        scenarios = asyncio.run(drive(args, base_url, server.pid))
+    finally:
+        _stop(server)
+        _stop(stubs)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "workers": args.workers,
+            "rps": args.rps,
+            "duration": args.duration,
+            "repeat_payloads": args.repeat_payloads,
+            "faults": {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                       "error_rate": args.error_rate, "overrides": args.set or []},
+        },
+        "scenarios": scenarios,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['meta']['git_revision'] or 'local'}-w{args.workers}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Saved {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers, as in the Dockerfile")
+    parser.add_argument("--port", type=int, default=0, help="port for the app (default: a free one)")
+    parser.add_argument("--rps", type=float, default=20.0, help="offered requests per second per scenario")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--max-connections", type=int, default=500)
+    parser.add_argument(
+        "--scenarios", type=lambda value: value.split(","),
+        help=f"comma-separated subset of: {', '.join(s.name for s in SCENARIOS)}"
+    )
+    parser.add_argument("--repeat-payloads", action="store_true", help="send identical payloads so caches can hit")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<time>-<rev>-w<workers>.json)")
+    parser.add_argument("--verbose", action="store_true", help="show the app's stdout")
+    add_fault_arguments(parser)
+    sys.exit(main(parser.parse_args()))
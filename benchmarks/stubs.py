@@ -0,0 +1,299 @@
+"""
+Local fakes for every upstream the API talks to, with injected latency and
+errors, so the whole app can be load tested without touching Google or Serper:
+
+  - Gemini, Speech-to-Text and Text-to-Speech as one plaintext gRPC server
+    (point GEMINI_API_ENDPOINT / SPEECH_API_ENDPOINT / TTS_API_ENDPOINT at it)
+  - Serper and the Cloud Storage JSON API as one HTTP server
+    (point SERPER_BASE_URL and STORAGE_EMULATOR_HOST at it)
+
+Usage (from the repo root):
+    python -m benchmarks.stubs --grpc-port 50051 --http-port 8090 \\
+        --latency-ms 50 --error-rate 0.01 --set gemini.latency_ms=400
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import re
+import uuid
+from dataclasses import dataclass, fields
+
+import google_crc32c
+import grpc
+import uvicorn
+from google.ai import generativelanguage as glm
+from google.cloud import speech, texttospeech
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+UPSTREAMS = ("gemini", "speech", "tts", "serper", "gcs")
+
+
+@dataclass
+class Fault:
+    """Latency and error injection for one upstream."""
+    latency_ms: float = 50.0
+    jitter_ms: float = 10.0
+    error_rate: float = 0.0
+    stream_chunks: int = 8  # Gemini streaming replies are split into this many chunks
+    chunk_interval_ms: float = 20.0
+
+    async def delay(self, scale: float = 1.0) -> None:
+        latency = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms))
+        await asyncio.sleep(latency * scale / 1000)
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+
+def build_faults(args: argparse.Namespace) -> dict[str, Fault]:
+    """Applies the global defaults, then any --set upstream.field=value overrides."""
+    faults = {
+        name: Fault(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate)
+        for name in UPSTREAMS
+    }
+    known = [f.name for f in fields(Fault)]
+    for override in args.set or []:
+        target, _, value = override.partition("=")
+        upstream, _, field = target.partition(".")
+        if upstream not in faults or field not in known:
+            raise SystemExit(f"Unknown override '{override}'; use <{'|'.join(UPSTREAMS)}>.<{'|'.join(known)}>=value")
+        setattr(faults[upstream], field, type(getattr(faults[upstream], field))(value))
+    return faults
+
+
+# --- Canned upstream replies ---
+
+_PARAGRAPH = (
+    "Photosynthesis is how plants turn light, water and carbon dioxide into sugar and oxygen. "
+    "It happens in the chloroplasts, where chlorophyll absorbs mostly red and blue light. "
+)
+
+def _research_answer() -> str:
+    return "\n\n".join(f"**Part {i}.** {_PARAGRAPH * 2}" for i in range(1, 5))
+
+def _gemini_reply(prompt: str) -> str:
+    packed = re.search(r"JSON array of exactly (\d+) strings", prompt)
+    if packed:
+        return json.dumps([f"Summary: stub summary {i}." for i in range(int(packed.group(1)))])
+    if "comma-separated keywords" in prompt:
+        return "photosynthesis, chloroplast, leaf, sunlight"
+    if prompt.startswith("Content to summarize:"):
+        return "Summary: a short stub summary of the article."
+    if "question shown in the image" in prompt:
+        return "The image asks about photosynthesis; plants convert light into chemical energy."
+    return _research_answer()
+
+def _prompt_text(request: glm.GenerateContentRequest) -> str:
+    return " ".join(part.text for content in request.contents for part in content.parts if part.text)
+
+def _gemini_response(text: str) -> glm.GenerateContentResponse:
+    return glm.GenerateContentResponse(candidates=[
+        glm.Candidate(
+            content=glm.Content(role="model", parts=[glm.Part(text=text)]),
+            finish_reason=glm.Candidate.FinishReason.STOP,
+            index=0,
+        )
+    ])
+
+# A few hundred bytes standing in for an MP3 segment
+_FAKE_MP3 = b"ID3\x04\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x64" + bytes(400)
+
+
+# --- gRPC services ---
+
+def _grpc_services(faults: dict[str, Fault]) -> list[grpc.GenericRpcHandler]:
+    async def fail_or_wait(context: grpc.aio.ServicerContext, fault: Fault, scale: float = 1.0) -> None:
+        await fault.delay(scale)
+        if fault.should_fail():
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "injected failure")
+
+    async def generate_content(request, context):
+        await fail_or_wait(context, faults["gemini"])
+        return _gemini_response(_gemini_reply(_prompt_text(request)))
+
+    async def stream_generate_content(request, context):
+        fault = faults["gemini"]
+        await fail_or_wait(context, fault)
+        text = _gemini_reply(_prompt_text(request))
+        size = max(1, len(text) // fault.stream_chunks + 1)
+        for start in range(0, len(text), size):
+            if start:
+                await asyncio.sleep(fault.chunk_interval_ms / 1000)
+            yield _gemini_response(text[start:start + size])
+
+    async def recognize(request, context):
+        await fail_or_wait(context, faults["speech"])
+        alternative = speech.SpeechRecognitionAlternative(transcript="what is photosynthesis", confidence=0.93)
+        return speech.RecognizeResponse(results=[speech.SpeechRecognitionResult(alternatives=[alternative])])
+
+    async def streaming_recognize(request_iterator, context):
+        fault = faults["speech"]
+        chunks = 0
+        async for request in request_iterator:
+            if request.audio_content:
+                chunks += 1
+                alternative = speech.SpeechRecognitionAlternative(transcript=f"partial {chunks}")
+                yield speech.StreamingRecognizeResponse(results=[
+                    speech.StreamingRecognitionResult(alternatives=[alternative], is_final=False)
+                ])
+        await fail_or_wait(context, fault)
+        alternative = speech.SpeechRecognitionAlternative(transcript="what is photosynthesis", confidence=0.93)
+        yield speech.StreamingRecognizeResponse(results=[
+            speech.StreamingRecognitionResult(alternatives=[alternative], is_final=True)
+        ])
+
+    async def synthesize_speech(request, context):
+        # Scale latency with text length, as the real API does
+        await fail_or_wait(context, faults["tts"], scale=max(0.2, len(request.input.text) / 300))
+        return texttospeech.SynthesizeSpeechResponse(audio_content=_FAKE_MP3)
+
+    def unary(fn, request_cls, response_cls):
+        return grpc.unary_unary_rpc_method_handler(
+            fn, request_deserializer=request_cls.deserialize, response_serializer=response_cls.serialize
+        )
+
+    gemini = grpc.method_handlers_generic_handler("google.ai.generativelanguage.v1beta.GenerativeService", {
+        "GenerateContent": unary(generate_content, glm.GenerateContentRequest, glm.GenerateContentResponse),
+        "StreamGenerateContent": grpc.unary_stream_rpc_method_handler(
+            stream_generate_content,
+            request_deserializer=glm.GenerateContentRequest.deserialize,
+            response_serializer=glm.GenerateContentResponse.serialize,
+        ),
+    })
+    stt = grpc.method_handlers_generic_handler("google.cloud.speech.v1.Speech", {
+        "Recognize": unary(recognize, speech.RecognizeRequest, speech.RecognizeResponse),
+        "StreamingRecognize": grpc.stream_stream_rpc_method_handler(
+            streaming_recognize,
+            request_deserializer=speech.StreamingRecognizeRequest.deserialize,
+            response_serializer=speech.StreamingRecognizeResponse.serialize,
+        ),
+    })
+    tts = grpc.method_handlers_generic_handler("google.cloud.texttospeech.v1.TextToSpeech", {
+        "SynthesizeSpeech": unary(synthesize_speech, texttospeech.SynthesizeSpeechRequest, texttospeech.SynthesizeSpeechResponse),
+    })
+    return [gemini, stt, tts]
+
+
+# --- HTTP services: Serper and the Cloud Storage JSON API ---
+
+def _http_app(faults: dict[str, Fault]) -> Starlette:
+    uploads: dict[str, dict] = {}  # resumable upload id -> object metadata
+
+    async def injected(upstream: str) -> Response | None:
+        fault = faults[upstream]
+        await fault.delay()
+        if fault.should_fail():
+            return JSONResponse({"error": "injected failure"}, status_code=503)
+        return None
+
+    async def serper(request: Request):
+        await request.body()
+        if (failure := await injected("serper")) is not None:
+            return failure
+        endpoint = request.path_params["endpoint"]
+        if endpoint == "images":
+            return JSONResponse({"images": [{"imageUrl": f"https://img.example/{i}.jpg"} for i in range(10)]})
+        if endpoint == "lens":
+            return JSONResponse({"visual_matches": [{"title": "stub match", "link": "https://example.com"}]})
+        return JSONResponse({"organic": [{"title": f"Stub paper {i}", "link": f"https://example.com/{i}"} for i in range(10)]})
+
+    def object_resource(bucket: str, name: str, data: bytes = b"", content_type: str = "image/jpeg") -> dict:
+        # The client validates the crc32c of what it uploaded
+        crc32c = base64.b64encode(google_crc32c.value(data).to_bytes(4, "big")).decode()
+        return {
+            "kind": "storage#object",
+            "bucket": bucket,
+            "name": name,
+            "id": f"{bucket}/{name}/1",
+            "generation": "1",
+            "size": str(len(data)),
+            "crc32c": crc32c,
+            "contentType": content_type,
+            "acl": [{"entity": "allUsers", "role": "READER"}],
+        }
+
+    async def gcs_upload(request: Request):
+        bucket = request.path_params["bucket"]
+        body = await request.body()
+        if (failure := await injected("gcs")) is not None:
+            return failure
+        upload_type = request.query_params.get("uploadType")
+        if upload_type == "resumable":
+            metadata = json.loads(body or b"{}")
+            upload_id = uuid.uuid4().hex
+            uploads[upload_id] = {"bucket": bucket, "name": metadata.get("name", upload_id), "data": bytearray()}
+            location = f"{request.base_url}upload/storage/v1/b/{bucket}/o?uploadType=resumable&upload_id={upload_id}"
+            return Response(headers={"Location": location})
+        # multipart/related: a JSON metadata part, then the media part
+        boundary = request.headers.get("content-type", "").partition("boundary=")[2].strip('"').encode()
+        parts = body.split(b"--" + boundary)
+        metadata = json.loads(parts[1].partition(b"\r\n\r\n")[2])
+        media = parts[2].partition(b"\r\n\r\n")[2].removesuffix(b"\r\n")
+        return JSONResponse(object_resource(bucket, metadata.get("name", uuid.uuid4().hex), media))
+
+    async def gcs_upload_chunk(request: Request):
+        body = await request.body()
+        upload = uploads.get(request.query_params.get("upload_id", ""))
+        if upload is None:
+            return JSONResponse({"error": "unknown upload"}, status_code=404)
+        upload["data"] += body
+        content_range = request.headers.get("content-range", "")
+        if content_range.endswith("/*"):
+            # More chunks to come
+            return Response(status_code=308, headers={"Range": f"bytes=0-{len(upload['data']) - 1}"})
+        del uploads[request.query_params["upload_id"]]
+        return JSONResponse(object_resource(upload["bucket"], upload["name"], bytes(upload["data"])))
+
+    async def gcs_object(request: Request):
+        await request.body()
+        if (failure := await injected("gcs")) is not None:
+            return failure
+        return JSONResponse(object_resource(request.path_params["bucket"], request.path_params["name"]))
+
+    return Starlette(routes=[
+        Route("/upload/storage/v1/b/{bucket}/o", gcs_upload, methods=["POST"]),
+        Route("/upload/storage/v1/b/{bucket}/o", gcs_upload_chunk, methods=["PUT"]),
+        Route("/storage/v1/b/{bucket}/o/{name:path}", gcs_object, methods=["GET", "PATCH", "PUT", "POST"]),
+        Route("/{endpoint}", serper, methods=["POST"]),
+    ])
+
+
+async def serve(grpc_port: int, http_port: int, faults: dict[str, Fault], host: str = "127.0.0.1") -> None:
+    grpc_server = grpc.aio.server()
+    grpc_server.add_generic_rpc_handlers(_grpc_services(faults))
+    grpc_server.add_insecure_port(f"{host}:{grpc_port}")
+    await grpc_server.start()
+
+    http_server = uvicorn.Server(uvicorn.Config(
+        _http_app(faults), host=host, port=http_port, log_level="warning", lifespan="off"
+    ))
+    print(f"Stubs ready: gRPC on {host}:{grpc_port}, HTTP on {host}:{http_port}", flush=True)
+    try:
+        await http_server.serve()
+    finally:
+        await grpc_server.stop(grace=None)
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mean injected latency for every upstream")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls that fail (503/UNAVAILABLE)")
+    parser.add_argument(
+        "--set", action="append", metavar="UPSTREAM.FIELD=VALUE",
+        help=f"per-upstream override, e.g. gemini.latency_ms=400 (upstreams: {', '.join(UPSTREAMS)})"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grpc-port", type=int, default=50051)
+    parser.add_argument("--http-port", type=int, default=8090)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    asyncio.run(serve(args.grpc_port, args.http_port, build_faults(args)))
@@ -0,0 +1,10 @@
+# tests/conftest.py
+
+import os
+import sys
+
+# Settings() requires these; the tests never talk to GCP, Gemini or Serper
+for _name in ("GCP_PROJECT_ID", "GCS_BUCKET_NAME", "GEMINI_API_KEY"):
+    os.environ.setdefault(_name, "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,136 @@
+# tests/test_ai_service.py
+
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+from app.core.cache import ResponseCache
+from app.services import ai_service
+
+
+class _FakeGemini:
+    """Stands in for call_upstream, answering every Gemini call with the next reply."""
+
+    def __init__(self, *replies: str):
+        self.replies = list(replies)
+        self.calls = 0
+
+    async def __call__(self, upstream, fn):
+        assert upstream == "gemini"
+        self.calls += 1
+        return SimpleNamespace(text=self.replies.pop(0))
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    async def loaded(*modules):
+        pass
+
+    monkeypatch.setattr(ai_service, "ensure_loaded", loaded)
+    monkeypatch.setattr(ai_service, "gemini_cache", ResponseCache("test", max_entries=16, ttl=60))
+    monkeypatch.setattr(ai_service.settings, "GEMINI_CACHE_ENABLED", True)
+
+    def install(*replies: str) -> _FakeGemini:
+        fake = _FakeGemini(*replies)
+        monkeypatch.setattr(ai_service, "call_upstream", fake)
+        return fake
+
+    return install
+
+
+@pytest.mark.parametrize("reply", ["not json", json.dumps(["only one"]), json.dumps({"a": "b"})])
+def test_malformed_packed_reply_is_not_cached(gemini, reply):
+    contents = ["first article", "second article"]
+    fake = gemini(reply, json.dumps(["one", "two"]))
+
+    with pytest.raises(ValueError):
+        asyncio.run(ai_service._generate_packed_summaries(contents))
+    summaries = asyncio.run(ai_service._generate_packed_summaries(contents))
+
+    assert fake.calls == 2
+    assert summaries == ["This article states that one", "This article states that two"]
+
+
+def test_valid_packed_reply_is_cached(gemini):
+    contents = ["first article", "second article"]
+    fake = gemini(json.dumps(["one", "two"]))
+
+    first = asyncio.run(ai_service._generate_packed_summaries(contents))
+    second = asyncio.run(ai_service._generate_packed_summaries(contents))
+
+    assert fake.calls == 1
+    assert first == second
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    embedded = []
+
+    async def embed(question):
+        embedded.append(question)
+        return None
+
+    monkeypatch.setattr(ai_service.settings, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(ai_service, "_embed_question", embed)
+    return embedded
+
+
+def _cache_research_answer(question: str, answer: str) -> None:
+    system_prompt = ai_service._build_research_system_prompt("neutral", 1)
+    prompt = f"Query: {question}\nEmotion: neutral\nLevel: 1"
+    key = ai_service._generation_cache_key(system_prompt, prompt, ai_service.RESEARCH_GENERATION_CONFIG)
+    asyncio.run(ai_service.gemini_cache.set(key, answer))
+
+
+def test_exact_research_hit_skips_the_embedding(gemini, embeddings):
+    fake = gemini()
+    _cache_research_answer("What is a black hole?", "A cached answer.")
+
+    async def stream():
+        chunks = ai_service.stream_research_response_with_gemini("What is a black hole?", "neutral", 1)
+        return [chunk async for chunk in chunks]
+
+    answer = asyncio.run(ai_service.generate_research_response_with_gemini("What is a black hole?", "neutral", 1))
+    chunks = asyncio.run(stream())
+
+    assert answer == "A cached answer."
+    assert chunks == ["A cached answer."]
+    assert embeddings == []
+    assert fake.calls == 0
+
+
+def test_research_miss_embeds_the_question(gemini, embeddings):
+    fake = gemini("A fresh answer.")
+
+    answer = asyncio.run(ai_service.generate_research_response_with_gemini("What is a quasar?", "neutral", 1))
+
+    assert answer == "A fresh answer."
+    assert embeddings == ["What is a quasar?"]
+    assert fake.calls == 1
+
+
+def test_bypassed_generation_neither_reads_nor_fills_the_cache(gemini):
+    fake = gemini("fresh", "cached", "fresh again")
+    prompt_args = (None, "Keywords for: volcanoes", ai_service.KEYWORDS_GENERATION_CONFIG)
+
+    async def scenario():
+        bypassed = await ai_service._generate_text(*prompt_args, use_cache=False)
+        cached = await ai_service._generate_text(*prompt_args)
+        repeat = await ai_service._generate_text(*prompt_args)
+        bypassed_again = await ai_service._generate_text(*prompt_args, use_cache=False)
+        return bypassed, cached, repeat, bypassed_again
+
+    assert asyncio.run(scenario()) == ("fresh", "cached", "cached", "fresh again")
+    assert fake.calls == 3
+
+
+def test_disabled_gemini_cache_is_never_filled(gemini, monkeypatch):
+    monkeypatch.setattr(ai_service.settings, "GEMINI_CACHE_ENABLED", False)
+    fake = gemini("one", "two")
+    prompt_args = (None, "Keywords for: volcanoes", ai_service.KEYWORDS_GENERATION_CONFIG)
+
+    async def scenario():
+        return [await ai_service._generate_text(*prompt_args) for _ in range(2)]
+
+    assert asyncio.run(scenario()) == ["one", "two"]
+    assert len(ai_service.gemini_cache.local) == 0
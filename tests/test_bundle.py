@@ -0,0 +1,28 @@
+# tests/test_bundle.py
+
+import asyncio
+import httpx
+from app.services import ai_service, bundle_service
+
+
+class _UnusedTTSClient:
+    async def get(self):
+        raise AssertionError("a bundle without audio must not create the TTS client")
+
+
+def test_image_search_failure_is_reported(monkeypatch):
+    async def answer(question, emotion, level, use_cache=True):
+        return "An answer."
+
+    async def images(question, emotion, client, use_cache=True):
+        request = httpx.Request("POST", "https://google.serper.dev/images")
+        raise httpx.HTTPStatusError("Serper returned 403", request=request, response=httpx.Response(403, request=request))
+
+    monkeypatch.setattr(ai_service, "generate_research_response_with_gemini", answer)
+    monkeypatch.setattr(ai_service, "search_image_urls", images)
+
+    bundle = asyncio.run(bundle_service.build_research_bundle("q", "neutral", 1, None, _UnusedTTSClient()))
+
+    assert bundle["answer"] == "An answer."
+    assert bundle["image_urls"] == []
+    assert bundle["errors"] == {"image_urls": "Serper returned 403"}
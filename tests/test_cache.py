@@ -0,0 +1,264 @@
+# tests/test_cache.py
+
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.core import cache
+from app.core.cache import MISSING, LRUCache, ResponseCache, RevalidatingCache, SQLiteCache, make_cache_key, normalize_text
+from app.core.singleflight import SingleFlight
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: now.value, monotonic=lambda: now.value))
+    return now
+
+
+@pytest.fixture
+def shared(tmp_path):
+    backend = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    yield backend
+    backend.close()
+
+
+def test_keys_ignore_whitespace_and_case():
+    assert make_cache_key("m", normalize_text("What  is\nLight?")) == make_cache_key("m", normalize_text("what is light?"))
+    assert make_cache_key("m", {"a": 1, "b": 2}) == make_cache_key("m", {"b": 2, "a": 1})
+    assert make_cache_key("m", "x") != make_cache_key("n", "x")
+
+
+def test_lru_evicts_the_least_recently_used():
+    lru = LRUCache(max_entries=2, default_ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1  # "b" is now the least recently used
+    lru.set("c", 3)
+
+    assert lru.get("b") is MISSING
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert len(lru) == 2
+
+
+def test_lru_entries_expire(clock):
+    lru = LRUCache(max_entries=4, default_ttl=60)
+    lru.set("default", "x")
+    lru.set("short", "y", ttl=5)
+
+    clock.value += 10
+    assert lru.get("short") is MISSING
+    assert lru.get("default") == "x"
+    clock.value += 50
+    assert lru.get("default") is MISSING
+    assert len(lru) == 0
+
+
+def test_sqlite_round_trips_pickled_values(shared, clock):
+    shared.set("key", {"answer": "text", "parts": [1, 2]}, ttl=60)
+
+    assert shared.get("key") == {"answer": "text", "parts": [1, 2]}
+    assert shared.get("other") is MISSING
+    clock.value += 61
+    assert shared.get("key") is MISSING
+
+
+def test_sqlite_is_shared_between_connections(shared):
+    shared.set("key", "from another worker", ttl=60)
+    other = SQLiteCache(shared.path)
+    try:
+        assert other.get("key") == "from another worker"
+    finally:
+        other.close()
+
+
+def test_response_cache_counts_hits_and_misses():
+    responses = ResponseCache("test", max_entries=4, ttl=60)
+
+    async def scenario():
+        assert await responses.get("key") is MISSING
+        await responses.set("key", "value")
+        assert await responses.get("key") == "value"
+
+    asyncio.run(scenario())
+    stats = responses.stats()
+    assert (stats["hits"], stats["misses"], stats["shared_hits"], stats["entries"]) == (1, 1, 0, 1)
+
+
+def test_response_cache_fills_the_local_tier_from_the_shared_one(shared):
+    writer = ResponseCache("writer", max_entries=4, ttl=60, shared=shared)
+    reader = ResponseCache("reader", max_entries=4, ttl=60, shared=shared)
+
+    async def scenario():
+        await writer.set("key", "value")
+        assert await reader.get("key") == "value"
+        assert reader.local.get("key") == "value"
+
+    asyncio.run(scenario())
+    assert reader.stats()["shared_hits"] == 1
+
+
+def test_single_flight_collapses_concurrent_calls():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)), flight.do("other", fetch))
+
+    results = asyncio.run(scenario())
+    assert results == ["result"] * 6
+    assert calls == 2
+    assert flight.stats() == {"calls": 2, "collapsed": 4, "in_flight": 0}
+
+
+def test_single_flight_shares_errors_and_forgets_the_key():
+    flight = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    async def succeed():
+        return "result"
+
+    async def scenario():
+        results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+        return results, await flight.do("key", succeed)
+
+    errors, retried = asyncio.run(scenario())
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert retried == "result"
+
+
+def test_single_flight_survives_a_cancelled_caller():
+    flight = SingleFlight("test")
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "result"
+
+    async def scenario():
+        first = asyncio.create_task(flight.do("key", fetch))
+        second = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == "result"
+
+
+class _Source:
+    """A fetch function returning the next of its values, counting calls."""
+
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        value = self.values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def _revalidating(**options) -> RevalidatingCache:
+    return RevalidatingCache(ResponseCache("test", max_entries=8, ttl=60), stale_ttl=30, negative_ttl=5, **options)
+
+
+def test_fresh_entry_is_served_from_the_cache(clock):
+    swr = _revalidating()
+    fetch = _Source(["result"], ["newer"])
+
+    async def scenario():
+        first = await swr.get_or_fetch("key", fetch, ttl=60)
+        clock.value += 59
+        return first, await swr.get_or_fetch("key", fetch, ttl=60)
+
+    assert asyncio.run(scenario()) == (["result"], ["result"])
+    assert fetch.calls == 1
+
+
+def test_stale_entry_is_served_while_it_refreshes_once(clock):
+    swr = _revalidating()
+    fetch = _Source(["result"], ["newer"])
+
+    async def scenario():
+        await swr.get_or_fetch("key", fetch, ttl=60)
+        clock.value += 70  # past the TTL, inside the stale window
+        stale = [await swr.get_or_fetch("key", fetch, ttl=60) for _ in range(3)]
+        await asyncio.sleep(0.01)  # let the background refresh finish
+        return stale, await swr.get_or_fetch("key", fetch, ttl=60)
+
+    stale, refreshed = asyncio.run(scenario())
+    assert stale == [["result"]] * 3
+    assert refreshed == ["newer"]
+    assert fetch.calls == 2
+    assert swr.stats()["stale_hits"] == 3
+    assert swr.stats()["refreshes"] == 1
+
+
+def test_failed_refresh_keeps_the_stale_entry_and_retries(clock):
+    swr = _revalidating()
+    fetch = _Source(["result"], RuntimeError("upstream down"), RuntimeError("upstream down"))
+
+    async def scenario():
+        await swr.get_or_fetch("key", fetch, ttl=60)
+        clock.value += 70
+        first = await swr.get_or_fetch("key", fetch, ttl=60)
+        await asyncio.sleep(0.01)
+        second = await swr.get_or_fetch("key", fetch, ttl=60)
+        await asyncio.sleep(0.01)
+        return first, second
+
+    assert asyncio.run(scenario()) == (["result"], ["result"])
+    assert swr.stats()["refreshes"] == 2
+    assert swr.stats()["refresh_errors"] == 2
+
+
+def test_entry_past_the_stale_window_is_fetched_inline(clock):
+    swr = _revalidating()
+    fetch = _Source(["result"], ["newer"])
+
+    async def scenario():
+        await swr.get_or_fetch("key", fetch, ttl=60)
+        clock.value += 91
+        return await swr.get_or_fetch("key", fetch, ttl=60)
+
+    assert asyncio.run(scenario()) == ["newer"]
+    assert swr.stats()["stale_hits"] == 0
+
+
+def test_empty_result_is_kept_for_the_negative_ttl_only(clock):
+    swr = _revalidating()
+    fetch = _Source([], ["found"])
+
+    async def scenario():
+        empty = await swr.get_or_fetch("key", fetch, ttl=60)
+        clock.value += 4
+        still_empty = await swr.get_or_fetch("key", fetch, ttl=60)
+        clock.value += 2  # past the negative TTL, and there is no stale window
+        return empty, still_empty, await swr.get_or_fetch("key", fetch, ttl=60)
+
+    assert asyncio.run(scenario()) == ([], [], ["found"])
+    assert fetch.calls == 2
+    assert swr.stats()["negative_stores"] == 1
+    assert swr.stats()["stale_hits"] == 0
+
+
+def test_custom_emptiness_check(clock):
+    swr = _revalidating(is_empty=lambda value: not value["organic"])
+    fetch = _Source({"organic": [], "searchParameters": {"q": "x"}}, {"organic": ["hit"]})
+
+    async def scenario():
+        await swr.get_or_fetch("key", fetch, ttl=60)
+        clock.value += 6
+        return await swr.get_or_fetch("key", fetch, ttl=60)
+
+    assert asyncio.run(scenario()) == {"organic": ["hit"]}
+    assert swr.stats()["negative_stores"] == 1
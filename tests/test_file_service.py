@@ -0,0 +1,121 @@
+# tests/test_file_service.py
+
+import asyncio
+import io
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+from app.services import file_service
+
+CHUNK_SIZE = 256 * 1024
+
+
+class _StubBlob:
+    def __init__(self, name: str, chunk_size: int | None):
+        self.name = name
+        self.chunk_size = chunk_size
+        self.uploaded = None
+        self.public = False
+        self.signed_with = None
+
+    def upload_from_file(self, file, size=None, content_type=None):
+        self.uploaded = (file.read(), size, content_type)
+
+    def make_public(self):
+        self.public = True
+
+    @property
+    def public_url(self) -> str:
+        return f"https://storage.googleapis.com/test/{self.name}"
+
+    def generate_signed_url(self, **kwargs) -> str:
+        self.signed_with = kwargs
+        return f"https://storage.googleapis.com/test/{self.name}?X-Goog-Signature=sig"
+
+
+class _StubClient:
+    """Stands in for storage.Client, recording the blobs created in its one bucket."""
+
+    def __init__(self):
+        self.blobs: list[_StubBlob] = []
+
+    def bucket(self, name: str):
+        assert name == file_service.settings.GCS_BUCKET_NAME
+        return self
+
+    def blob(self, name: str, chunk_size: int | None = None) -> _StubBlob:
+        blob = _StubBlob(name, chunk_size)
+        self.blobs.append(blob)
+        return blob
+
+
+@pytest.fixture(autouse=True)
+def gcs(monkeypatch):
+    monkeypatch.setattr(file_service.settings, "GCS_UPLOAD_CHUNK_SIZE", CHUNK_SIZE)
+    monkeypatch.setattr(file_service.settings, "GCS_SIGNED_URLS", False)
+
+
+def _upload(client: _StubClient, size: int, content_type: str = "image/png", filename: str = "photo.png") -> str:
+    data = b"x" * size
+    file = UploadFile(io.BytesIO(data), size=size, filename=filename, headers=Headers({"content-type": content_type}))
+    return asyncio.run(file_service.upload_file_to_gcs(client, file))
+
+
+def test_small_file_is_sent_in_one_request():
+    client = _StubClient()
+
+    url = _upload(client, CHUNK_SIZE)
+
+    blob, = client.blobs
+    assert blob.chunk_size is None
+    assert blob.uploaded == (b"x" * CHUNK_SIZE, CHUNK_SIZE, "image/png")
+    assert blob.name.endswith(".png")
+    assert blob.public
+    assert url == blob.public_url
+
+
+def test_large_file_uses_a_resumable_upload():
+    client = _StubClient()
+
+    _upload(client, CHUNK_SIZE + 1)
+
+    blob, = client.blobs
+    assert blob.chunk_size == CHUNK_SIZE
+    assert blob.uploaded[1] == CHUNK_SIZE + 1
+
+
+def test_signed_url_instead_of_a_public_object(monkeypatch):
+    monkeypatch.setattr(file_service.settings, "GCS_SIGNED_URLS", True)
+    monkeypatch.setattr(file_service.settings, "GCS_SIGNED_URL_TTL", 600)
+    # Credentials without a private key, as on Cloud Run, sign through the IAM API
+    monkeypatch.setattr(file_service, "_signing_credentials", SimpleNamespace(
+        valid=True, token="token", service_account_email="uploader@test.iam.gserviceaccount.com"
+    ))
+    client = _StubClient()
+
+    url = _upload(client, 1024)
+
+    blob, = client.blobs
+    assert not blob.public
+    assert url.endswith("X-Goog-Signature=sig")
+    assert blob.signed_with["version"] == "v4"
+    assert blob.signed_with["method"] == "GET"
+    assert blob.signed_with["expiration"].total_seconds() == 600
+    assert blob.signed_with["service_account_email"] == "uploader@test.iam.gserviceaccount.com"
+    assert blob.signed_with["access_token"] == "token"
+
+
+@pytest.mark.parametrize("content_type, size, status", [
+    ("text/plain", 10, 400),
+    ("image/png", file_service.settings.MAX_IMAGE_UPLOAD_BYTES + 1, 413),
+])
+def test_rejected_uploads_never_reach_the_bucket(content_type, size, status):
+    client = _StubClient()
+    file = UploadFile(io.BytesIO(b""), size=size, filename="file", headers=Headers({"content-type": content_type}))
+
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(file_service.upload_file_to_gcs(client, file))
+
+    assert rejected.value.status_code == status
+    assert client.blobs == []
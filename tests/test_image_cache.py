@@ -0,0 +1,122 @@
+# tests/test_image_cache.py
+
+import io
+from types import SimpleNamespace
+import pytest
+from PIL import Image
+from app.core import cache, image_cache
+from app.core.cache import MISSING
+from app.core.image_cache import PerceptualCache
+from app.services import image_service
+
+HASH_BYTES = 32  # a 16 x 16 dHash
+THUMBNAIL_BYTES = image_service.THUMBNAIL_SIZE ** 2
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1_000_000.0)
+    fake = SimpleNamespace(time=lambda: now.value, monotonic=lambda: now.value)
+    monkeypatch.setattr(image_cache, "time", fake)
+    monkeypatch.setattr(cache, "time", fake)
+    return now
+
+
+def _cache(max_distance: int = 12, max_pixel_diff: int = 32) -> PerceptualCache:
+    return PerceptualCache("test", max_entries=8, ttl=60.0, max_distance=max_distance, max_pixel_diff=max_pixel_diff)
+
+
+def _hash(flipped_bits: int = 0) -> bytes:
+    image_hash = bytearray(b"\x5a" * HASH_BYTES)
+    for bit in range(flipped_bits):
+        image_hash[bit // 8] ^= 0x80 >> (bit % 8)
+    return bytes(image_hash)
+
+
+def _thumbnail(brighter_by: int = 0) -> bytes:
+    return bytes((i % 200) + brighter_by for i in range(THUMBNAIL_BYTES))
+
+
+def test_exact_hit():
+    perceptual = _cache()
+    perceptual.add("digest", _hash(), _thumbnail(), "answer")
+
+    assert perceptual.get_exact("digest") == "answer"
+    assert perceptual.get_exact("other") is MISSING
+    assert perceptual.stats()["exact_hits"] == 1
+
+
+def test_near_duplicate_within_max_distance_hits():
+    perceptual = _cache()
+    perceptual.add("digest", _hash(), _thumbnail(), "answer")
+
+    assert perceptual.get_similar(_hash(flipped_bits=12), _thumbnail(brighter_by=20)) == "answer"
+    assert perceptual.get_similar(_hash(flipped_bits=13), _thumbnail()) is MISSING
+    assert perceptual.stats()["perceptual_hits"] == 1
+    assert perceptual.stats()["misses"] == 1
+
+
+def test_closest_match_wins():
+    perceptual = _cache()
+    perceptual.add("far", _hash(flipped_bits=10), _thumbnail(), "far")
+    perceptual.add("near", _hash(flipped_bits=2), _thumbnail(), "near")
+
+    assert perceptual.get_similar(_hash(), _thumbnail()) == "near"
+
+
+def test_thumbnail_difference_rejects_a_hash_match():
+    perceptual = _cache(max_pixel_diff=32)
+    perceptual.add("digest", _hash(), _thumbnail(), "answer")
+
+    # Same layout, different content: the hashes agree but one pixel is far off
+    different = bytearray(_thumbnail())
+    different[100] += 33
+    assert perceptual.get_similar(_hash(), bytes(different)) is MISSING
+
+
+def test_entries_expire(clock):
+    perceptual = _cache()
+    perceptual.add("digest", _hash(), _thumbnail(), "answer")
+
+    clock.value += 59
+    assert perceptual.get_exact("digest") == "answer"
+    assert perceptual.get_similar(_hash(), _thumbnail()) == "answer"
+
+    clock.value += 2
+    assert perceptual.get_exact("digest") is MISSING
+    assert perceptual.get_similar(_hash(), _thumbnail()) is MISSING
+
+
+def test_expired_row_is_reused_first(clock):
+    perceptual = PerceptualCache("test", max_entries=2, ttl=60.0, max_distance=12, max_pixel_diff=32)
+    perceptual.add("old", _hash(), _thumbnail(), "old")
+    clock.value += 30
+    perceptual.add("kept", _hash(flipped_bits=40), _thumbnail(), "kept")
+    clock.value += 40  # "old" has expired, "kept" has not
+    perceptual.add("new", _hash(flipped_bits=80), _thumbnail(), "new")
+
+    assert perceptual.get_similar(_hash(flipped_bits=40), _thumbnail()) == "kept"
+    assert perceptual.get_similar(_hash(flipped_bits=80), _thumbnail()) == "new"
+    assert perceptual.stats()["evictions"] == 1
+
+
+def test_zero_distance_disables_the_perceptual_tier():
+    perceptual = _cache(max_distance=0)
+    perceptual.add("digest", _hash(), _thumbnail(), "answer")
+
+    assert perceptual.get_similar(_hash(), _thumbnail()) is MISSING
+    assert perceptual.get_exact("digest") == "answer"
+
+
+def test_reencoded_photo_hits():
+    photo = Image.frombytes("RGB", (256, 192), bytes((x * 3 + y) % 256 for y in range(192) for x in range(256 * 3)))
+    perceptual = _cache()
+
+    def fingerprint(quality: int) -> tuple[bytes, bytes]:
+        buffer = io.BytesIO()
+        photo.save(buffer, format="JPEG", quality=quality)
+        decoded = Image.open(buffer)
+        return image_service._dhash(decoded, 16), image_service._thumbnail(decoded)
+
+    perceptual.add("high", *fingerprint(95), "answer")
+    assert perceptual.get_similar(*fingerprint(60)) == "answer"
@@ -0,0 +1,90 @@
+# tests/test_image_service.py
+
+import asyncio
+import io
+import pytest
+from PIL import Image
+from app.services import image_service
+
+
+@pytest.fixture(autouse=True)
+def output(monkeypatch):
+    monkeypatch.setattr(image_service.settings, "IMAGE_PREPROCESSING_ENABLED", True)
+    monkeypatch.setattr(image_service.settings, "IMAGE_MAX_DIMENSION", 256)
+    monkeypatch.setattr(image_service.settings, "IMAGE_OUTPUT_FORMAT", "JPEG")
+    monkeypatch.setattr(image_service.settings, "IMAGE_OUTPUT_QUALITY", 85)
+
+
+def _encode(image: Image.Image, format: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def _noise(width: int, height: int) -> Image.Image:
+    # Random pixels, so re-encoding as JPEG cannot shrink a lossless original much
+    return Image.frombytes("RGB", (width, height), bytes((i * 7919) % 251 for i in range(width * height * 3)))
+
+
+def _preprocess(data: bytes, mime_type: str = "image/jpeg"):
+    return asyncio.run(image_service.preprocess_image(data, mime_type))
+
+
+def test_large_image_is_downscaled():
+    original = _encode(_noise(1024, 512), "PNG")
+
+    prepared = _preprocess(original, "image/png")
+
+    assert (prepared.width, prepared.height) == (256, 128)
+    assert prepared.mime_type == "image/jpeg"
+    assert Image.open(io.BytesIO(prepared.data)).size == (256, 128)
+    assert prepared.bytes_saved > 0
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # stored landscape, displayed rotated 90 degrees clockwise
+    original = _encode(Image.new("RGB", (200, 100), (200, 30, 30)), "JPEG", exif=exif)
+
+    prepared = _preprocess(original)
+
+    assert (prepared.width, prepared.height) == (100, 200)
+    decoded = Image.open(io.BytesIO(prepared.data))
+    assert decoded.size == (100, 200)
+    assert decoded.getexif().get(0x0112, 1) == 1
+
+
+def test_original_is_kept_when_reencoding_does_not_shrink_it():
+    original = _encode(Image.new("RGB", (64, 64), (10, 120, 200)), "PNG")
+
+    prepared = _preprocess(original, "image/png")
+
+    assert prepared.data == original
+    assert prepared.mime_type == "image/png"
+    assert prepared.bytes_saved == 0
+
+
+def test_format_gemini_does_not_accept_falls_back_to_the_output_format():
+    original = _encode(Image.new("RGB", (64, 64), (10, 120, 200)), "GIF")
+
+    prepared = _preprocess(original, "image/gif")
+
+    assert prepared.mime_type == "image/jpeg"
+    assert Image.open(io.BytesIO(prepared.data)).format == "JPEG"
+    assert prepared.bytes_saved < 0
+
+
+def test_transparent_png_is_flattened_for_jpeg():
+    original = _encode(_noise(512, 512).convert("RGBA"), "PNG")
+
+    prepared = _preprocess(original, "image/png")
+
+    assert prepared.mime_type == "image/jpeg"
+    assert Image.open(io.BytesIO(prepared.data)).mode == "RGB"
+
+
+def test_unsupported_output_format_is_rejected(monkeypatch):
+    monkeypatch.setattr(image_service.settings, "IMAGE_OUTPUT_FORMAT", "BMP")
+
+    with pytest.raises(ValueError):
+        _preprocess(_encode(Image.new("RGB", (8, 8)), "PNG"), "image/png")
@@ -0,0 +1,103 @@
+# tests/test_jobs.py
+
+import asyncio
+import pytest
+from app.core.jobs import BinaryResult, FAILED, JobQueue, JobStore, QUEUED, RUNNING, SUCCEEDED
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_claim_and_finish(store):
+    job = store.create("research", {"question": "q"}, priority=0)
+    assert job.status == QUEUED
+
+    claimed = store.claim("worker-1")
+    assert (claimed.id, claimed.status, claimed.attempts) == (job.id, RUNNING, 1)
+    assert claimed.payload == {"question": "q"}
+    assert store.claim("worker-2") is None  # a running job is not handed out twice
+
+    store.finish(job.id, SUCCEEDED, {"answer": "a"})
+    finished = store.get(job.id)
+    assert finished.finished and finished.finished_at is not None
+    assert finished.result is None  # status reads leave the result alone
+    assert store.get(job.id, with_result=True).public()["result"] == {"answer": "a"}
+    assert store.result(job.id) == {"answer": "a"}
+
+
+def test_higher_priority_is_claimed_first(store):
+    low = store.create("research", {}, priority=-5)
+    high = store.create("research", {}, priority=5)
+    normal = store.create("research", {}, priority=0)
+    assert [store.claim("w").id for _ in range(3)] == [high.id, normal.id, low.id]
+
+
+def test_input_is_only_loaded_by_claim_and_dropped_on_finish(store):
+    job = store.create("transcribe", {}, priority=0, input=b"audio")
+    claimed = store.claim("w")
+    assert claimed.input == b"audio"
+    store.finish(job.id, SUCCEEDED, {"transcription": "t"})
+    assert store._conn.execute("SELECT input FROM jobs WHERE id = ?", (job.id,)).fetchone()[0] is None
+
+
+def test_binary_result_is_served_separately(store):
+    job = store.create("tts", {"text": "hi"}, priority=0)
+    store.claim("w")
+    store.finish(job.id, SUCCEEDED, BinaryResult(b"mp3", "audio/mpeg"))
+    public = store.get(job.id, with_result=True).public()
+    assert public["result_media_type"] == "audio/mpeg" and "result" not in public
+    assert store.result(job.id) == BinaryResult(b"mp3", "audio/mpeg")
+
+
+def test_requeued_job_waits_for_its_delay(store):
+    job = store.create("research", {}, priority=0)
+    store.claim("w")
+    store.requeue(job.id, delay=60.0)
+    assert store.get(job.id).status == QUEUED
+    assert store.claim("w") is None
+
+
+def test_only_queued_jobs_can_be_cancelled(store):
+    queued = store.create("research", {}, priority=0)
+    running = store.create("research", {}, priority=-1)
+    assert store.cancel_queued(queued.id)
+    store.claim("w")
+    assert not store.cancel_queued(running.id)
+
+
+def test_interrupted_jobs_are_recovered(store):
+    job = store.create("research", {}, priority=0)
+    store.claim("999999999")  # no such process
+    assert store.recover(max_attempts=3) == 1
+    assert store.get(job.id).status == QUEUED
+    store.claim("999999999")
+    store.claim("999999999")
+    assert store.recover(max_attempts=2) == 0
+    assert store.get(job.id).status == FAILED
+
+
+def test_queue_runs_a_job_to_completion(store):
+    async def echo(job):
+        return {"answer": job.payload["question"].upper()}
+
+    async def scenario():
+        queue = JobQueue(store, {"research": echo}, concurrency=2, max_queued=10,
+                         retention=3600.0, poll_interval=0.05, max_attempts=3)
+        await queue.start()
+        try:
+            job = await queue.submit("research", {"question": "why is the sky blue"})
+            async with asyncio.timeout(5):
+                updates = [update async for update in queue.watch(job.id)]
+            return queue, updates
+        finally:
+            await queue.stop()
+
+    queue, updates = asyncio.run(scenario())
+    assert updates[0].status in (QUEUED, RUNNING)
+    assert updates[-1].status == SUCCEEDED
+    assert updates[-1].result == {"answer": "WHY IS THE SKY BLUE"}
+    assert queue.stats()["completed"] == 1
@@ -0,0 +1,110 @@
+# tests/test_limiter.py
+
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from app.api.deps import get_speech_client
+from app.core import limiter
+from app.core.limiter import AdaptiveLimiter, UpstreamOverloaded
+from app.main import app
+from app.services import ai_service
+
+
+def test_full_queue_is_shed():
+    async def scenario():
+        upstream = AdaptiveLimiter("test", max_limit=1, max_queue=0, queue_timeout=2.0)
+        await upstream.acquire()
+        with pytest.raises(UpstreamOverloaded) as shed:
+            await upstream.acquire()
+        return upstream, shed.value
+
+    upstream, error = asyncio.run(scenario())
+    assert upstream.shed == 1
+    assert upstream.in_flight == 1
+    assert error.upstream == "test"
+    assert error.retry_after == 2
+
+
+def test_queue_timeout_is_shed():
+    async def scenario():
+        upstream = AdaptiveLimiter("test", max_limit=1, max_queue=10, queue_timeout=0.05)
+        await upstream.acquire()
+        with pytest.raises(UpstreamOverloaded):
+            await upstream.acquire()
+        return upstream
+
+    upstream = asyncio.run(scenario())
+    assert upstream.shed == 1
+    assert upstream.queue_depth == 0
+
+
+def test_released_slot_goes_to_the_next_waiter():
+    async def scenario():
+        upstream = AdaptiveLimiter("test", max_limit=1, max_queue=10, queue_timeout=1.0)
+        await upstream.acquire()
+        waiter = asyncio.create_task(upstream.acquire())
+        await asyncio.sleep(0)
+        assert upstream.queue_depth == 1
+        upstream.release()
+        await waiter
+        return upstream
+
+    upstream = asyncio.run(scenario())
+    assert upstream.in_flight == 1
+    assert upstream.shed == 0
+
+
+class _UnusedSpeechClient:
+    async def recognize(self, config, audio):
+        raise AssertionError("a shed request must not reach the upstream")
+
+
+def test_shed_request_is_a_503_with_retry_after(monkeypatch):
+    saturated = AdaptiveLimiter("speech", max_limit=1, max_queue=0, queue_timeout=3.0)
+    saturated.in_flight = 1
+    monkeypatch.setitem(limiter.limiters, "speech", saturated)
+    app.dependency_overrides[get_speech_client] = _UnusedSpeechClient
+    try:
+        response = TestClient(app).post(
+            "/api/transcribe", files={"file": ("speech.webm", b"audio", "audio/webm")}
+        )
+    finally:
+        app.dependency_overrides.pop(get_speech_client)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+    assert "speech" in response.json()["detail"]
+    assert saturated.shed == 1
+
+
+def _research_stream(*chunks: str, error: Exception | None = None):
+    async def stream(question, emotion, level, use_cache=True):
+        if error is not None:
+            raise error
+        for chunk in chunks:
+            yield chunk
+    return stream
+
+
+def _post_streaming_research():
+    return TestClient(app).post(
+        "/api/research", json={"question": "q", "emotion": "curious", "level": 1, "stream": True}
+    )
+
+
+def test_overload_before_the_first_chunk_is_a_503(monkeypatch):
+    error = UpstreamOverloaded("gemini", 4)
+    monkeypatch.setattr(ai_service, "stream_research_response_with_gemini", _research_stream(error=error))
+    response = _post_streaming_research()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "4"
+
+
+def test_stream_sends_every_chunk_then_done(monkeypatch):
+    monkeypatch.setattr(ai_service, "stream_research_response_with_gemini", _research_stream("Plants ", "grow."))
+    response = _post_streaming_research()
+    assert response.status_code == 200
+    assert response.text == (
+        'data: {"text": "Plants "}\n\n'
+        'data: {"text": "grow."}\n\n'
+        'event: done\ndata: {}\n\n'
+    )
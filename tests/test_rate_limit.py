@@ -0,0 +1,160 @@
+# tests/test_rate_limit.py
+
+import json
+from types import SimpleNamespace
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from app.api.rate_limits import RATE_LIMIT_RULES, RESEARCH_MAX_COST
+from app.core import rate_limit
+from app.core.rate_limit import MemoryBuckets, RateLimiter, RateLimitMiddleware, RouteRule, SQLiteBuckets
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the clocks the buckets read with one the test moves by hand."""
+    now = SimpleNamespace(value=1_000_000.0)
+    fake = SimpleNamespace(monotonic=lambda: now.value, time=lambda: now.value)
+    monkeypatch.setattr(rate_limit, "time", fake)
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def buckets(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBuckets(max_keys=100)
+    return SQLiteBuckets(str(tmp_path / "buckets.sqlite3"), idle_ttl=3600.0)
+
+
+def test_bucket_refills(buckets, clock):
+    # Capacity 2, one token per second
+    assert buckets.take("a", 1, 2, 1.0)[0]
+    assert buckets.take("a", 1, 2, 1.0)[0]
+    assert buckets.take("a", 1, 2, 1.0) == (False, 0.0, 1.0)
+    clock.value += 0.5
+    allowed, tokens, retry_after = buckets.take("a", 1, 2, 1.0)
+    assert not allowed and retry_after == pytest.approx(0.5)
+    clock.value += 0.5
+    assert buckets.take("a", 1, 2, 1.0)[0]
+    clock.value += 60
+    assert buckets.take("a", 0, 2, 1.0)[1] == 2  # never refills past the capacity
+
+
+def test_backends_agree(tmp_path, clock):
+    memory = MemoryBuckets(max_keys=100)
+    shared = SQLiteBuckets(str(tmp_path / "buckets.sqlite3"), idle_ttl=3600.0)
+    steps = [("a", 3, 0.0), ("b", 1, 0.1), ("a", 3, 0.2), ("a", 2, 0.3), ("b", 5, 1.5), ("a", 1, 4.0)]
+    for key, cost, delay in steps:
+        clock.value += delay
+        expected = memory.take(key, cost, 5, 2.0)
+        actual = shared.take(key, cost, 5, 2.0)
+        assert actual[0] == expected[0]
+        assert actual[1:] == pytest.approx(expected[1:])
+    assert len(memory) == len(shared) == 2
+
+
+def test_memory_buckets_forget_the_least_recent_client(clock):
+    buckets = MemoryBuckets(max_keys=2)
+    for key in ("a", "b", "a", "c"):
+        buckets.take(key, 1, 5, 1.0)
+    assert len(buckets) == 2 and buckets.evictions == 1
+    assert buckets.take("b", 5, 5, 1.0)[0]  # "b" was dropped, so it starts full again
+
+
+# --- Middleware ---
+
+async def _echo(request: Request):
+    return JSONResponse({"body": (await request.body()).decode()})
+
+def _client(buckets: dict, rules: dict, trusted_proxies: int = 0, peek_bytes: int = 64 * 1024):
+    limiter = RateLimiter(buckets, max_clients=100)
+    app = Starlette(routes=[Route(path, _echo, methods=["POST"]) for path in rules])
+    app = RateLimitMiddleware(
+        app, limiter=limiter, rules=rules, trusted_proxies=trusted_proxies, peek_bytes=peek_bytes
+    )
+    return TestClient(app), limiter
+
+
+def test_exhausted_bucket_is_a_429_with_retry_after(clock):
+    client, _ = _client({"ai": (2, 60)}, {"/ai": RouteRule("ai")})  # one token per second
+    first = client.post("/ai")
+    assert first.status_code == 200
+    assert (first.headers["RateLimit-Limit"], first.headers["RateLimit-Remaining"]) == ("2", "1")
+    assert client.post("/ai").status_code == 200
+
+    refused = client.post("/ai")
+    assert refused.status_code == 429
+    assert refused.headers["Retry-After"] == "1"
+    assert refused.headers["RateLimit-Remaining"] == "0"
+    assert refused.json() == {"detail": "Rate limit exceeded for ai requests"}
+
+    clock.value += 1
+    assert client.post("/ai").status_code == 200
+
+
+def test_route_classes_have_separate_buckets(clock):
+    rules = {"/ai": RouteRule("ai"), "/search": RouteRule("search"), "/free": RouteRule("unlimited")}
+    client, limiter = _client({"ai": (1, 1), "search": (1, 1)}, rules)
+    assert client.post("/ai").status_code == 200
+    assert client.post("/ai").status_code == 429
+    assert client.post("/search").status_code == 200
+    assert client.post("/free").status_code == 200  # a class without a bucket is not limited
+    stats = limiter.stats()["classes"]
+    assert (stats["ai"]["allowed"], stats["ai"]["limited"], stats["search"]["allowed"]) == (1, 1, 1)
+
+
+@pytest.mark.parametrize("trusted_proxies, forwarded_for, expected", [
+    (0, "1.1.1.1, 2.2.2.2", "peer"),  # without trusted proxies the header is ignored
+    (1, "1.1.1.1, 2.2.2.2", "2.2.2.2"),
+    (2, "1.1.1.1, 2.2.2.2", "1.1.1.1"),
+    (3, "1.1.1.1, 2.2.2.2", "peer"),  # fewer hops than proxies: the header cannot be trusted
+    (1, None, "peer"),
+])
+def test_client_key_from_forwarded_for(trusted_proxies, forwarded_for, expected):
+    middleware = RateLimitMiddleware(None, limiter=None, rules={}, trusted_proxies=trusted_proxies)
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    assert middleware._client({"headers": headers, "client": ("peer", 1234)}) == expected
+
+
+def test_client_without_address():
+    middleware = RateLimitMiddleware(None, limiter=None, rules={})
+    assert middleware._client({"headers": [], "client": None}) == "unknown"
+
+
+def _research_client(**kwargs):
+    return _client({"ai": (100, 60)}, {"/api/research": RATE_LIMIT_RULES["/api/research"]}, **kwargs)
+
+@pytest.mark.parametrize("body, cost", [
+    (b'{"question": "q", "emotion": "e", "level": 1}', 2.0),
+    (b'{"question": "q", "emotion": "e", "level": 3}', 5.0),
+    (b'{"question": "q", "emotion": "e", "level": 1e999}', 1.0),  # int(inf) overflows
+    (b'{"question": "q", "emotion": "e", "level": "high"}', 1.0),
+    (b'["not", "an", "object"]', 1.0),
+    (b'{"question": ', 1.0),
+])
+def test_body_cost(body, cost, clock):
+    client, limiter = _research_client()
+    response = client.post("/api/research", content=body, headers={"content-type": "application/json"})
+    assert response.status_code == 200
+    assert response.json()["body"] == body.decode()  # the app still gets the whole body
+    assert limiter.stats()["classes"]["ai"]["tokens_spent"] == cost
+
+
+def test_chunked_body_is_priced(clock):
+    client, limiter = _research_client()
+    body = json.dumps({"question": "q", "emotion": "e", "level": 3}).encode()
+    response = client.post("/api/research", content=iter([body[:10], body[10:]]))
+    assert response.json()["body"] == body.decode()
+    assert limiter.stats()["classes"]["ai"]["tokens_spent"] == 5.0
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_body_too_long_to_read_ahead_is_charged_the_max_cost(chunked, clock):
+    client, limiter = _research_client(peek_bytes=64)
+    body = json.dumps({"question": "q" * 100, "emotion": "e", "level": 1}).encode()
+    response = client.post("/api/research", content=iter([body[:50], body[50:]]) if chunked else body)
+    assert response.json()["body"] == body.decode()
+    assert limiter.stats()["classes"]["ai"]["tokens_spent"] == RESEARCH_MAX_COST
@@ -0,0 +1,39 @@
+# tests/test_semantic_cache.py
+
+import pytest
+from app.core.cache import normalize_text
+from app.core.config import settings
+from app.core.semantic_cache import SemanticCache, hashing_embedding
+
+
+def _embed(question: str):
+    return hashing_embedding(normalize_text(question), settings.SEMANTIC_CACHE_HASHING_DIM)
+
+def _cache() -> SemanticCache:
+    return SemanticCache("test", settings.SEMANTIC_CACHE_THRESHOLD, max_entries=16, ttl=60.0)
+
+
+def test_hashing_embedding_is_deterministic():
+    assert (_embed("How do volcanoes erupt?") == _embed("How do volcanoes erupt?")).all()
+
+
+def test_rephrasing_hits():
+    cache = _cache()
+    cache.add("calm:1", "What is photosynthesis?", _embed("What is photosynthesis?"), "answer")
+    assert cache.get("calm:1", _embed("Can you explain photosynthesis, please")) == "answer"
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("world war 1", "world war 2"),
+    ("what is photosynthesis", "what is the opposite of photosynthesis"),
+])
+def test_near_miss_does_not_collide(cached, asked):
+    cache = _cache()
+    cache.add("calm:1", cached, _embed(cached), "answer")
+    assert cache.get("calm:1", _embed(asked)) is None
+
+
+def test_buckets_are_separate():
+    cache = _cache()
+    cache.add("calm:1", "What is photosynthesis?", _embed("What is photosynthesis?"), "answer")
+    assert cache.get("calm:3", _embed("What is photosynthesis?")) is None
@@ -0,0 +1,85 @@
+# tests/test_serper.py
+
+import asyncio
+import json
+import pickle
+import httpx
+import pytest
+from app.core.cache import ResponseCache, RevalidatingCache
+from app.services import external_api_service
+from app.services.external_api_service import SerperReply
+
+
+class _StubClient:
+    def __init__(self, body: bytes):
+        self.body = body
+        self.posts = 0
+
+    async def post(self, url, headers, json):
+        self.posts += 1
+        return httpx.Response(200, content=self.body, request=httpx.Request("POST", url))
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Counts JSON parses of Serper bodies and gives each test an empty cache."""
+    counter = {"parses": 0}
+    json_loads = external_api_service._json_loads
+
+    def counting_loads(body):
+        counter["parses"] += 1
+        return json_loads(body)
+
+    monkeypatch.setattr(external_api_service, "_json_loads", counting_loads)
+    monkeypatch.setattr(external_api_service, "serper_cache", RevalidatingCache(
+        ResponseCache("serper-test", max_entries=16, ttl=60),
+        stale_ttl=60,
+        negative_ttl=5,
+        is_empty=external_api_service._is_empty_result,
+    ))
+    monkeypatch.setattr(external_api_service.settings, "SERPER_CACHE_ENABLED", True)
+    return counter
+
+
+def test_a_miss_parses_once_and_hits_reuse_the_result(parses):
+    body = json.dumps({"organic": [{"title": "Black holes"}]}).encode()
+    client = _StubClient(body)
+
+    async def scenario():
+        first = await external_api_service.search_serper_scholar(client, "black holes")
+        second = await external_api_service.search_serper_scholar(client, "Black  Holes")
+        raw = await external_api_service.search_serper_scholar(client, "black holes", raw=True)
+        return first, second, raw
+
+    first, second, raw = asyncio.run(scenario())
+    assert client.posts == 1
+    assert parses["parses"] == 1
+    assert first == second == {"organic": [{"title": "Black holes"}]}
+    assert raw == body
+
+
+def test_malformed_body_is_not_cached(parses):
+    client = _StubClient(b'{"organic": [')
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(httpx.DecodingError):
+                await external_api_service.search_serper_scholar(client, "black holes")
+
+    asyncio.run(scenario())
+    assert client.posts == 2
+
+
+def test_non_object_body_is_rejected(parses):
+    with pytest.raises(httpx.DecodingError):
+        asyncio.run(external_api_service.search_serper_images(_StubClient(b"[]"), "cats"))
+
+
+def test_shared_tier_pickles_only_the_body(parses):
+    reply = SerperReply(b'{"images": []}')
+    assert reply.data == {"images": []}
+    restored = pickle.loads(pickle.dumps(reply))
+    assert restored.body == reply.body
+    assert restored._data is None
+    assert restored.data == {"images": []}
+    assert external_api_service._is_empty_result(restored)
@@ -0,0 +1,82 @@
+# tests/test_transcription.py
+
+import asyncio
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from app.api.deps import get_speech_client
+from app.main import app
+from app.services import audio_service
+
+
+def _result(*transcripts: str, is_final: bool = True, stability: float = 0.0):
+    alternatives = [SimpleNamespace(transcript=t) for t in transcripts]
+    return SimpleNamespace(alternatives=alternatives, is_final=is_final, stability=stability)
+
+
+class FakeSpeechClient:
+    """Answers recognize() with fixed results, in the order Speech-to-Text returns them."""
+
+    def __init__(self, results):
+        self.results = results
+
+    async def recognize(self, config, audio):
+        return SimpleNamespace(results=self.results)
+
+    async def streaming_recognize(self, requests):
+        chunks = [request async for request in requests]
+        assert chunks[0].streaming_config.interim_results
+
+        async def responses():
+            for result in self.results:
+                yield SimpleNamespace(results=[result])
+        return responses()
+
+
+def test_segments_are_joined_in_order():
+    client = FakeSpeechClient([
+        _result(" Plants need light. "),
+        _result("They turn it into sugar.", "They turn it into sugar"),  # only the top alternative counts
+        _result("Oxygen is left over."),
+    ])
+    transcript = asyncio.run(audio_service.transcribe_audio_gcp(client, b"audio"))
+    assert transcript == "Plants need light. They turn it into sugar. Oxygen is left over."
+
+
+def test_segments_without_alternatives_are_skipped():
+    client = FakeSpeechClient([_result("First."), _result(), _result("Last.")])
+    assert asyncio.run(audio_service.transcribe_audio_gcp(client, b"audio")) == "First. Last."
+
+
+def test_no_speech_gives_an_empty_transcript():
+    assert asyncio.run(audio_service.transcribe_audio_gcp(FakeSpeechClient([]), b"audio")) == ""
+
+
+def test_stream_yields_results_in_order():
+    client = FakeSpeechClient([
+        _result("plants", is_final=False, stability=0.41234),
+        _result("plants need light", is_final=True),
+    ])
+
+    async def audio_chunks():
+        yield b"chunk"
+
+    async def collect():
+        return [item async for item in audio_service.stream_transcribe_gcp(client, audio_chunks())]
+
+    assert asyncio.run(collect()) == [
+        {"transcript": "plants", "is_final": False, "stability": 0.412},
+        {"transcript": "plants need light", "is_final": True, "stability": 0.0},
+    ]
+
+
+def test_transcribe_endpoint_returns_the_joined_transcript():
+    client = FakeSpeechClient([_result("Hello."), _result("Goodbye.")])
+    app.dependency_overrides[get_speech_client] = lambda: client
+    try:
+        response = TestClient(app).post(
+            "/api/transcribe", files={"file": ("speech.webm", b"audio", "audio/webm")}
+        )
+    finally:
+        app.dependency_overrides.pop(get_speech_client)
+    assert response.status_code == 200
+    assert response.json()["transcription"] == "Hello. Goodbye."
@@ -0,0 +1,90 @@
+# tests/test_tts.py
+
+import asyncio
+import pytest
+from app.services import audio_service
+from app.services.audio_service import split_into_segments
+
+
+@pytest.fixture(autouse=True)
+def segment_sizes(monkeypatch):
+    monkeypatch.setattr(audio_service.settings, "TTS_SEGMENT_TARGET_CHARS", 300)
+    monkeypatch.setattr(audio_service.settings, "TTS_SEGMENT_MAX_CHARS", 1500)
+
+
+def _within_limits(segments: list[str]) -> bool:
+    return all(0 < len(s) <= 1500 and len(s.encode("utf-8")) <= 5000 for s in segments)
+
+
+def test_short_sentences_are_merged_up_to_the_target():
+    sentence = "Volcanoes erupt when magma rises."  # 33 characters
+    segments = split_into_segments(" ".join([sentence] * 20))
+
+    assert all(len(segment) <= 300 for segment in segments)
+    assert len(segments[0]) > 300 - len(sentence) - 1
+    assert " ".join(segments) == " ".join([sentence] * 20)
+
+
+def test_paragraph_breaks_are_sentence_boundaries(monkeypatch):
+    monkeypatch.setattr(audio_service.settings, "TTS_SEGMENT_TARGET_CHARS", 10)
+
+    assert split_into_segments("First part\n\nSecond part") == ["First part", "Second part"]
+
+
+def test_long_sentence_is_split_on_words():
+    sentence = " ".join(["photosynthesis"] * 300)  # 4499 characters, no full stop
+
+    segments = split_into_segments(sentence)
+
+    assert len(segments) == 3
+    assert _within_limits(segments)
+    assert all(word == "photosynthesis" for segment in segments for word in segment.split(" "))
+    assert " ".join(segments) == sentence
+
+
+@pytest.mark.parametrize("word", ["光合作用", "🌋" * 9])
+def test_multibyte_sentence_stays_under_the_byte_limit(word):
+    # 3 bytes a character fit 1500 characters in 5000 bytes; at 4 bytes the byte limit binds first
+    sentence = " ".join([word] * (3000 // (len(word) + 1)))
+
+    segments = split_into_segments(sentence)
+
+    assert _within_limits(segments)
+    assert " ".join(segments) == sentence
+
+
+def test_multibyte_text_without_spaces_is_cut_on_a_character():
+    text = "🌋" * 1400  # 5600 bytes
+
+    segments = split_into_segments(text)
+
+    assert segments == ["🌋" * 1250, "🌋" * 150]
+    assert _within_limits(segments)
+
+
+def test_segments_are_synthesized_concurrently_and_yielded_in_order(monkeypatch):
+    monkeypatch.setattr(audio_service.settings, "TTS_MAX_PARALLEL", 3)
+    monkeypatch.setattr(audio_service.settings, "TTS_SEGMENT_TARGET_CHARS", 1)
+    running = peak = 0
+    finished = []
+
+    async def synthesize(client, text):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # Later segments finish first
+        await asyncio.sleep(0.01 * (10 - int(text.split()[1].rstrip("."))))
+        running -= 1
+        finished.append(text)
+        return text.encode()
+
+    monkeypatch.setattr(audio_service, "_synthesize_segment", synthesize)
+    text = " ".join(f"Sentence {i}." for i in range(6))
+
+    async def scenario():
+        return [segment async for segment in audio_service.stream_tts_audio_gcp(None, text)]
+
+    segments = asyncio.run(scenario())
+    assert segments == [f"Sentence {i}.".encode() for i in range(6)]
+    assert finished != sorted(finished)
+    assert peak == 3